@@ -7,19 +7,55 @@ ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT_DIR))
 
 from rag.load.DocumentLoader import DocumentLoader
-from rag.splitter.DocumentSplitter import DocumentSplitter
-from rag.datasource.vdb.milvus.Milvus import MilvusDB
-# 使用自定义的Ollama嵌入模型
-from rag.models.embeddings.OllamaEmbedding import OllamaEmbedding
-# 使用自定义的Xinference嵌入模型
-from rag.models.embeddings.XinferenceEmbedding import XinferenceEmbedding
-from rag.models.reranks.XinferenceRerank import XinferenceRerank
+from rag.jobs.IngestJobQueue import IngestJobStore, IngestJobQueue
 from langchain_core.documents import Document
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from datetime import datetime
+import importlib
 import environ
+import requests
+import multiprocessing
+import threading
+import time
 import json
+import shutil
+import uuid
 import os
+
+
+class LazyClass:
+    """延迟导入的类代理
+
+    首次实例化或访问类属性时才导入所在模块，服务启动时不加载pymilvus、xinference、
+    langchain分割器等重依赖；后台预热线程会在启动后提前触发导入。
+    """
+
+    def __init__(self, module_name, class_name):
+        self.module_name = module_name
+        self.class_name = class_name
+        self._class = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """导入并返回实际的类"""
+        if self._class is None:
+            with self._lock:
+                if self._class is None:
+                    self._class = getattr(importlib.import_module(self.module_name), self.class_name)
+        return self._class
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.load(), name)
+
+
+DocumentSplitter = LazyClass('rag.splitter.DocumentSplitter', 'DocumentSplitter')
+MilvusDB = LazyClass('rag.datasource.vdb.milvus.Milvus', 'MilvusDB')
+# 使用自定义的Xinference嵌入模型
+XinferenceEmbedding = LazyClass('rag.models.embeddings.XinferenceEmbedding', 'XinferenceEmbedding')
+XinferenceRerank = LazyClass('rag.models.reranks.XinferenceRerank', 'XinferenceRerank')
                     
 app = Flask(__name__)
 
@@ -53,6 +89,8 @@ class ModelManager:
     _models = {}
     _embedding_models = []
     _rerank_models = []
+    # 多线程worker下避免同一模型被并发重复加载
+    _lock = threading.RLock()
 
     def __new__(cls):
         if cls._instance is None:
@@ -73,23 +111,25 @@ class ModelManager:
             return None
             
         try:
-            if model_name not in self._models:
-                print(f"正在加载embedding模型: {model_name}")
-                model = XinferenceEmbedding(
-                    base_url=env('XINFERENCE_HOST'),
-                    model=model_name
-                )
-                # 验证模型加载是否成功
-                if model.is_ready():
-                    self._models[model_name] = model
-                    # 如果是新模型，添加到embedding模型列表中
-                    if model not in self._embedding_models:
-                        self._embedding_models.append(model)
-                    print(f"模型 {model_name} 加载成功")
-                else:
-                    print(f"模型 {model_name} 加载失败: 模型初始化后状态检查未通过")
-                    return None
-            return self._models[model_name]
+            # 加锁检查，避免多线程并发重复加载同一模型
+            with self._lock:
+                if model_name not in self._models:
+                    print(f"正在加载embedding模型: {model_name}")
+                    model = XinferenceEmbedding(
+                        base_url=env('XINFERENCE_HOST'),
+                        model=model_name
+                    )
+                    # 验证模型加载是否成功
+                    if model.is_ready():
+                        self._models[model_name] = model
+                        # 如果是新模型，添加到embedding模型列表中
+                        if model not in self._embedding_models:
+                            self._embedding_models.append(model)
+                        print(f"模型 {model_name} 加载成功")
+                    else:
+                        print(f"模型 {model_name} 加载失败: 模型初始化后状态检查未通过")
+                        return None
+                return self._models[model_name]
                 
         except Exception as e:
             print(f"模型 {model_name} 加载失败: {str(e)}")
@@ -110,23 +150,25 @@ class ModelManager:
             return None
             
         try:
-            if rerank_model_name not in self._models:
-                print(f"正在加载rerank模型: {rerank_model_name}")
-                model = XinferenceRerank(
-                    base_url=env('XINFERENCE_HOST'),
-                    model=rerank_model_name
-                )
-                # 验证模型加载是否成功
-                if model.is_ready():
-                    self._models[rerank_model_name] = model
-                    # 如果是新模型，添加到rerank模型列表中
-                    if model not in self._rerank_models:
-                        self._rerank_models.append(model)
-                    print(f"模型 {rerank_model_name} 加载成功")
-                else:
-                    print(f"模型 {rerank_model_name} 加载失败: 模型初始化后状态检查未通过")
-                    return None
-            return self._models[rerank_model_name]
+            # 加锁检查，避免多线程并发重复加载同一模型
+            with self._lock:
+                if rerank_model_name not in self._models:
+                    print(f"正在加载rerank模型: {rerank_model_name}")
+                    model = XinferenceRerank(
+                        base_url=env('XINFERENCE_HOST'),
+                        model=rerank_model_name
+                    )
+                    # 验证模型加载是否成功
+                    if model.is_ready():
+                        self._models[rerank_model_name] = model
+                        # 如果是新模型，添加到rerank模型列表中
+                        if model not in self._rerank_models:
+                            self._rerank_models.append(model)
+                        print(f"模型 {rerank_model_name} 加载成功")
+                    else:
+                        print(f"模型 {rerank_model_name} 加载失败: 模型初始化后状态检查未通过")
+                        return None
+                return self._models[rerank_model_name]
                 
         except Exception as e:
             print(f"模型 {rerank_model_name} 加载失败: {str(e)}")
@@ -141,41 +183,457 @@ class ModelManager:
         """获取所有预加载rerank模型列表"""
         return self._rerank_models
 
-# 确保Xinference服务已启动和可访问后再预加载模型
-try:
-    # 检查Xinference服务是否可访问
-    import requests
-    xinference_host = env('XINFERENCE_HOST')
-    response = requests.get(f"{xinference_host}/", timeout=5)
-    if response.status_code == 200:
-        print("Xinference服务检查成功,开始预加载模型...")
-        
-        # 初始化全局模型管理器
-        model_manager = ModelManager()
+# 初始化全局模型管理器
+model_manager = ModelManager()
+
+# 服务就绪状态(由 /ready 端点对外报告)
+# 各项能力状态: pending(未开始)、loading(加载中)、ready(可用)、failed(失败)、lazy(首次使用时加载)、
+# disabled(本worker未启用，如未分配到解析进程)
+service_state = {
+    'models_preloaded': False,
+    'shutting_down': False,
+    'capabilities': {
+        'splitter': 'pending',
+        'vectordb': 'pending',
+        'embedding': 'pending',
+        'rerank': 'pending',
+        'ingest_queue': 'pending',
+        'parser': 'lazy',
+    },
+}
+# 服务整体就绪所需的能力
+CORE_CAPABILITIES = ('splitter', 'vectordb', 'embedding')
+_preload_lock = threading.Lock()
+
+# 预加载默认模型
+default_models = {
+    'embedding': ['bge-m3', 'Qwen3-Embedding-0.6B'],
+    'rerank': ['bge-reranker-v2-m3', 'bge-reranker-base', 'Qwen3-Reranker-0.6B']
+}
+
+def preload_models():
+    """检查Xinference服务并预加载默认模型
+
+    由后台预热线程调用(见 start_warmup)，embedding和rerank都就绪后不再重复执行，否则由预热线程定期重试。
+    至少一个embedding/rerank模型加载成功时，对应能力标记为ready。
+    """
+    with _preload_lock:
+        if service_state['models_preloaded']:
+            return
+        capabilities = service_state['capabilities']
+        capabilities['embedding'] = capabilities['rerank'] = 'loading'
+        # 确保Xinference服务已启动和可访问后再预加载模型
+        try:
+            # 检查Xinference服务是否可访问
+            xinference_host = env('XINFERENCE_HOST')
+            response = requests.get(f"{xinference_host}/", timeout=5)
+            if response.status_code == 200:
+                print("Xinference服务检查成功,开始预加载模型...")
+
+                # 预加载embedding模型
+                loaded = 0
+                for model in default_models['embedding']:
+                    if model_manager.get_embedding_model(model) is None:
+                        print(f"预加载embedding模型 {model} 失败")
+                    else:
+                        loaded += 1
+                capabilities['embedding'] = 'ready' if loaded else 'failed'
+                        
+                # 预加载rerank模型        
+                loaded = 0
+                for model in default_models['rerank']:
+                    if model_manager.get_rerank_model(model) is None:
+                        print(f"预加载rerank模型 {model} 失败")
+                    else:
+                        loaded += 1
+                capabilities['rerank'] = 'ready' if loaded else 'failed'
 
-        # 预加载默认模型
-        default_models = {
-            'embedding': ['bge-m3', 'Qwen3-Embedding-0.6B'],
-            'rerank': ['bge-reranker-v2-m3', 'bge-reranker-base', 'Qwen3-Reranker-0.6B']
-        }
+                service_state['models_preloaded'] = capabilities['embedding'] == capabilities['rerank'] == 'ready'
+            else:
+                print(f"Xinference服务检查失败: 状态码 {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            print(f"无法连接到Xinference服务: {str(e)}")
+        except Exception as e:
+            print(f"预加载模型时发生错误: {str(e)}")
+        for name in ('embedding', 'rerank'):
+            if capabilities[name] == 'loading':
+                capabilities[name] = 'failed'
+
+def begin_shutdown():
+    """标记服务不再就绪(/ready返回503)，使负载均衡在处理完进行中的请求前摘除流量"""
+    if not service_state['shutting_down']:
+        service_state['shutting_down'] = True
+        print(f"进程 {os.getpid()} 正在停止服务")
+
+def shutdown():
+    """优雅停机: 标记服务不再就绪并停止解析进程池"""
+    begin_shutdown()
+    parse_pool = DocumentLoader().get_parse_pool()
+    if parse_pool is not None:
+        parse_pool.shutdown()
+
+@app.route('/ready')
+def readiness_check():
+    """就绪检查端点
+
+    请求参数(query格式):
+    - capability: 只检查指定能力(splitter, vectordb, embedding, rerank, ingest_queue, parser) **(可选)
 
-        # 预加载embedding模型
-        for model in default_models['embedding']:
-            if model_manager.get_embedding_model(model) is None:
-                print(f"预加载embedding模型 {model} 失败")
-                
-        # 预加载rerank模型        
-        for model in default_models['rerank']:
-            if model_manager.get_rerank_model(model) is None:
-                print(f"预加载rerank模型 {model} 失败")
-                
+    返回:
+    - 指定能力(未指定时为splitter、vectordb、embedding)就绪且未处于停机状态时返回200，否则返回503
+    """
+    capabilities = dict(service_state['capabilities'])
+    parse_pool = DocumentLoader().get_parse_pool()
+    capability = request.args.get('capability')
+    if capability and capability not in capabilities:
+        return jsonify({'error': f'未知的能力: {capability}'}), 400
+    required = (capability,) if capability else CORE_CAPABILITIES
+    # lazy能力在首次使用时加载，不影响就绪
+    ready = all(capabilities[name] in ('ready', 'lazy') for name in required) and not service_state['shutting_down']
+    if service_state['shutting_down']:
+        status = 'shutting_down'
+    else:
+        status = 'ready' if ready else 'not_ready'
+    return jsonify({
+        'status': status,
+        'pid': os.getpid(),
+        'capabilities': capabilities,
+        'parse_workers': parse_pool.health() if parse_pool is not None else None,
+        'embedding_models': [model.model for model in model_manager.get_all_embedding_models()],
+        'rerank_models': [model.model for model in model_manager.get_all_rerank_models()],
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }), 200 if ready else 503
+
+
+# 支持的分割方法
+SPLIT_METHODS = ('token', 'recursion', 'semantic', 'model_token')
+
+def _process_separators(separators):
+    """处理分隔符字符串，将字符串格式（如'//,\n'）转换为列表格式（如['//','\n']），未提供时使用默认值"""
+    if isinstance(separators, str):
+        separators = [separators]
+    processed_separators = []
+    for sep in separators or []:
+        # 检查是否是逗号分隔的字符串
+        if ',' in sep:
+            # 按逗号分割并处理转义字符
+            for part in sep.split(','):
+                processed_separators.append(part.encode().decode('unicode_escape'))
+        else:
+            processed_separators.append(sep.encode().decode('unicode_escape'))
+    return processed_separators or ["\n\n", "\n", " ", ""]
+
+def _get_ingest_params(form):
+    """从form-data中读取入库(分割/embedding)参数，返回可JSON序列化的字典"""
+    return {
+        'uploader': form.get('uploader', 'api_user'),
+        'split_method': form.get('split_method', 'recursion'),
+        'chunk_size': int(form.get('chunk_size', 200)),
+        'chunk_overlap': int(form.get('chunk_overlap', 20)),
+        'separators': _process_separators(form.getlist('separators')),
+        'similarity_threshold': float(form.get('similarity_threshold', 0.7)),
+        'embedding_model': form.get('embedding_model', 'bge-m3'),
+        'preserve_order': form.get('preserve_order', 'true').lower() in ('true', '1'),
+        'breakpoint_percentile': float(form['breakpoint_percentile']) if form.get('breakpoint_percentile') else None,
+    }
+
+def _get_embedding(embedding_model):
+    """获取或初始化embedding模型"""
+    embedding = model_manager.get_embedding_model(embedding_model)
+    if embedding is None:
+        # 如果获取失败，尝试重新初始化
+        embedding = XinferenceEmbedding(
+            base_url=env('XINFERENCE_HOST'),
+            model=embedding_model
+        )
+    return embedding
+
+def _iter_split_documents(splitter, documents, params, embedding):
+    """根据分割方法以生成器方式逐块分割文档，不支持的分割方法抛出ValueError"""
+    split_method = params['split_method']
+    if split_method == 'token':
+        return splitter.iter_split_by_token(
+            documents=documents,
+            chunk_size=params['chunk_size'],
+            chunk_overlap=params['chunk_overlap'],
+            preserve_order=params.get('preserve_order', True)
+        )
+    elif split_method == 'recursion':
+        return splitter.iter_split_by_recursion(
+            documents=documents,
+            separators=params['separators'],
+            chunk_size=params['chunk_size'],
+            chunk_overlap=params['chunk_overlap'],
+            preserve_order=params.get('preserve_order', True)
+        )
+    elif split_method == 'semantic':
+        return splitter.iter_split_by_semantic(
+            documents=documents,
+            embedding=embedding,
+            chunk_size=params['chunk_size'],
+            chunk_overlap=params['chunk_overlap'],
+            similarity_threshold=params['similarity_threshold'],
+            preserve_order=params.get('preserve_order', True),
+            breakpoint_percentile=params.get('breakpoint_percentile')
+        )
+    elif split_method == 'model_token':
+        # 按embedding模型自身的分词器计算token数，chunk_size为模型token数
+        return splitter.iter_split_by_model_token(
+            documents=documents,
+            model=params['embedding_model'],
+            chunk_size=params['chunk_size'],
+            chunk_overlap=params['chunk_overlap'],
+            preserve_order=params.get('preserve_order', True)
+        )
+    raise ValueError(f'不支持的分割方法: {split_method}')
+
+def run_ingest(job_type, params, report=None, recorded=None):
+    """执行文件入库: load → split → embed → insert
+
+    参数:
+        job_type: create(新建集合) 或 update(更新集合)
+        params: 入库参数，包含file_path、filename、collection_name及分割参数
+        report: 进度回调 report(stage, progress, result=None)，为空时不上报
+        recorded: 中断前上一次执行记录的中间结果(本次任务创建的版本集合)，重试时只清理这些集合
+    返回:
+        dict: 入库结果
+    """
+    def _report(stage, progress, result=None):
+        if report:
+            report(stage, progress, result)
+
+    collection_name = params['collection_name']
+    db = MilvusDB(uploader=params['uploader'])
+    recorded = recorded or {}
+    if recorded.get('version_name'):
+        if db.cleanup_interrupted_version(collection_name, recorded['version_name'], recorded.get('replaced')):
+            # 上次执行已完成写入并切换别名，只是没来得及标记任务完成
+            print(f"中断的入库任务已生效: {collection_name} -> {recorded['version_name']}")
+            return {
+                'collection_name': collection_name,
+                'filename': params['filename'],
+                'version_name': recorded['version_name'],
+                'total_splits': int(db.client.get_collection_stats(recorded['version_name']).get('row_count', 0)),
+            }
+
+    # 先记录本次要创建的版本集合和要替换的集合，进程中断后重试时只清理这些集合
+    version = {
+        'version_name': recorded.get('version_name') or db._versioned_collection_name(collection_name),
+        'replaced': db._resolve_collection(collection_name) if job_type == 'update' else None,
+    }
+
+    # 加载文档
+    _report('load', 0.0, version)
+    loader = DocumentLoader()
+    documents = loader.load_documents(params['file_path'])
+    _report('load', 1.0)
+
+    # 分割文档(生成器)，分割结果按批次流经 embed → insert，不在内存中汇总
+    _report('split', 0.0)
+    splitter = DocumentSplitter()
+    embedding = _get_embedding(params['embedding_model'])
+    consumed = {'documents': 0, 'splits': 0}
+
+    def iter_documents():
+        for doc in documents:
+            yield doc
+            consumed['documents'] += 1
+
+    def count_splits(splits):
+        for split in splits:
+            consumed['splits'] += 1
+            yield split
+
+    splits = count_splits(_iter_split_documents(splitter, iter_documents(), params, embedding))
+
+    progress_callback = None
+    if report:
+        # 分段总数未知时，以已分割的源文档比例作为进度
+        progress_callback = lambda stage, done, total: report(
+            stage, done / total if total else consumed['documents'] / max(len(documents), 1))
+    if job_type == 'create':
+        db.save_to_milvus(splits, collection_name, embedding, progress_callback=progress_callback,
+                          version_name=version['version_name'])
+    elif job_type == 'update':
+        db.update_documents(splits, collection_name, embedding,
+                            shadow_build=params.get('shadow_build', False),
+                            progress_callback=progress_callback,
+                            version_name=version['version_name'])
     else:
-        print(f"Xinference服务检查失败: 状态码 {response.status_code}")
-except requests.exceptions.RequestException as e:
-    print(f"无法连接到Xinference服务: {str(e)}")
-except Exception as e:
-    print(f"预加载模型时发生错误: {str(e)}")
+        raise ValueError(f'不支持的任务类型: {job_type}')
+
+    return {
+        'collection_name': collection_name,
+        'filename': params['filename'],
+        'version_name': version['version_name'],
+        'total_splits': consumed['splits'],
+    }
+
+def run_ingest_job(job, report):
+    """入库任务队列的处理函数，任务结束(成功或失败)后删除其上传文件；进程中断时文件保留，供恢复后重新执行"""
+    try:
+        return run_ingest(job['job_type'], job['params'], report=report,
+                          recorded=job['result'] if job['attempts'] > 1 else None)
+    finally:
+        _remove_upload(job['params']['file_path'])
+
+def _save_upload(file, upload_id=None):
+    """保存上传的文件到 uploads/jobs/<upload_id>/ 下，同名文件的并发上传不会覆盖排队中任务的输入
+
+    参数:
+        file: 上传的文件
+        upload_id: 异步任务的任务ID，为空时生成一个新的ID
+    返回:
+        str: 保存的文件路径
+    """
+    upload_dir = os.path.join(ROOT_DIR, 'uploads', 'jobs', upload_id or str(uuid.uuid4()))
+    os.makedirs(upload_dir, exist_ok=True)
+    file_path = os.path.join(upload_dir, os.path.basename(file.filename))
+    file.save(file_path)
+    return file_path
+
+def _remove_upload(file_path):
+    """删除_save_upload保存的文件及其所在目录"""
+    upload_dir = os.path.dirname(file_path)
+    if os.path.dirname(upload_dir) == os.path.join(ROOT_DIR, 'uploads', 'jobs'):
+        shutil.rmtree(upload_dir, ignore_errors=True)
+
+_ingest_queue = None
+_ingest_queue_lock = threading.Lock()
+
+def get_ingest_queue():
+    """获取当前进程的入库任务队列，首次调用时创建并恢复中断的任务
+
+    生产模式(gunicorn)下由 gunicorn.conf.py 在每个worker fork之后调用。
+    """
+    global _ingest_queue
+    with _ingest_queue_lock:
+        if _ingest_queue is None:
+            store = IngestJobStore(env('INGEST_JOB_DB', default=os.path.join(ROOT_DIR, 'uploads', 'ingest_jobs.db')))
+            _ingest_queue = IngestJobQueue(store, run_ingest_job, max_workers=env.int('INGEST_WORKERS', default=2))
+            _ingest_queue.recover()
+        return _ingest_queue
+
+def warm_up():
+    """后台预热: 依次导入重依赖、连接向量数据库、预加载模型并启动入库任务队列，
+    每完成一项即更新对应能力的就绪状态
+
+    失败的项每隔 WARMUP_RETRY_INTERVAL 秒(默认30，之后逐次翻倍，最长 WARMUP_RETRY_MAX_INTERVAL 秒)重试，
+    直到全部就绪或服务停止；WARMUP_RETRY_INTERVAL=0 时不重试。
+    """
+    capabilities = service_state['capabilities']
+
+    def run_step(name, step):
+        capabilities[name] = 'loading'
+        try:
+            step()
+            capabilities[name] = 'ready'
+        except Exception as e:
+            print(f"预热 {name} 失败: {str(e)}")
+            capabilities[name] = 'failed'
+
+    steps = [
+        ('splitter', DocumentSplitter.load),
+        ('vectordb', lambda: MilvusDB()),
+        # 模型预加载自行维护embedding和rerank的状态
+        ('models', preload_models),
+        ('ingest_queue', get_ingest_queue),
+    ]
+    # MinerU解析依赖体积较大，默认在首次解析pdf/office/图片时加载；
+    # 启用常驻解析进程(PARSE_WORKERS>0)时始终预热，启动解析进程并预加载模型
+    parse_pool = DocumentLoader().get_parse_pool()
+    if not DocumentLoader().parse_enabled:
+        capabilities['parser'] = 'disabled'
+    elif parse_pool is not None:
+        steps.append(('parser', parse_pool.warm_up))
+    elif env.bool('WARMUP_PARSER', default=False):
+        steps.append(('parser', lambda: DocumentLoader()._get_file_parse()))
+
+    def failed_steps():
+        return [(name, step) for name, step in steps
+                if (not service_state['models_preloaded'] if name == 'models' else capabilities[name] == 'failed')]
+
+    for name, step in steps:
+        if name == 'models':
+            step()
+        else:
+            run_step(name, step)
+    print(f"进程 {os.getpid()} 预热完成: {capabilities}")
+
+    interval = env.int('WARMUP_RETRY_INTERVAL', default=30)
+    max_interval = env.int('WARMUP_RETRY_MAX_INTERVAL', default=300)
+    while interval > 0 and not service_state['shutting_down']:
+        retry = failed_steps()
+        if not retry:
+            break
+        print(f"进程 {os.getpid()} 将在{interval}秒后重试预热: {[name for name, _ in retry]}")
+        time.sleep(interval)
+        if service_state['shutting_down']:
+            break
+        for name, step in retry:
+            if name == 'models':
+                step()
+            else:
+                run_step(name, step)
+        interval = min(interval * 2, max_interval)
+
+_warmup_thread = None
+_warmup_lock = threading.Lock()
 
+def start_warmup():
+    """启动后台预热线程(每个进程只启动一次)，不阻塞服务启动
+
+    开发模式下在导入时启动；生产模式(gunicorn)下由 gunicorn.conf.py 在每个worker fork之后调用，
+    避免在主进程中创建的客户端连接被多个worker共享。
+    """
+    global _warmup_thread
+    with _warmup_lock:
+        if _warmup_thread is None:
+            _warmup_thread = threading.Thread(target=warm_up, name='warmup', daemon=True)
+            _warmup_thread.start()
+        return _warmup_thread
+
+# spawn方式启动的分割/解析子进程会以__mp_main__重新导入本模块，只在主进程中预热
+if multiprocessing.parent_process() is None and not env.bool('RAG_DEFER_PRELOAD', default=False):
+    start_warmup()
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询入库任务状态
+
+    返回:
+    - JSON格式的任务信息(status: pending/running/succeeded/failed, stage, progress, result, error)
+    """
+    try:
+        job = get_ingest_queue().get(job_id)
+        if job is None:
+            return jsonify({'error': f'任务 {job_id} 不存在'}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """分页查询入库任务列表
+
+    请求参数(query格式):
+    - status: 任务状态过滤(pending, running, succeeded, failed) **(可选)
+    - page: 页码 **(默认1)
+    - limit: 每页数量 **(默认20)
+    """
+    try:
+        status = request.args.get('status')
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = max(int(request.args.get('limit', 20)), 1)
+        store = get_ingest_queue().store
+        return jsonify({
+            'total': store.count(status),
+            'page': page,
+            'limit': limit,
+            'jobs': store.list(status=status, limit=limit, offset=(page - 1) * limit)
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 
 @app.route('/api/splitV1', methods=['POST'])
@@ -195,6 +653,8 @@ def split_documentV1():
         split_method = res.get('split_method', 'recursion')
         chunk_size = res.get('chunk_size', 200)
         chunk_overlap = res.get('chunk_overlap', 20)
+        # 按文档顺序返回分块并记录分块在源文档中的位置
+        preserve_order = str(res.get('preserve_order', 'true')).lower() in ('true', '1')
 
         loader = DocumentLoader()
         documents = loader.load_documents_from_minio(
@@ -208,7 +668,8 @@ def split_documentV1():
             splits = splitter.split_by_token(
                 documents=documents,
                 chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
+                chunk_overlap=chunk_overlap,
+                preserve_order=preserve_order
             )
         elif split_method == 'recursion':
             # 获取分隔符列表
@@ -240,7 +701,8 @@ def split_documentV1():
                 documents=documents,
                 separators=processed_separators,
                 chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
+                chunk_overlap=chunk_overlap,
+                preserve_order=preserve_order
             )
         elif split_method == 'semantic':
             # 获取语义分割相关参数
@@ -296,6 +758,7 @@ def split_document():
     - separators: 分隔符列表 (仅用于recursion切割方法)             **(默认["\n\n", "\n", " ", ""])
     - similarity_threshold: 相似度阈值 (仅用于semantic切割方法)    **(默认0.7)
     - embedding_model: embedding模型名称 (仅用于semantic切割方法)  **(默认bge-m3)
+    - preserve_order: 在metadata中记录start_index/end_index(分块始终按文档顺序返回) **(默认true)
     
     返回:
     - JSON格式的分割结果
@@ -313,14 +776,18 @@ def split_document():
         split_method = request.form.get('split_method', 'recursion')
         chunk_size = int(request.form.get('chunk_size', 200))
         chunk_overlap = int(request.form.get('chunk_overlap', 20))
+        # 按文档顺序返回分块并记录分块在源文档中的位置
+        preserve_order = request.form.get('preserve_order', 'true').lower() in ('true', '1')
         
         # 保存上传的文件
-        file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', file.filename)
-        file.save(file_path)
+        file_path = _save_upload(file)
         
         # 加载文档
         loader = DocumentLoader()
-        documents = loader.load_documents(file_path)
+        try:
+            documents = loader.load_documents(file_path)
+        finally:
+            _remove_upload(file_path)
         
         # 初始化分割器
         splitter = DocumentSplitter()
@@ -330,7 +797,8 @@ def split_document():
             splits = splitter.split_by_token(
                 documents=documents,
                 chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
+                chunk_overlap=chunk_overlap,
+                preserve_order=preserve_order
             )
         elif split_method == 'recursion':
             # 获取分隔符列表
@@ -355,7 +823,8 @@ def split_document():
                 documents=documents,
                 separators=processed_separators,
                 chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
+                chunk_overlap=chunk_overlap,
+                preserve_order=preserve_order
             )
         elif split_method == 'semantic':
             # 获取语义分割相关参数
@@ -398,6 +867,107 @@ def split_document():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/split_stream', methods=['POST'])
+def split_document_stream():
+    """流式文档分割，逐块以NDJSON格式返回分割结果
+
+    适用于超大文档：分割结果不在内存中汇总，边分割边输出，峰值内存和首字节时间不随文档大小增长。
+
+    请求参数(form-data格式上传文件，或JSON格式指定MinIO中的文件):
+    - file: 上传的文件                                          **(与file_path二选一)
+    - file_path: MinIO中的文件路径                               **(与file二选一)
+    - split_method: 分割方法 (token, recursion, semantic, model_token)       **(默认recursion)
+    - chunk_size: 分块大小                                      **(默认200)
+    - chunk_overlap: 分块重叠大小                                **(默认20)
+    - separators: 分隔符列表 (仅用于recursion切割方法)             **(默认["\n\n", "\n", " ", ""])
+    - similarity_threshold: 相似度阈值 (仅用于semantic切割方法)    **(默认0.7)
+    - embedding_model: embedding模型名称 (用于semantic切割方法，model_token切割方法按该模型的分词器计算token数)  **(默认bge-m3)
+    - preserve_order: 在metadata中记录start_index/end_index(分块始终按文档顺序返回) **(默认true)
+    - breakpoint_percentile: 语义分割断点百分位(0~100)，设置后替代similarity_threshold **(可选)
+    - offset: 跳过的分块数量                                     **(默认0)
+    - limit: 返回的最大分块数量，达到后停止分割                       **(默认不限制)
+
+    返回:
+    - NDJSON格式，每行一个分块 {"id", "content", "metadata"}，
+      最后一行为 {"done": true, "offset", "returned", "has_more"}；出错时为 {"error": ...}
+    """
+    try:
+        if 'file' in request.files:
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({'error': '没有选择文件'}), 400
+            form = request.form
+            params = _get_ingest_params(form)
+            def load(loader):
+                # 在响应生成器中保存上传的文件(stream_with_context保留了请求上下文)，读取后立即删除
+                file_path = _save_upload(file)
+                try:
+                    return loader.load_documents(file_path)
+                finally:
+                    _remove_upload(file_path)
+        else:
+            form = request.get_json(silent=True) or {}
+            if not form.get('file_path'):
+                return jsonify({'error': '必须上传文件或提供file_path参数'}), 400
+            params = {
+                'split_method': form.get('split_method', 'recursion'),
+                'chunk_size': int(form.get('chunk_size', 200)),
+                'chunk_overlap': int(form.get('chunk_overlap', 20)),
+                'separators': _process_separators(form.get('separators')),
+                'similarity_threshold': float(form.get('similarity_threshold', 0.7)),
+                'embedding_model': form.get('embedding_model', 'bge-m3'),
+                'preserve_order': str(form.get('preserve_order', 'true')).lower() in ('true', '1'),
+                'breakpoint_percentile': float(form['breakpoint_percentile'])
+                if form.get('breakpoint_percentile') not in (None, '') else None,
+            }
+            load = lambda loader: loader.load_documents_from_minio(
+                bucket_name=env.str('MINIO_BUCKET', default='cool'),
+                object_name=form.get('file_path')
+            )
+
+        if params['split_method'] not in SPLIT_METHODS:
+            return jsonify({'error': f'不支持的分割方法: {params["split_method"]}'}), 400
+        offset = max(int(form.get('offset', 0)), 0)
+        limit = form.get('limit')
+        limit = int(limit) if limit not in (None, '') else None
+
+        def generate():
+            try:
+                # 加载文档
+                documents = load(DocumentLoader())
+                splitter = DocumentSplitter()
+                embedding = _get_embedding(params['embedding_model']) if params['split_method'] == 'semantic' else None
+                splits = _iter_split_documents(splitter, documents, params, embedding)
+
+                returned = 0
+                has_more = False
+                for i, split in enumerate(splits):
+                    if i < offset:
+                        continue
+                    if limit is not None and returned >= limit:
+                        # 已达到limit，还有剩余分块，停止分割
+                        has_more = True
+                        break
+                    returned += 1
+                    yield json.dumps({
+                        'id': i + 1,
+                        'content': split.page_content,
+                        'metadata': split.metadata
+                    }, ensure_ascii=False, default=str) + "\n"
+                yield json.dumps({'done': True, 'offset': offset, 'returned': returned, 'has_more': has_more}) + "\n"
+            except Exception as e:
+                # 响应头已发送，错误以单独一行返回
+                yield json.dumps({'error': str(e)}, ensure_ascii=False) + "\n"
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/<vectordb>/creat_byfile', methods=['POST'])
 def create_byfile(vectordb):
     """文档上传并存储到向量数据库
@@ -409,12 +979,15 @@ def create_byfile(vectordb):
     - file: 上传的文件(支持txt、pdf、csv、json、md、html等,会对上传文档进行处理) **(必填)
     - collection_name: 自定义集合名称                               **(可选)
     - uploader: 上传者名称(api)                                     **(默认api_user)
-    - split_method: 分割方法 (token, recursion, semantic)           **(默认recursion)
+    - split_method: 分割方法 (token, recursion, semantic, model_token)           **(默认recursion)
     - chunk_size: 分块大小                                          **(默认200)
     - chunk_overlap: 分块重叠大小                                    **(默认40)
     - separators: 分隔符列表 (仅用于recursion切割方法)                  **(默认["\n\n", "\n", " ", ""])
     - similarity_threshold: 相似度阈值 (仅用于semantic切割方法)         **(默认0.7)
-    - embedding_model: embedding模型名称(仅用于semantic切割方法)        **(默认bge-m3)
+    - embedding_model: embedding模型名称(用于semantic切割方法，model_token切割方法按该模型的分词器计算token数)        **(默认bge-m3)
+    - preserve_order: 在分段metadata中记录start_index/end_index(分段始终按文档顺序切分，重复入库时segment_id保持稳定) **(默认true)
+    - breakpoint_percentile: 语义分割断点百分位(0~100)，设置后替代similarity_threshold **(可选)
+    - async: 是否异步入库(立即返回job_id，通过 /api/jobs/<job_id> 查询进度)   **(默认false)
     
     返回:
     - JSON格式的存储结果
@@ -427,92 +1000,48 @@ def create_byfile(vectordb):
         file = request.files['file']
         if file.filename == '':
             return jsonify({'error': '没有选择文件'}), 400
-            
+
+        # 根据vectordb参数选择向量数据库
+        if vectordb.lower() != 'milvus':
+            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
+
         # 获取分割参数
-        split_method = request.form.get('split_method', 'recursion')
-        chunk_size = int(request.form.get('chunk_size', 200))
-        chunk_overlap = int(request.form.get('chunk_overlap', 20))
-        
-        # 保存上传的文件
-        file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', file.filename)
-        file.save(file_path)
-        
-        # 加载文档
-        loader = DocumentLoader()
-        documents = loader.load_documents(file_path)
-        
-        # 初始化分割器和embedding模型
-        splitter = DocumentSplitter()
-        embedding_model = request.form.get('embedding_model', 'bge-m3')
-        # 获取或初始化embedding模型
-        embedding = model_manager.get_embedding_model(embedding_model)
-        if embedding is None:
-            # 如果获取失败，尝试重新初始化
-            embedding = XinferenceEmbedding(
-                base_url=env('XINFERENCE_HOST'),
-                model=embedding_model
-            )
-        
-        # 根据不同的分割方法进行处理
-        if split_method == 'token':
-            splits = splitter.split_by_token(
-                documents=documents,
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
-            )
-        elif split_method == 'recursion':
-            # 获取分隔符列表
-            separators = request.form.getlist('separators')
-            
-            # 处理分隔符字符串，将字符串格式（如'//,\n'）转换为列表格式（如['//','\n']）
-            processed_separators = []
-            for sep in separators:
-                # 检查是否是逗号分隔的字符串
-                if ',' in sep:
-                    # 按逗号分割并处理转义字符
-                    for part in sep.split(','):
-                        processed_separators.append(part.encode().decode('unicode_escape'))
-                else:
-                    processed_separators.append(sep.encode().decode('unicode_escape'))
-            
-            # 如果没有提供分隔符，使用默认值
-            if not processed_separators:
-                processed_separators = ["\n\n", "\n", " ", ""]
-                
-            splits = splitter.split_by_recursion(
-                documents=documents,
-                separators=processed_separators,
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
-            )
-        elif split_method == 'semantic':
-            # 获取语义分割相关参数
-            similarity_threshold = float(request.form.get('similarity_threshold', 0.7))
-            
-            splits = splitter.split_by_semantic(
-                documents=documents,
-                embedding=embedding,
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
-                similarity_threshold=similarity_threshold
-            )
-        else:
-            return jsonify({'error': f'不支持的分割方法: {split_method}'}), 400
+        params = _get_ingest_params(request.form)
+        if params['split_method'] not in SPLIT_METHODS:
+            return jsonify({'error': f'不支持的分割方法: {params["split_method"]}'}), 400
         
         # 处理集合名称参数
         collection_name = request.form.get('collection_name')
         if not collection_name:
             # 使用文件名生成默认集合名称
-            db_instance = MilvusDB(uploader=request.form.get('uploader', 'api_user'))
+            db_instance = MilvusDB(uploader=params['uploader'])
             collection_name = db_instance._process_collection_name(file.filename)
-        # 根据vectordb参数选择向量数据库
-        if vectordb.lower() == 'milvus':
-            db = MilvusDB(uploader=request.form.get('uploader', 'api_user'))
-            db.save_to_milvus(splits, collection_name, embedding)
-        # elif vectordb.lower() == 'pgvector':
-        #     ...
-        else:
-            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
+
+        # 保存上传的文件，异步任务的文件按任务ID保存，任务结束后删除
+        run_async = request.form.get('async', 'false').lower() in ('true', '1')
+        job_id = str(uuid.uuid4()) if run_async else None
+        file_path = _save_upload(file, job_id)
+        params.update(file_path=file_path, filename=file.filename, collection_name=collection_name)
+
+        # 异步模式: 提交后台任务，立即返回任务ID
+        if run_async:
+            try:
+                get_ingest_queue().submit('create', params, job_id=job_id)
+            except Exception:
+                _remove_upload(file_path)
+                raise
+            return jsonify({
+                'message': '入库任务已提交',
+                'job_id': job_id,
+                'filename': file.filename,
+                'collection_name': collection_name,
+                'vectordb': vectordb,
+            }), 202
+
+        try:
+            result = run_ingest('create', params)
+        finally:
+            _remove_upload(file_path)
         
         return jsonify({
             'message': '文档处理完成',
@@ -520,7 +1049,7 @@ def create_byfile(vectordb):
             'filename': file.filename,
             'collection_name': collection_name,
             'vectordb': vectordb,
-            'total_splits': len(splits),
+            'total_splits': result['total_splits'],
             'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         })
         
@@ -679,42 +1208,15 @@ def select_all_KB(vectordb):
             db = MilvusDB()
             collections = db.list_collections()
             
-            # 获取所有集合的元数据
-            formatted = []
-            error_collections = []
-            
-            for collection in collections:
-                collection_name = collection['name']
-                try:
-                    # 先加载集合，确保集合已加载到内存中
-                    try:
-                        db._load_collection(collection_name)
-                    except Exception as load_err:
-                        print(f"加载集合 {collection_name} 失败: {str(load_err)}")
-                        error_collections.append({
-                            'name': collection_name,
-                            'error': f"加载失败: {str(load_err)}"
-                        })
-                        continue
-                        
-                    # 获取集合元数据
-                    metadata = db.get_collection_metadata(collection_name)
-                    collection_metadata = metadata.get('metadata', {})
-                    
-                    formatted.append({
-                        'name': collection_metadata.get('document_name', collection_name),
-                        'created_by': collection_metadata.get('uploader', ''),
-                        'source': collection_metadata.get('source', ''),
-                        'created_at': collection_metadata.get('upload_date', ''),
-                        'updated_at': collection_metadata.get('last_update_date', ''),
-                        'total_segments': collection.get('row_count', 0)
-                    })
-                except Exception as e:
-                    print(f"处理集合 {collection_name} 时出错: {str(e)}")
-                    error_collections.append({
-                        'name': collection_name,
-                        'error': str(e)
-                    })
+            # list_collections已从集合描述中读取元数据，无需逐个加载集合
+            formatted = [{
+                'name': collection.get('document_name') or collection['name'],
+                'created_by': collection.get('uploader', ''),
+                'source': collection.get('source', ''),
+                'created_at': collection.get('upload_date', ''),
+                'updated_at': collection.get('last_update_date', ''),
+                'total_segments': collection.get('row_count', 0)
+            } for collection in collections]
             
             # 对结果进行分页
             total = len(formatted)
@@ -731,10 +1233,6 @@ def select_all_KB(vectordb):
                 'total_pages': (total + limit - 1) // limit
             }
             
-            # 如果有错误的集合，添加到响应中
-            if error_collections:
-                response_data['error_collections'] = error_collections
-                
             return jsonify(response_data)
             
         elif vectordb.lower() == 'pgvector':
@@ -757,12 +1255,16 @@ def update_collection_byfile(vectordb):
     - file: 上传的文件(支持txt、pdf、csv、json、md、html等) **(必填)
     - collection_name: 要更新的集合名称 **(必填)
     - uploader: 更新者名称(api) **(默认api_user)
-    - split_method: 分割方法 (token, recursion, semantic) **(默认recursion)
+    - split_method: 分割方法 (token, recursion, semantic, model_token) **(默认recursion)
     - chunk_size: 分块大小 **(默认200)
     - chunk_overlap: 分块重叠大小 **(默认40)
     - separators: 分隔符列表 (仅用于recursion切割方法) **(默认["\n\n", "\n", " ", ""])
     - similarity_threshold: 相似度阈值 (仅用于semantic切割方法) **(默认0.7)
-    - embedding_model: embedding模型名称(仅用于semantic切割方法) **(默认bge-m3)
+    - embedding_model: embedding模型名称(用于semantic切割方法，model_token切割方法按该模型的分词器计算token数) **(默认bge-m3)
+    - preserve_order: 在分段metadata中记录start_index/end_index(分段始终按文档顺序切分，重复入库时segment_id保持稳定) **(默认true)
+    - breakpoint_percentile: 语义分割断点百分位(0~100)，设置后替代similarity_threshold **(可选)
+    - shadow_build: 是否使用影子构建(构建完成后通过别名原子切换，更新期间检索不中断) **(默认false)
+    - async: 是否异步更新(立即返回job_id，通过 /api/jobs/<job_id> 查询进度) **(默认false)
     
     返回:
     - JSON格式的更新结果
@@ -780,99 +1282,60 @@ def update_collection_byfile(vectordb):
         collection_name = request.form.get('collection_name')
         if not collection_name:
             return jsonify({'error': '必须指定要更新的集合名称'}), 400
+
+        # 根据vectordb参数选择向量数据库
+        if vectordb.lower() != 'milvus':
+            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
             
         # 获取分割参数
-        split_method = request.form.get('split_method', 'recursion')
-        chunk_size = int(request.form.get('chunk_size', 200))
-        chunk_overlap = int(request.form.get('chunk_overlap', 20))
-        
-        # 保存上传的文件
-        file_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads', file.filename)
-        file.save(file_path)
-        
-        # 加载文档
-        loader = DocumentLoader()
-        documents = loader.load_documents(file_path)
-        
-        # 初始化分割器和embedding模型
-        splitter = DocumentSplitter()
-        embedding_model = request.form.get('embedding_model', 'bge-m3')
-        # 获取或初始化embedding模型
-        embedding = model_manager.get_embedding_model(embedding_model)
-        if embedding is None:
-            # 如果获取失败，尝试重新初始化
-            embedding = XinferenceEmbedding(
-                base_url=env('XINFERENCE_HOST'),
-                model=embedding_model
-            )
-        
-        # 根据不同的分割方法进行处理
-        if split_method == 'token':
-            splits = splitter.split_by_token(
-                documents=documents,
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
-            )
-        elif split_method == 'recursion':
-            # 获取分隔符列表
-            separators = request.form.getlist('separators')
-            
-            # 处理分隔符字符串，将字符串格式（如'//,\n'）转换为列表格式（如['//','\n']）
-            processed_separators = []
-            for sep in separators:
-                # 检查是否是逗号分隔的字符串
-                if ',' in sep:
-                    # 按逗号分割并处理转义字符
-                    for part in sep.split(','):
-                        processed_separators.append(part.encode().decode('unicode_escape'))
-                else:
-                    processed_separators.append(sep.encode().decode('unicode_escape'))
-            
-            # 如果没有提供分隔符，使用默认值
-            if not processed_separators:
-                processed_separators = ["\n\n", "\n", " ", ""]
-                
-            splits = splitter.split_by_recursion(
-                documents=documents,
-                separators=processed_separators,
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap
-            )
-        elif split_method == 'semantic':
-            # 获取语义分割相关参数
-            similarity_threshold = float(request.form.get('similarity_threshold', 0.7))
-            
-            splits = splitter.split_by_semantic(
-                documents=documents,
-                embedding=embedding,
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
-                similarity_threshold=similarity_threshold
-            )
-        else:
-            return jsonify({'error': f'不支持的分割方法: {split_method}'}), 400
+        params = _get_ingest_params(request.form)
+        if params['split_method'] not in SPLIT_METHODS:
+            return jsonify({'error': f'不支持的分割方法: {params["split_method"]}'}), 400
         
-        # 根据vectordb参数选择向量数据库
-        if vectordb.lower() == 'milvus':
-            db = MilvusDB(uploader=request.form.get('uploader', 'api_user'))
-            db.update_documents(splits, collection_name, embedding)
-        else:
-            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
+        # 保存上传的文件，异步任务的文件按任务ID保存，任务结束后删除
+        run_async = request.form.get('async', 'false').lower() in ('true', '1')
+        job_id = str(uuid.uuid4()) if run_async else None
+        file_path = _save_upload(file, job_id)
+        params.update(
+            file_path=file_path,
+            filename=file.filename,
+            collection_name=collection_name,
+            shadow_build=request.form.get('shadow_build', 'false').lower() in ('true', '1')
+        )
+
+        # 异步模式: 提交后台任务，立即返回任务ID
+        if run_async:
+            try:
+                get_ingest_queue().submit('update', params, job_id=job_id)
+            except Exception:
+                _remove_upload(file_path)
+                raise
+            return jsonify({
+                'message': '更新任务已提交',
+                'job_id': job_id,
+                'filename': file.filename,
+                'collection_name': collection_name,
+                'vectordb': vectordb,
+            }), 202
+
+        try:
+            result = run_ingest('update', params)
+        finally:
+            _remove_upload(file_path)
         
         return jsonify({
             'message': '文档更新完成',
-            'updated_by': request.form.get('uploader', 'api_user'),
+            'updated_by': params['uploader'],
             'filename': file.filename,
             'collection_name': collection_name,
             'vectordb': vectordb,
-            'total_splits': len(splits),
+            'total_splits': result['total_splits'],
             'updated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-
 @app.route('/api/<vectordb>/update_byjson_nofile', methods=['POST'])
 def update_collection_byjson_nofile(vectordb):
     """直接通过JSON数据更新已有知识库
@@ -884,6 +1347,7 @@ def update_collection_byjson_nofile(vectordb):
     - collection_name: 要更新的集合名称                **(必填)
     - uploader: 上传者名称                            **(默认api_user)
     - embedding_model: embedding模型名称              **(默认bge-m3)
+    - shadow_build: 是否使用影子构建(构建完成后通过别名原子切换，更新期间检索不中断) **(默认false)
 
     返回:
     - JSON格式的更新结果
@@ -936,7 +1400,8 @@ def update_collection_byjson_nofile(vectordb):
         # 根据数据库类型选择更新方式
         if vectordb.lower() == 'milvus':
             db = MilvusDB(uploader=json_data.get('uploader', 'api_user'))
-            db.update_documents(documents, collection_name, embedding)
+            db.update_documents(documents, collection_name, embedding,
+                                shadow_build=str(json_data.get('shadow_build', 'false')).lower() in ('true', '1'))
         else:
             return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
 
@@ -965,6 +1430,7 @@ def update_collection_byjson(vectordb):
     - collection_name: 要更新的集合名称                **(必填)
     - uploader: 上传者名称                            **(默认api_user)
     - embedding_model: embedding模型名称(仅用于semantic切割方法) **(默认bge-m3)
+    - shadow_build: 是否使用影子构建(构建完成后通过别名原子切换，更新期间检索不中断) **(默认false)
 
     返回:
     - JSON格式的更新结果
@@ -1022,7 +1488,8 @@ def update_collection_byjson(vectordb):
         # 根据数据库类型选择更新方式
         if vectordb.lower() == 'milvus':
             db = MilvusDB(uploader=request.headers.get('uploader', 'api_user'))
-            db.update_documents(documents, collection_name, embedding)
+            db.update_documents(documents, collection_name, embedding,
+                                shadow_build=request.form.get('shadow_build', 'false').lower() in ('true', '1'))
         else:
             return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
 
@@ -1132,11 +1599,13 @@ def add_segments(vectordb):
         # 根据数据库类型选择存储方式
         if vectordb.lower() == 'milvus':
             db = MilvusDB(uploader=data.get('uploader', 'api_user'))
-            db.add_documents(documents, collection_name, embedding)
+            # 批量embedding并一次写入所有片段
+            ids = db.add_documents(documents, collection_name, embedding)
             
             return jsonify({
                 'message': '文档片段添加完成',
                 'collection_name': collection_name,
+                'ids': ids,
                 'total_segments': len(documents),
                 'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             })
@@ -1268,6 +1737,49 @@ def delete_segment(vectordb):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/<vectordb>/delete_segments', methods=['POST'])
+def delete_segments(vectordb):
+    """批量删除指定集合中的片段
+    <vectordb>  **(必填)
+    - milvus: 删除Milvus向量数据库中的片段(默认)
+
+    请求参数(JSON格式):
+    - collection_name: 集合名称     **(必填)
+    - ids: 要删除的片段ID数组        **(必填)
+
+    返回:
+    - JSON格式的删除结果
+    """
+    try:
+        # 获取并验证JSON数据
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': '请求体必须为JSON格式'}), 400
+
+        collection_name = data.get('collection_name')
+        ids = data.get('ids')
+        if not collection_name or not ids or not isinstance(ids, list):
+            return jsonify({'error': '缺少必要参数: collection_name 和 ids'}), 400
+
+        # 根据vectordb参数选择向量数据库
+        if vectordb.lower() == 'milvus':
+            db = MilvusDB()
+            # 一次 id in [...] 删除所有片段
+            deleted = db.delete_document_segments(collection_name, ids)
+            return jsonify({
+                'message': '文档分段批量删除成功',
+                'collection_name': collection_name,
+                'ids': ids,
+                'total_deleted': deleted,
+                'vectordb': vectordb,
+                'deleted_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            })
+        else:
+            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/<vectordb>/update_segment', methods=['POST'])
 def update_segment(vectordb):
     """更新指定集合中的文档片段
@@ -1319,29 +1831,23 @@ def update_segment(vectordb):
         if vectordb.lower() == 'milvus':
             db = MilvusDB(uploader=request.form.get('uploader', 'api_user'))
             
+            # 检查集合是否存在
+            if not db._check_collection_exists(collection_name):
+                return jsonify({'error': f'集合 {collection_name} 不存在'}), 404
+
             try:
                 # 确保集合已加载
                 db._load_collection(collection_name)
-                
-                # 检查集合是否存在
-                if not db._check_collection_exists(collection_name):
-                    return jsonify({'error': f'集合 {collection_name} 不存在'}), 404
                     
-                # 更新文档片段
-                db.update_document_segment(
+                # 更新文档片段(upsert返回更新后的片段信息，无需再次查询)
+                updated_segment = db.update_document_segment(
                     collection_name=collection_name,
                     embedding=embedding,
                     id=uid,
-                    new_content=new_content
+                    new_content=new_content,
+                    new_metadata=metadata
                 )
                 
-                db._release_collection(collection_name)
-                # 重新加载集合以确保获取最新数据
-                db._load_collection(collection_name)
-                
-                # 获取更新后的片段信息
-                updated_segment = db.get_segment(collection_name, uid)
-                
                 return jsonify({
                     'message': '文档片段更新成功',
                     'collection_name': collection_name,
@@ -1360,6 +1866,178 @@ def update_segment(vectordb):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/<vectordb>/update_segments', methods=['POST'])
+def update_segments(vectordb):
+    """批量更新指定集合中的文档片段
+    <vectordb>  **(必填)
+    - milvus: 更新Milvus向量数据库中的片段(默认)
+
+    请求参数(JSON格式):
+    - collection_name: 要更新的集合名称                **(必填)
+    - segments: 片段更新数组                           **(必填)
+      [
+        {
+          "id": "片段ID",
+          "content": "新的文本内容",
+          "metadata": {"key": "新的元数据(可选)"}
+        }
+      ]
+    - embedding_model: embedding模型名称              **(默认bge-m3)
+    - uploader: 上传者名称                            **(默认api_user)
+
+    返回:
+    - JSON格式的更新结果
+    """
+    try:
+        # 获取并验证JSON数据
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': '请求体必须为JSON格式'}), 400
+
+        # 验证必填参数
+        collection_name = data.get('collection_name')
+        segments = data.get('segments')
+        if not collection_name or not segments or not isinstance(segments, list):
+            return jsonify({'error': '必须提供collection_name和segments参数'}), 400
+
+        for segment in segments:
+            if not isinstance(segment, dict) or not segment.get('id') or not segment.get('content'):
+                return jsonify({'error': '每个segment必须包含id和content字段'}), 400
+            if 'metadata' in segment and not isinstance(segment['metadata'], dict):
+                return jsonify({'error': 'metadata参数必须是有效的JSON对象'}), 400
+
+        # 初始化embedding模型
+        embedding_model = data.get('embedding_model', 'bge-m3')
+        # 获取或初始化embedding模型
+        embedding = model_manager.get_embedding_model(embedding_model)
+        if embedding is None:
+            # 如果获取失败，尝试重新初始化
+            embedding = XinferenceEmbedding(
+                base_url=env('XINFERENCE_HOST'),
+                model=embedding_model
+            )
+
+        # 根据数据库类型选择更新方式
+        if vectordb.lower() == 'milvus':
+            db = MilvusDB(uploader=data.get('uploader', 'api_user'))
+
+            # 检查集合是否存在
+            if not db._check_collection_exists(collection_name):
+                return jsonify({'error': f'集合 {collection_name} 不存在'}), 404
+
+            try:
+                # 确保集合已加载
+                db._load_collection(collection_name)
+
+                updated_segments = db.upsert_document_segments(
+                    collection_name=collection_name,
+                    embedding=embedding,
+                    segments=segments
+                )
+
+                return jsonify({
+                    'message': '文档片段批量更新成功',
+                    'collection_name': collection_name,
+                    'total_segments': len(updated_segments),
+                    'segments': [{
+                        'id': segment.get('id'),
+                        'content': segment.get('text', ''),
+                        'metadata': segment.get('metadata', {})
+                    } for segment in updated_segments],
+                    'updated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    'updated_by': data.get('uploader', 'api_user'),
+                })
+            finally:
+                # 确保释放集合资源
+                db._release_collection(collection_name)
+        else:
+            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _format_search_results(docs):
+    """将检索结果文档转换为接口返回格式"""
+    formatted_results = []
+    for i, doc in enumerate(docs):
+        formatted_results.append({
+            'id': i + 1,
+            'content': doc.page_content,
+            'metadata': doc.metadata,
+            'vector_score': doc.metadata.get('vector_score'),
+            'text_score': doc.metadata.get('text_score'),
+            'rerank_score': doc.metadata.get('rerank_score')
+        })
+    return formatted_results
+
+def _partial_event(collection_name, docs):
+    """单个集合的检索结果(流式模式下先行返回)"""
+    results = _format_search_results(docs)
+    return {'event': 'partial', 'collection_name': collection_name, 'total': len(results), 'results': results}
+
+def _final_event(docs):
+    """跨集合去重、排序(及重排序)后的最终结果"""
+    results = _format_search_results(docs)
+    return {'event': 'final', 'total': len(results), 'results': results}
+
+def _get_stream_format(data):
+    """解析流式返回格式
+
+    stream参数为 true/ndjson 时返回ndjson，为 sse 时返回sse；
+    未指定stream但请求头 Accept 为 text/event-stream 时返回sse；否则返回None(非流式)
+    """
+    stream = data.get('stream')
+    if isinstance(stream, str):
+        stream = stream.lower()
+    if stream in (True, 'true', '1', 'ndjson'):
+        return 'ndjson'
+    if stream == 'sse':
+        return 'sse'
+    if stream is None and 'text/event-stream' in request.headers.get('Accept', ''):
+        return 'sse'
+    return None
+
+def _search_response(events, data):
+    """根据请求参数返回检索结果
+
+    events为检索事件生成器，依次产生每个集合的partial事件和最终的final事件。
+    非流式模式下只返回final结果；流式模式下逐个事件以NDJSON或SSE格式推送，
+    客户端可在所有集合检索完成前拿到部分结果。
+    """
+    stream_format = _get_stream_format(data)
+    if stream_format is None:
+        final = {'total': 0, 'results': []}
+        for event in events:
+            if event['event'] == 'final':
+                final = event
+        return jsonify({
+            'total': final['total'],
+            'results': final['results']
+        })
+
+    def generate():
+        try:
+            for event in events:
+                payload = json.dumps(event, ensure_ascii=False, default=str)
+                if stream_format == 'sse':
+                    yield f"event: {event['event']}\ndata: {payload}\n\n"
+                else:
+                    yield payload + "\n"
+        except Exception as e:
+            # 响应头已发送，错误以事件形式返回
+            payload = json.dumps({'event': 'error', 'error': str(e)}, ensure_ascii=False)
+            if stream_format == 'sse':
+                yield f"event: error\ndata: {payload}\n\n"
+            else:
+                yield payload + "\n"
+
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/<vectordb>/search_by_vector', methods=['POST'])
 def search_by_vector(vectordb):
     """通过向量相似度搜索文档
@@ -1375,6 +2053,7 @@ def search_by_vector(vectordb):
     - top_k: 返回结果数量                            **(默认4)
     - score_threshold: 分数阈值                      **(默认0.0)
     - document_ids_filter: 文档ID过滤列表             **(可选)
+    - stream: 流式返回(true/ndjson: NDJSON, sse: Server-Sent Events)，先逐个集合返回partial结果，最后返回final结果 **(默认false)
     
     返回:
     - JSON格式的搜索结果
@@ -1406,30 +2085,9 @@ def search_by_vector(vectordb):
         embedding = None
         
         if vectordb.lower() == 'milvus':
-            # 如果没有指定embedding模型，先尝试从数据库获取存储时使用的模型
+            # 如果没有指定embedding模型，使用第一个集合存储时的模型(读取缓存的集合信息，无需额外查询)
             if embedding_model is None:
-                # 初始化数据库连接
-                db = MilvusDB()
-                # 获取第一个集合的元数据
-                collection_name = collection_names[0]
-                try:
-                    # 查询集合中的一条记录，获取embedding_model信息
-                    db._load_collection(collection_name)
-                    results = db.client.query(
-                        collection_name=collection_name,
-                        filter="",
-                        output_fields=["metadata"],
-                        limit=1
-                    )
-                    if results and len(results) > 0:
-                        metadata = results[0].get("metadata", {})
-                        if isinstance(metadata, str):
-                            metadata = eval(metadata)
-                        embedding_model = metadata.get('embedding_model', 'bge-m3')
-                    db._release_collection(collection_name)
-                except Exception as e:
-                    print(f"获取集合 {collection_name} 的embedding模型信息失败: {str(e)}")
-                    embedding_model = 'bge-m3'  # 默认使用bge-m3
+                embedding_model = MilvusDB().get_embedding_model_name(collection_names[0])
         
         # 获取或初始化embedding模型
         embedding = model_manager.get_embedding_model(embedding_model)
@@ -1448,8 +2106,11 @@ def search_by_vector(vectordb):
         # 兼容单集合和多集合
         if isinstance(collection_names, str):
             collection_names = [collection_names]
-        all_results = []
-        if vectordb.lower() == 'milvus':
+        if vectordb.lower() != 'milvus':
+            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
+
+        def search_events():
+            all_results = []
             db = MilvusDB()
             try:
                 for collection_name in collection_names:
@@ -1464,6 +2125,7 @@ def search_by_vector(vectordb):
                     )
                     all_results.extend(results)
                     db._release_collection(collection_name)
+                    yield _partial_event(collection_name, results)
                 # 去重：使用字典保存唯一内容，保留最高分数的结果
                 unique_results = {}
                 for doc in all_results:
@@ -1474,26 +2136,12 @@ def search_by_vector(vectordb):
                 # 转换为列表并按vector_score降序排序
                 all_results = list(unique_results.values())
                 all_results.sort(key=lambda doc: doc.metadata.get('vector_score', 0), reverse=True)
-                formatted_results = []
-                for i, doc in enumerate(all_results):
-                    result = {
-                        'id': i + 1,
-                        'content': doc.page_content,
-                        'metadata': doc.metadata,
-                        'vector_score': doc.metadata.get('vector_score'),
-                        'text_score': doc.metadata.get('text_score'),
-                        'rerank_score': doc.metadata.get('rerank_score')
-                    }
-                    formatted_results.append(result)
-                return jsonify({
-                    'total': len(formatted_results),
-                    'results': formatted_results
-                })
+                yield _final_event(all_results)
             finally:
                 # 确保释放集合资源
                 db._release_collection(collection_name)
-        else:
-            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
+
+        return _search_response(search_events(), data)
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1512,6 +2160,7 @@ def search_by_full_text(vectordb):
     - top_k: 返回结果数量                            **(默认4)
     - score_threshold: 分数阈值                      **(默认0.3)
     - document_ids_filter: 文档ID过滤列表             **(可选)
+    - stream: 流式返回(true/ndjson: NDJSON, sse: Server-Sent Events)，先逐个集合返回partial结果，最后返回final结果 **(默认false)
     
     返回:
     - JSON格式的搜索结果
@@ -1546,8 +2195,11 @@ def search_by_full_text(vectordb):
         # 兼容单集合和多集合
         if isinstance(collection_names, str):
             collection_names = [collection_names]
-        all_results = []
-        if vectordb.lower() == 'milvus':
+        if vectordb.lower() != 'milvus':
+            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
+
+        def search_events():
+            all_results = []
             db = MilvusDB()
             try:
                 for collection_name in collection_names:
@@ -1561,6 +2213,7 @@ def search_by_full_text(vectordb):
                     )
                     all_results.extend(results)
                     db._release_collection(collection_name)
+                    yield _partial_event(collection_name, results)
                 # 去重：使用字典保存唯一内容，保留最高分数的结果
                 unique_results = {}
                 for doc in all_results:
@@ -1571,27 +2224,12 @@ def search_by_full_text(vectordb):
                 # 转换为列表并按text_score降序排序
                 all_results = list(unique_results.values())
                 all_results.sort(key=lambda doc: doc.metadata.get('text_score', 0), reverse=True)
-                formatted_results = []
-                for i, doc in enumerate(all_results):
-                    result = {
-                        'id': i + 1,
-                        'content': doc.page_content,
-                        'metadata': doc.metadata,
-                        'vector_score': doc.metadata.get('vector_score'),
-                        'text_score': doc.metadata.get('text_score'),
-                        'rerank_score': doc.metadata.get('rerank_score')
-                    }
-                    formatted_results.append(result)
-                
-                return jsonify({
-                    'total': len(formatted_results),
-                    'results': formatted_results
-                })
+                yield _final_event(all_results)
             finally:
                 # 确保释放集合资源
                 db._release_collection(collection_name)
-        else:
-            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
+
+        return _search_response(search_events(), data)
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -1615,6 +2253,7 @@ def search_by_hybrid(vectordb):
     - document_ids_filter: 文档ID过滤列表             **(可选)
     - rerank_model: 重排序模型名称                    **(默认bge-reranker-v2-m3)
     - rerank_top_k: 重排序返回结果数量                **(默认4)
+    - stream: 流式返回(true/ndjson: NDJSON, sse: Server-Sent Events)，先逐个集合返回partial结果，最后返回final结果 **(默认false)
     
     返回:
     - JSON格式的搜索结果
@@ -1655,48 +2294,31 @@ def search_by_hybrid(vectordb):
         # 兼容单集合和多集合
         if isinstance(collection_names, str):
             collection_names = [collection_names]
-        all_results = []
-        if vectordb.lower() == 'milvus':
+        if vectordb.lower() != 'milvus':
+            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
+
+        def search_events():
+            all_results = []
             db = MilvusDB()
             try:
                 for collection_name in collection_names:
                     db.collection_name = collection_name
                     db._load_collection(collection_name)
                     # 初始化embedding模型
-                    # 如果没有指定embedding模型，先尝试从数据库获取存储时使用的模型
-                    if embedding_model is None:
-                        # 获取集合一条数据的元数据
-                        collection_name = collection_names
-                        try:
-                            # 查询集合中的一条记录，获取embedding_model信息
-                            db._load_collection(collection_name)
-                            results = db.client.query(
-                                collection_name=collection_name,
-                                filter="",
-                                output_fields=["metadata"],
-                                limit=1
-                            )
-                            if results and len(results) > 0:
-                                metadata = results[0].get("metadata", {})
-                                if isinstance(metadata, str):
-                                    metadata = eval(metadata)
-                                embedding_model = metadata.get('embedding_model', 'bge-m3')
-                            db._release_collection(collection_name)
-                        except Exception as e:
-                            print(f"获取集合 {collection_name} 的embedding模型信息失败: {str(e)}")
-                            embedding_model = 'bge-m3'  # 默认使用bge-m3
+                    # 如果没有指定embedding模型，使用该集合存储时的模型(读取缓存的集合信息，无需额外查询)
+                    collection_embedding_model = embedding_model or db.get_embedding_model_name(collection_name)
                     # 获取或初始化embedding模型
-                    embedding_model = model_manager.get_embedding_model(embedding_model)
-                    if embedding_model is None:
+                    embedding = model_manager.get_embedding_model(collection_embedding_model)
+                    if embedding is None:
                         # 如果获取失败，尝试重新初始化
-                        embedding_model = XinferenceEmbedding(
+                        embedding = XinferenceEmbedding(
                             base_url=env('XINFERENCE_HOST'),
-                            model=embedding_model
+                            model=collection_embedding_model
                         )
 
                     results = db.search_by_hybrid(
                         query=query,
-                        embedding=embedding_model,
+                        embedding=embedding,
                         vector_weight=vector_weight,
                         text_weight=text_weight,
                         top_k=top_k,
@@ -1705,6 +2327,8 @@ def search_by_hybrid(vectordb):
                     )
                     all_results.extend(results)
                     db._release_collection(collection_name)
+                    # 先行返回该集合的混合检索结果(未重排序)
+                    yield _partial_event(collection_name, results)
                 # 去重：使用字典保存唯一内容，保留最高分数的结果
                 unique_results = {}
                 for doc in all_results:
@@ -1740,30 +2364,16 @@ def search_by_hybrid(vectordb):
                     # 使用weighted_score进行过滤
                     all_results = [doc for doc in all_results if doc.metadata.get('weighted_score', 0) >= score_threshold]
                     all_results = all_results[:top_k]
-                formatted_results = []
-                for i, doc in enumerate(all_results):
-                    result = {
-                        'id': i + 1,
-                        'content': doc.page_content,
-                        'metadata': doc.metadata,
-                        'vector_score': doc.metadata.get('vector_score'),
-                        'text_score': doc.metadata.get('text_score'),
-                        'rerank_score': doc.metadata.get('rerank_score')
-                    }
-                    formatted_results.append(result)
-                
-                return jsonify({
-                    'total': len(formatted_results),
-                    'results': formatted_results
-                })
+                yield _final_event(all_results)
             finally:
                 # 确保释放集合资源
                 db._release_collection(collection_name)
-        else:
-            return jsonify({'error': f'不支持的向量数据库类型: {vectordb}'}), 400
+
+        return _search_response(search_events(), data)
             
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
-    app.run(host=flask_host, port=flask_port, debug=True)
+    # 开发模式: 单进程开发服务器，生产环境请使用 gunicorn -c api/gunicorn.conf.py
+    app.run(host=flask_host, port=flask_port, debug=env.bool('FLASK_DEBUG', default=True))
@@ -0,0 +1,130 @@
+"""gunicorn生产环境配置
+
+启动方式(项目根目录下执行):
+    gunicorn -c api/gunicorn.conf.py
+
+可通过环境变量(或.env)调整:
+    FLASK_HOST / FLASK_PORT        监听地址和端口
+    GUNICORN_WORKERS               worker进程数(默认为CPU核数)
+    GUNICORN_THREADS               每个worker的线程数(默认4)
+    GUNICORN_TIMEOUT               单个请求超时时间/秒(默认600，文档解析和入库耗时较长)
+    GUNICORN_GRACEFUL_TIMEOUT      优雅停机等待时间/秒(默认30)
+    GUNICORN_PRELOAD_APP           是否在主进程中预先导入应用代码(默认false)
+    SPLIT_PROCESS_WORKERS          每个worker的分割进程数(SPLIT_USE_PROCESSES=true时使用)，默认为CPU核数/worker数(至少1个)
+    PARSE_WORKERS_TOTAL            整机的MinerU常驻解析进程总数，按worker编号分配，各worker之和不超过该值；
+                                   worker数多于该值时，多出的worker不启动解析进程也不解析文档(/ready?capability=parser返回503)；
+                                   未设置时每个worker各启动PARSE_WORKERS个
+"""
+import multiprocessing
+import os
+import signal
+
+import environ
+
+env = environ.Env()
+environ.Env.read_env(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env'))
+
+# 模型与客户端在每个worker fork之后预加载，而不是在导入时(主进程中)加载
+os.environ['RAG_DEFER_PRELOAD'] = '1'
+
+chdir = os.path.dirname(os.path.abspath(__file__))
+wsgi_app = 'wsgi:app'
+
+bind = f"{env('FLASK_HOST', default='0.0.0.0')}:{env.int('FLASK_PORT', default=19500)}"
+worker_class = 'gthread'
+workers = env.int('GUNICORN_WORKERS', default=multiprocessing.cpu_count())
+threads = env.int('GUNICORN_THREADS', default=4)
+timeout = env.int('GUNICORN_TIMEOUT', default=600)
+graceful_timeout = env.int('GUNICORN_GRACEFUL_TIMEOUT', default=30)
+keepalive = 5
+
+# 每个worker各自持有一个常驻解析进程池，每个解析进程预加载一份模型(txt、ocr模式各一份)；
+# 启用按页并行解析(MINERU_PAGE_WORKERS>1)时，每个解析进程还会再启动自己的分页进程，每个分页进程各加载一份模型。
+# 整机模型副本数 = 解析进程总数 × (预加载模式数 + MINERU_PAGE_WORKERS × 使用的模式数)，设置PARSE_WORKERS_TOTAL限制解析进程总数
+parse_workers_total = env.int('PARSE_WORKERS_TOTAL', default=0)
+parse_workers = env.int('PARSE_WORKERS', default=0)
+page_workers = env.int('MINERU_PAGE_WORKERS', default=0)
+preload_modes = env.list('PARSE_PRELOAD_MODES', default=['txt', 'ocr'])
+if parse_workers_total > 0:
+    total_parse_processes = parse_workers_total
+elif parse_workers > 0:
+    total_parse_processes = workers * parse_workers
+else:
+    # 未启用常驻解析进程时在worker中解析，模型在首次解析时加载
+    total_parse_processes = workers
+# 常驻解析进程启动时预加载PARSE_PRELOAD_MODES，在worker中解析时按需加载txt、ocr两种模式
+model_copies = total_parse_processes * (len(preload_modes) if parse_workers_total > 0 or parse_workers > 0 else 2)
+if page_workers > 1:
+    # 分页进程按需加载txt、ocr两种模式的模型
+    model_copies += total_parse_processes * page_workers * 2
+print(f"MinerU解析: {total_parse_processes}个解析进程"
+      f"{f'，每个另有{page_workers}个分页进程' if page_workers > 1 else ''}，最多加载 {model_copies} 份模型")
+if parse_workers_total > 0 and parse_workers_total < workers:
+    print(f"警告: PARSE_WORKERS_TOTAL({parse_workers_total})小于worker数({workers})，"
+          f"其中{workers - parse_workers_total}个worker不解析文档，请求分配到这些worker时解析会失败")
+# 每个worker各自持有一个分割进程池，默认按worker数平分CPU核数，避免整机启动 workers × CPU核数 个分割进程
+os.environ.setdefault('SPLIT_PROCESS_WORKERS', str(max(1, multiprocessing.cpu_count() // workers)))
+preload_app = env.bool('GUNICORN_PRELOAD_APP', default=False)
+
+accesslog = '-'
+errorlog = '-'
+
+
+def _parse_workers_for_slot(slot, num_workers):
+    """按worker编号分配解析进程数，各worker之和等于PARSE_WORKERS_TOTAL，编号超出worker数时为0"""
+    if slot >= num_workers:
+        return 0
+    return parse_workers_total // num_workers + (1 if slot < parse_workers_total % num_workers else 0)
+
+
+def pre_fork(server, worker):
+    """(主进程中)为即将启动的worker分配编号，替换退出的worker时复用其编号，解析进程总数保持不变"""
+    if parse_workers_total <= 0:
+        return
+    used = {getattr(w, 'parse_slot', None) for w in server.WORKERS.values()}
+    free = [slot for slot in range(server.num_workers) if slot not in used]
+    # 平滑重启时新旧worker短暂并存，编号已占满则按启动序号复用
+    worker.parse_slot = free[0] if free else worker.age % server.num_workers
+
+
+def post_fork(server, worker):
+    """(worker中)按分配的编号设置本worker的解析进程数，应用代码在此之后才导入"""
+    if parse_workers_total <= 0:
+        return
+    count = _parse_workers_for_slot(worker.parse_slot, server.num_workers)
+    os.environ['PARSE_WORKERS'] = str(count)
+    if count == 0:
+        os.environ['PARSE_ENABLED'] = 'false'
+    server.log.info(f"worker {worker.pid} 编号{worker.parse_slot}，常驻解析进程数: {count}")
+
+
+def post_worker_init(worker):
+    """worker初始化完成后在后台预热(导入重依赖、预加载模型和客户端、启动入库任务队列)，每个worker各自持有一份；
+    同时接管SIGTERM，在gunicorn开始优雅停机时先将/ready标记为503
+    """
+    from api_kl import start_warmup, begin_shutdown
+    start_warmup()
+
+    previous_handler = signal.getsignal(signal.SIGTERM)
+
+    def handle_term(signum, frame):
+        begin_shutdown()
+        if callable(previous_handler):
+            previous_handler(signum, frame)
+
+    signal.signal(signal.SIGTERM, handle_term)
+
+
+def worker_int(worker):
+    """收到SIGINT/SIGQUIT时标记停机"""
+    from api_kl import shutdown
+    shutdown()
+
+
+def worker_exit(server, worker):
+    """worker退出时标记停机(进行中的请求已在graceful_timeout内处理完毕)"""
+    try:
+        from api_kl import shutdown
+        shutdown()
+    except Exception as e:
+        server.log.warning(f"worker {worker.pid} 停机处理失败: {e}")
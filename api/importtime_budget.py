@@ -0,0 +1,71 @@
+"""API冷启动导入耗时检查
+
+使用 python -X importtime 在子进程中导入 api_kl(不启动预热)，统计总导入耗时，
+超过预算或在启动时导入了重依赖时以非零状态码退出，可在CI或发布前执行。
+
+用法(项目根目录下执行):
+    python api/importtime_budget.py [预算毫秒数]
+
+可通过环境变量调整:
+    IMPORT_TIME_BUDGET_MS      导入耗时预算/毫秒(默认3000)
+    IMPORT_TIME_TOP            输出耗时最多的模块数(默认15)
+"""
+import os
+import re
+import subprocess
+import sys
+
+API_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 应由后台预热或首次使用时加载的重依赖，不允许在启动时导入
+HEAVY_MODULES = ('magic_pdf', 'torch', 'transformers', 'pymilvus', 'xinference',
+                 'unstructured', 'langchain_unstructured', 'sklearn', 'jieba', 'nltk')
+
+IMPORT_LINE = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)')
+
+
+def measure_import_time(module='api_kl'):
+    """在子进程中导入模块，返回 [(模块名, 累计耗时微秒, 嵌套层级)]"""
+    env = dict(os.environ)
+    env['RAG_DEFER_PRELOAD'] = '1'
+    env.setdefault('FLASK_HOST', '127.0.0.1')
+    env.setdefault('FLASK_PORT', '19500')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=API_DIR, env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"导入 {module} 失败: {result.stderr[-2000:]}")
+    records = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            records.append((match.group(4), int(match.group(2)), len(match.group(3)) // 2))
+    return records
+
+
+def main():
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else float(os.environ.get('IMPORT_TIME_BUDGET_MS', 3000))
+    top = int(os.environ.get('IMPORT_TIME_TOP', 15))
+
+    records = measure_import_time()
+    # 顶层导入的累计耗时之和即总导入耗时
+    total_ms = sum(cumulative for _, cumulative, level in records if level == 0) / 1000
+
+    print(f"导入耗时最多的 {top} 个模块(累计/毫秒):")
+    for name, cumulative, _ in sorted(records, key=lambda r: r[1], reverse=True)[:top]:
+        print(f"  {cumulative / 1000:10.1f}  {name}")
+
+    heavy = sorted({name for name, _, _ in records if name.split('.')[0] in HEAVY_MODULES})
+    print(f"总导入耗时: {total_ms:.1f}ms, 预算: {budget_ms:.0f}ms")
+
+    failed = False
+    if total_ms > budget_ms:
+        print(f"导入耗时超出预算 {total_ms - budget_ms:.1f}ms")
+        failed = True
+    if heavy:
+        print(f"启动时导入了重依赖: {', '.join(heavy)}")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
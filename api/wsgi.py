@@ -0,0 +1,12 @@
+"""生产环境WSGI入口
+
+使用方式(项目根目录下执行):
+    gunicorn -c api/gunicorn.conf.py
+"""
+import sys
+from pathlib import Path
+
+# 确保可以导入api_kl及rag包
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from api_kl import app  # noqa: E402
@@ -1,7 +1,13 @@
 import os
 import re
+import ast
 import json
 import uuid
+import fcntl
+import itertools
+import tempfile
+import threading
+import time
 from datetime import datetime
 from typing import Any, Optional
 from pymilvus import MilvusClient, DataType, __version__, FunctionType, Function
@@ -18,6 +24,14 @@ env_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.
 environ.Env.read_env(env_file)
 
 class MilvusDB:
+    # segment_id计数器保存在本机的计数文件中，gunicorn的多个worker进程通过文件锁共享
+    _segment_counter_dir = env.str('SEGMENT_COUNTER_DIR', default=os.path.join(tempfile.gettempdir(), 'milvus_segment_counters'))
+    _segment_counter_lock = threading.Lock()
+    # 进程内缓存的集合信息，键为集合名
+    _collection_info_cache = {}
+    _collection_info_lock = threading.Lock()
+    # 集合信息的失效标记文件，集合变化时改写，同一台机器上的其他worker进程据此发现缓存已过期
+    _collection_stamp_dir = env.str('MILVUS_COLLECTION_STAMP_DIR', default=os.path.join(tempfile.gettempdir(), 'milvus_collection_stamps'))
 
     def __init__(self, uploader="system", uri=env.str('MILVUS_URI'), embedding_model=None):
         # 设置环境变量文件路径
@@ -109,10 +123,263 @@ class MilvusDB:
         collection_name: 集合名
 
         返回:
-        bool: 集合是否存在
+        bool: 集合是否存在(集合名或指向集合的别名均视为存在)
         """
         collections = self.client.list_collections()
-        return collection_name in collections
+        if collection_name in collections:
+            return True
+        return collection_name in self.client.list_aliases().get('aliases', [])
+
+    def _resolve_collection(self, collection_name):
+        """将别名解析为实际的物理集合名
+        参数:
+        collection_name: 集合名或别名
+
+        返回:
+        str: 物理集合名(不是别名时原样返回)
+        """
+        try:
+            alias_info = self.client.describe_alias(collection_name)
+            return alias_info.get('collection_name') or collection_name
+        except Exception:
+            return collection_name
+
+    def _get_alias_mapping(self):
+        """获取物理集合名到别名的映射
+
+        返回:
+        dict: {物理集合名: 别名}
+        """
+        mapping = {}
+        for alias in self.client.list_aliases().get('aliases', []):
+            try:
+                collection = self.client.describe_alias(alias).get('collection_name')
+                if collection:
+                    mapping[collection] = alias
+            except Exception as e:
+                print(f"获取别名 {alias} 信息失败: {str(e)}")
+        return mapping
+
+    def _versioned_collection_name(self, collection_name):
+        """生成影子构建使用的版本化集合名"""
+        return f"{collection_name}_v{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+
+    def _legacy_collection_name(self, collection_name, version_name):
+        """早期创建的集合(物理名与对外名相同)切换为别名时改用的名称
+
+        使用与版本集合不同的标记，并由新版本名确定，中断后可根据任务记录的版本名找回
+        """
+        return f"{collection_name}_legacy{version_name[len(collection_name) + 2:]}"
+
+    def _switch_alias(self, client, collection_name, version_name, old_collection):
+        """将对外的集合名指向新版本集合
+
+        参数:
+        client: Milvus客户端
+        collection_name: 对外使用的集合名(别名)
+        version_name: 新版本的物理集合名
+        old_collection: 当前指向的物理集合名(集合不存在时为None)
+
+        返回:
+        str: 被替换下来的物理集合名(需要删除)，没有时返回None
+        """
+        if old_collection is None:
+            # 新建集合: 直接创建别名
+            client.create_alias(collection_name=version_name, alias=collection_name)
+            return None
+        if old_collection != collection_name:
+            # 已经是别名，直接原子切换
+            client.alter_alias(collection_name=version_name, alias=collection_name)
+            return old_collection
+
+        # 早期创建的集合物理名与对外名相同: 先将旧集合改名(只修改元数据，数据保留)，
+        # 再创建别名；创建失败时改回原名，旧数据始终不会丢失
+        legacy_name = self._legacy_collection_name(collection_name, version_name)
+        client.rename_collection(old_name=old_collection, new_name=legacy_name)
+        try:
+            client.create_alias(collection_name=version_name, alias=collection_name)
+        except Exception:
+            client.rename_collection(old_name=legacy_name, new_name=old_collection)
+            raise
+        return legacy_name
+
+    def _drop_version(self, client, version_name):
+        """删除未完成或已被替换的版本集合"""
+        try:
+            if version_name in client.list_collections():
+                client.release_collection(version_name)
+                client.drop_collection(version_name)
+        except Exception as e:
+            print(f"删除版本集合 {version_name} 失败: {str(e)}")
+
+    def cleanup_interrupted_version(self, collection_name, version_name, replaced=None):
+        """清理中断的入库任务遗留的版本集合
+
+        只处理该任务自己创建并记录的版本集合，不会按对外的集合名或命名规则删除其他任务的集合。
+
+        参数:
+        collection_name: 对外使用的集合名
+        version_name: 中断的任务创建的版本化物理集合名
+        replaced: 中断的更新任务要替换的物理集合名
+
+        返回:
+        bool: 该版本是否已经生效(上次执行在切换别名之后中断)，已生效时只清理未删除的旧集合
+        """
+        collections = self.client.list_collections()
+        legacy_name = self._legacy_collection_name(collection_name, version_name)
+        if legacy_name in collections and not self._check_collection_exists(collection_name):
+            # 早期集合已改名但别名尚未创建时中断: 改回原名，恢复对外服务
+            print(f"恢复中断任务改名的集合: {legacy_name} -> {collection_name}")
+            self.client.rename_collection(old_name=legacy_name, new_name=collection_name)
+            collections = self.client.list_collections()
+        if replaced == collection_name:
+            replaced = legacy_name
+        if self._resolve_collection(collection_name) == version_name:
+            if replaced and replaced != version_name and replaced in collections:
+                print(f"清理中断任务未删除的旧集合: {replaced}")
+                self._drop_version(self.client, replaced)
+            return True
+        if version_name in collections:
+            print(f"清理中断任务残留的版本集合: {version_name}")
+            self._drop_version(self.client, version_name)
+        return False
+
+    def _get_original_upload_date(self, client, collection_name):
+        """读取集合中任意一条记录的upload_date，用于更新时保留原始上传时间"""
+        client.load_collection(collection_name)
+        results = client.query(
+            collection_name=collection_name,
+            filter="",
+            output_fields=["metadata"],
+            limit=1
+        )
+        if not results:
+            return None
+        return self._parse_metadata(results[0].get("metadata")).get("upload_date")
+
+    def _peek_splits(self, splits):
+        """取出第一个分段用于探测向量维度
+
+        splits可以是列表，也可以是生成器等只能遍历一次的可迭代对象。
+
+        返回:
+        tuple: (第一个分段, 包含全部分段的可迭代对象)，没有分段时第一个分段为None
+        """
+        if hasattr(splits, '__len__'):
+            return (splits[0] if len(splits) else None), splits
+        iterator = iter(splits)
+        first = next(iterator, None)
+        if first is None:
+            return None, []
+        return first, itertools.chain([first], iterator)
+
+    def _insert_splits(self, client, splits, collection_name, embedding, document_name, upload_date,
+                       last_update_date, batch_size=1000, progress_label="更新进度", progress_callback=None):
+        """分批向集合写入分段数据
+
+        splits按批次逐步消费，传入生成器时内存中只保留当前批次。
+
+        参数:
+        client: Milvus客户端
+        splits: 文档分段列表或可迭代对象
+        collection_name: 写入的物理集合名
+        embedding: 使用的embedding模型
+        document_name: 记录在metadata中的文档名(对外可见的集合名/别名)
+        upload_date: 原始上传时间
+        last_update_date: 最后更新时间
+        batch_size: 每批写入数量
+        progress_label: 进度输出前缀
+        progress_callback: 进度回调 callback(stage, done, total)，分段总数未知时total为None；为空时打印进度
+
+        返回:
+        int: 写入的分段数量
+        """
+        total_splits = len(splits) if hasattr(splits, '__len__') else None
+        iterator = iter(splits)
+        index = 0
+        while True:
+            batch = list(itertools.islice(iterator, batch_size))
+            if not batch:
+                break
+            batch_data = []
+
+            # 处理当前批次的数据
+            for split in batch:
+                # 获取文本内容
+                text = split if isinstance(split, str) else split.page_content
+                vector = embedding.embed_query(text)
+
+                # 构建记录
+                batch_data.append({
+                    "id": str(uuid.uuid4()),
+                    "vector": vector,
+                    "text": str(text),
+                    "metadata": {
+                        "document_name": document_name,
+                        "uploader": self.uploader,
+                        "upload_date": upload_date,
+                        "last_update_date": last_update_date,
+                        "source": "local_upload",
+                        "segment_id": index,
+                        "embedding_model": self.embedding_model
+                    }
+                })
+                index += 1
+            if progress_callback:
+                progress_callback("embed", index, total_splits)
+
+            # 批量插入数据
+            client.insert(collection_name=collection_name, data=batch_data)
+
+            # 显示进度
+            if progress_callback:
+                progress_callback("insert", index, total_splits)
+            elif total_splits:
+                progress = (index / total_splits) * 100
+                print(f"{progress_label}: {progress:.2f}% ({index}/{total_splits})")
+            else:
+                print(f"{progress_label}: 已写入 {index} 条")
+        return index
+
+    def _collection_summary(self, document_name, upload_date, last_update_date):
+        """集合级的元数据，与_insert_splits写入每个分段的元数据一致"""
+        return {
+            "document_name": document_name,
+            "uploader": self.uploader,
+            "upload_date": upload_date,
+            "last_update_date": last_update_date,
+            "source": "local_upload",
+            "embedding_model": self.embedding_model
+        }
+
+    @staticmethod
+    def _parse_summary(description):
+        """解析schema描述中记录的集合级元数据，没有记录(旧版本创建的集合)时返回空字典"""
+        try:
+            summary = json.loads(description or '')
+        except ValueError:
+            return {}
+        return summary if isinstance(summary, dict) else {}
+
+    @staticmethod
+    def _parse_metadata(metadata):
+        """将分段的metadata字段转换为字典，兼容以字符串保存的旧数据(JSON或Python字面量)"""
+        if isinstance(metadata, dict):
+            return metadata
+        if not isinstance(metadata, str):
+            return {}
+        try:
+            parsed = json.loads(metadata)
+        except ValueError:
+            try:
+                parsed = ast.literal_eval(metadata)
+            except (ValueError, SyntaxError):
+                parsed = None
+        return parsed if isinstance(parsed, dict) else {}
+
+    def _build_id_filter(self, ids):
+        """构建按主键批量匹配的过滤表达式，例如 id in ["a", "b"]"""
+        return f"id in {json.dumps([str(uid) for uid in ids], ensure_ascii=False)}"
 
     # 加载集合到内存
     def _load_collection(self, collection_name):
@@ -138,10 +405,11 @@ class MilvusDB:
             # 获取向量维度
             dim = len(embeddings[0])
             
-            # 创建 collection schema
+            # 创建 collection schema，集合级的元数据记录在schema描述中，列出集合时无需加载集合
             schema = MilvusClient.create_schema(
                 auto_id=False,
                 enable_dynamic_field=True,
+                description=json.dumps(metadatas[0], ensure_ascii=False) if metadatas else "",
             )
             
             # 添加字段
@@ -215,102 +483,194 @@ class MilvusDB:
         collection_name: 目标集合名
         embedding: 使用的embedding模型
         """
+        uuid_str = self.add_document_segments([document], collection_name, embedding)[0]
+        print(f"成功向集合 {collection_name} 添加单条数据！ID: {uuid_str}")
+        return uuid_str
+
+    def add_document_segments(self, documents, collection_name, embedding):
+        """向指定集合批量插入文档分段
+
+        向量通过一次批量embedding生成，所有分段通过一次insert写入，
+        segment_id从计数文件分配，不再逐条统计集合行数。
+
+        参数:
+        documents: 文档分段列表（字符串或Document对象）
+        collection_name: 目标集合名
+        embedding: 使用的embedding模型
+
+        返回:
+        list: 新增分段的ID列表
+        """
+        if not documents:
+            return []
+
+        # 保存embedding模型名称
+        if hasattr(embedding, 'model'):
+            self.embedding_model = embedding.model
+
         try:
             # 检查集合是否存在
-            collections = self.client.list_collections()
-            if collection_name not in collections:
+            if not self._check_collection_exists(collection_name):
                 raise Exception(f"集合 {collection_name} 不存在")
 
-            # 获取文本内容和向量
-            text = document if isinstance(document, str) else document.page_content
-            vector = embedding.embed_query(text)
-            
-            # 生成UUID
-            uuid_str = str(uuid.uuid4())
-            
-            # 获取文档总数
-            client = MilvusClient(uri=self.env('MILVUS_URI'))
-            count = client.num_entities(collection_name) if collection_name in client.list_collections() else 0
+            # 批量获取文本内容和向量
+            texts = [str(doc if isinstance(doc, str) else doc.page_content) for doc in documents]
+            vectors = embedding.embed_documents(texts)
+
+            # 分配连续的segment_id
+            first_segment_id = self._allocate_segment_ids(collection_name, len(documents))
 
-            # 创建元数据
             current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            metadata = {
-                "document_name": collection_name,
-                "uploader": self.uploader,
-                "upload_date": current_time,
-                "last_update_date": "null",
-                "source": "single_upload",
-                "segment_id": count + 1  # 动态获取文档数
-            }
-            
-            # 构建数据记录
-            data = {
-                "id": uuid_str,
-                "vector": vector,
-                "text": str(text),
-                "metadata": metadata
-            }
-            
-            # 插入数据
-            client.insert(collection_name=collection_name, data=[data])
-            
-            print(f"成功向集合 {collection_name} 添加单条数据！ID: {uuid_str}")
-            return uuid_str
-            
+            records = []
+            for offset, (doc, text, vector) in enumerate(zip(documents, texts, vectors)):
+                # 创建元数据，调用方传入的元数据不能覆盖系统字段
+                metadata = {"source": "single_upload"}
+                if not isinstance(doc, str):
+                    metadata.update(doc.metadata or {})
+                metadata.update({
+                    "document_name": collection_name,
+                    "uploader": self.uploader,
+                    "upload_date": current_time,
+                    "last_update_date": None,
+                })
+                metadata["segment_id"] = first_segment_id + offset
+                metadata["embedding_model"] = self.embedding_model
+
+                records.append({
+                    "id": str(uuid.uuid4()),
+                    "vector": vector,
+                    "text": text,
+                    "metadata": metadata
+                })
+
+            # 一次插入所有分段
+            self.client.insert(collection_name=collection_name, data=records)
+            self._invalidate_collection_info(collection_name)
+
+            print(f"成功向集合 {collection_name} 添加 {len(records)} 条数据！")
+            return [record["id"] for record in records]
+
         except Exception as e:
-            print(f"单条数据插入失败: {str(e)}")
+            print(f"批量插入数据失败: {str(e)}")
             raise
 
+    def _segment_counter_path(self, collection_name):
+        """集合的segment_id计数文件路径，按别名指向的物理集合区分，集合重建后自动使用新的计数"""
+        os.makedirs(MilvusDB._segment_counter_dir, exist_ok=True)
+        return os.path.join(MilvusDB._segment_counter_dir, f"{self._resolve_collection(collection_name)}.counter")
+
+    def _allocate_segment_ids(self, collection_name, count):
+        """为集合分配连续的segment_id
+
+        计数保存在计数文件中，读取和更新在文件锁内完成，多个worker进程同时插入时不会分配到重复的ID；
+        计数文件不存在时根据集合中已有的最大segment_id初始化。
+
+        参数:
+        collection_name: 集合名
+        count: 需要分配的数量
+
+        返回:
+        int: 分配到的第一个segment_id
+        """
+        path = self._segment_counter_path(collection_name)
+        with MilvusDB._segment_counter_lock, open(path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read().strip()
+                first_segment_id = int(content) if content else self._init_segment_counter(collection_name)
+                f.seek(0)
+                f.truncate()
+                f.write(str(first_segment_id + count))
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return first_segment_id
+
+    def _init_segment_counter(self, collection_name):
+        """根据集合中已有的最大segment_id初始化计数器
+
+        segment_id从0开始连续分配，最大值通常为行数-1；分段被删除过时只需查询segment_id不小于当前估计值的少量分段，
+        不遍历整个集合
+        """
+        next_segment_id = int(self.client.get_collection_stats(collection_name).get('row_count', 0))
+        self.client.load_collection(collection_name)
+        while True:
+            results = self.client.query(
+                collection_name=collection_name,
+                filter=f'metadata["segment_id"] >= {next_segment_id}',
+                output_fields=["metadata"],
+                limit=1000
+            )
+            segment_ids = [r["metadata"]["segment_id"] for r in results
+                           if isinstance(r.get("metadata"), dict) and isinstance(r["metadata"].get("segment_id"), int)]
+            if not segment_ids:
+                return next_segment_id
+            next_segment_id = max(segment_ids) + 1
+
+    def _reset_segment_counter(self, collection_name):
+        """集合被重建或删除前清除其segment_id计数文件"""
+        path = self._segment_counter_path(collection_name)
+        with MilvusDB._segment_counter_lock:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
     # 文档操作方法
     def add_documents(self, splits, collection_name, embedding):
-        """保存分割后的文档到 Milvus 数据库
+        """向已存在的集合追加分割后的文档
 
         参数:
         splits: 分割后的文档列表
         collection_name: 原始文件名
         embedding:使用的embedding模型
+
+        返回:
+        list: 新增分段的ID列表
         """
         if not splits:
             print("没有生成任何文本分段，请检查文档内容！")
-            return
-        # 检查集合是否存在
-        collections = self.client.list_collections()
-        if collection_name not in collections:
-            raise Exception(f"集合 {collection_name} 不存在")
-            
-        # 保存embedding模型名称
-        if hasattr(embedding, 'model'):
-            self.embedding_model = embedding.model
+            return []
 
-        return self.save_to_milvus(splits, collection_name, embedding)
+        return self.add_document_segments(splits, collection_name, embedding)
 
-    def save_to_milvus(self, splits, collection_name, embedding):
+    def save_to_milvus(self, splits, collection_name, embedding, progress_callback=None, version_name=None):
         """保存分割后的文档到 Milvus 数据库
 
         参数:
-        splits: 分割后的文档列表
+        splits: 分割后的文档列表，也可以是按需产生分段的生成器(分批消费，不会一次性读入内存)
         collection_name: 原始文件名
         embedding:使用的embedding模型
+        progress_callback: 进度回调 callback(stage, done, total)，stage为embed或insert；为空时打印进度
+        version_name: 写入的版本化物理集合名(由调用方预先生成并记录，中断后可据此清理)，为空时自动生成
+
+        返回:
+        int: 写入的分段数量
         """
         # 保存embedding模型名称
         if hasattr(embedding, 'model'):
             self.embedding_model = embedding.model
-        if not splits:
+        first_split, splits = self._peek_splits(splits)
+        if first_split is None:
             print("没有生成任何文本分段，请检查文档内容！")
-            return
+            return 0
         
         try:
             # 获取实际的向量维度
-            sample_text = splits[0] if isinstance(splits[0], str) else splits[0].page_content
+            sample_text = first_split if isinstance(first_split, str) else first_split.page_content
             sample_vector = embedding.embed_query(sample_text)
             
-            # 创建集合
-            self.collection_name = collection_name
-            self.create_collection([sample_vector])
+            # 对外的集合名是指向版本化物理集合的别名，之后的更新只需切换别名
+            if self._check_collection_exists(collection_name):
+                raise Exception(f"集合 {collection_name} 已存在")
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            version_name = version_name or self._versioned_collection_name(collection_name)
+            self.collection_name = version_name
+            self.create_collection([sample_vector], [self._collection_summary(collection_name, current_time, None)])
             
             # 准备数据
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            total_splits = len(splits)
             mem = psutil.virtual_memory()
             batch_size = max(100, min(2000, int((mem.available * 0.6) // (1024*1024))))  # 每千条约占1MB
 
@@ -322,153 +682,159 @@ class MilvusDB:
                 auto_flush_interval=1  # 降低自动刷新频率
             )
             
-            # 批量处理数据
-            for batch_start in range(0, total_splits, batch_size):
-                batch_end = min(batch_start + batch_size, total_splits)
-                batch_data = []
-                
-                # 处理当前批次的数据
-                for index in range(batch_start, batch_end):
-                    split = splits[index]
-                    # 获取文本内容
-                    text = split if isinstance(split, str) else split.page_content
-                    vector = embedding.embed_query(text)
-                    
-                    # 生成UUID字符串作为主键
-                    uuid_str = str(uuid.uuid4())
-                    
-                    # 构建记录
-                    record = {
-                        "id": uuid_str,
-                        "vector": vector,
-                        "text": str(text),
-                        "metadata": {
-                            "document_name": collection_name,
-                            "uploader": self.uploader,
-                            "upload_date": current_time,
-                            "last_update_date": None,
-                            "source": "local_upload",
-                            "segment_id": index,
-                            "embedding_model": self.embedding_model
-                        }
-                    }
-                    batch_data.append(record)
-                
-                # 批量插入数据
-                client.insert(collection_name=collection_name, data=batch_data)
-                
-                # 显示进度
-                progress = (batch_end / total_splits) * 100
-                print(f"导入进度: {progress:.2f}% ({batch_end}/{total_splits})")
-            
-            # 加载集合到内存
-            client.load_collection(collection_name)
+            try:
+                # 批量处理数据
+                total_splits = self._insert_splits(
+                    client, splits, version_name, embedding,
+                    document_name=collection_name,
+                    upload_date=current_time,
+                    last_update_date=None,
+                    batch_size=batch_size,
+                    progress_label="导入进度",
+                    progress_callback=progress_callback
+                )
+
+                # 加载集合到内存
+                client.load_collection(version_name)
+
+                # 数据写入并加载完成后才创建对外的集合名
+                self._switch_alias(client, collection_name, version_name, None)
+            except Exception:
+                # 清理未完成的版本集合
+                self._drop_version(client, version_name)
+                raise
+            finally:
+                self.collection_name = collection_name
             
+            self._invalidate_collection_info(collection_name)
             print(f"文档: {collection_name} 成功添加到 Milvus 数据库！\n")
+            return total_splits
             
         except Exception as e:
             print(f"添加文档: {collection_name} 时出错: {e}！\n")
             raise
 
-    def update_documents(self, splits, collection_name, embedding):
+    def update_documents(self, splits, collection_name, embedding, shadow_build=False, progress_callback=None,
+                         version_name=None):
         """更新已存在的文档
 
         参数:
-        splits: 更新后的文档分段列表
+        splits: 更新后的文档分段列表，也可以是按需产生分段的生成器
         collection_name: 集合名
         embedding: 使用的embedding模型
+        shadow_build: 是否使用影子构建模式(构建期间旧集合继续提供检索)；否则构建前释放旧集合以节省内存，
+                      两种模式都在新版本集合构建成功后才切换别名，失败时旧集合保持不变
+        progress_callback: 进度回调 callback(stage, done, total)，为空时打印进度
+        version_name: 新版本的物理集合名(由调用方预先生成并记录，中断后可据此清理)，为空时自动生成
         """
-        if not splits:
+        first_split, splits = self._peek_splits(splits)
+        if first_split is None:
             print("没有生成任何文本分段，请检查文档内容！")
             return
 
+        # 保存embedding模型名称
+        if hasattr(embedding, 'model'):
+            self.embedding_model = embedding.model
+
+        if shadow_build:
+            return self._update_documents_shadow(splits, collection_name, embedding, progress_callback,
+                                                 version_name=version_name)
+
+        # 非影子构建模式同样写入新版本集合，成功后再切换别名并删除旧集合；
+        # 区别是构建前先释放旧集合以节省内存，构建期间该集合不可检索，构建失败时重新加载旧集合
+        try:
+            return self._update_documents_shadow(splits, collection_name, embedding, progress_callback,
+                                                 release_old=True, version_name=version_name)
+        except Exception as e:
+            print(f"更新文档: {collection_name} 时出错: {e}！\n")
+            raise
+
+    def _update_documents_shadow(self, splits, collection_name, embedding, progress_callback=None,
+                                 release_old=False, version_name=None):
+        """影子构建模式更新文档
+
+        在版本化的新集合中完成写入、建索引和加载后，再将别名原子切换到新集合并删除旧版本。
+        切换前检索始终命中旧集合，不会出现集合不存在或未加载的情况。
+
+        参数:
+        splits: 更新后的文档分段列表
+        collection_name: 对外使用的集合名(别名)
+        embedding: 使用的embedding模型
+        progress_callback: 进度回调 callback(stage, done, total)，为空时打印进度
+        release_old: 构建前是否释放旧集合(节省内存，构建期间旧集合不可检索，失败时重新加载)
+        version_name: 新版本的物理集合名，为空时自动生成
+        """
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        client = MilvusClient(uri=self.env('MILVUS_URI'))
+
+        # 检查集合是否存在
+        if not self._check_collection_exists(collection_name):
+            raise Exception(f"集合 {collection_name} 不存在")
+
+        old_collection = self._resolve_collection(collection_name)
+        original_upload_date = self._get_original_upload_date(client, collection_name)
+        version_name = version_name or self._versioned_collection_name(collection_name)
+
+        def restore_old():
+            if release_old:
+                try:
+                    client.load_collection(old_collection)
+                except Exception as e:
+                    print(f"重新加载集合 {old_collection} 失败: {e}")
+
+        if release_old:
+            client.release_collection(old_collection)
 
         try:
-            client = MilvusClient(uri=self.env('MILVUS_URI'))
-            
-            # 检查集合是否存在
-            if collection_name not in client.list_collections():
-                raise Exception(f"集合 {collection_name} 不存在")
+            # 创建新版本集合(create_collection会同时创建索引)
+            self.collection_name = version_name
+            first_split, splits = self._peek_splits(splits)
+            sample_text = first_split if isinstance(first_split, str) else first_split.page_content
+            sample_vector = embedding.embed_query(sample_text)
+            self.create_collection([sample_vector], [self._collection_summary(
+                collection_name, original_upload_date or current_time, current_time)])
 
-            # 获取原有集合的metadata
-            original_upload_date = None
-            if collection_name in client.list_collections():
-                # 加载集合
-                client.load_collection(collection_name)
-                # 获取任意一条记录的metadata
-                results = client.query(
-                    collection_name=collection_name,
-                    filter="",
-                    output_fields=["metadata"],
-                    limit=1
-                )
-                if results:
-                    metadata = results[0].get("metadata", {})
-                    if isinstance(metadata, str):
-                        metadata = eval(metadata)
-                    original_upload_date = metadata.get("upload_date")
-                # 删除原有集合
-                client.drop_collection(collection_name)
-            
-            # 准备批量处理
-            total_splits = len(splits)
-            batch_size = 1000  # 每批处理1000条数据
-            
-            # 创建集合
+            # 写入新版本数据
+            self._insert_splits(
+                client, splits, version_name, embedding,
+                document_name=collection_name,
+                upload_date=original_upload_date or current_time,
+                last_update_date=current_time,
+                progress_label="影子构建进度",
+                progress_callback=progress_callback
+            )
+
+            # 加载新版本集合，load_collection会等待加载完成
+            client.load_collection(version_name)
+        except Exception as e:
+            print(f"影子构建集合 {version_name} 时出错: {e}！\n")
+            # 清理未完成的新版本集合，旧集合保持不变
+            self._drop_version(client, version_name)
+            restore_old()
+            raise
+        finally:
             self.collection_name = collection_name
-            sample_text = splits[0] if isinstance(splits[0], str) else splits[0].page_content
-            sample_vector = embedding.embed_query(sample_text)
-            self.create_collection([sample_vector])
-            
-            # 批量处理数据
-            for batch_start in range(0, total_splits, batch_size):
-                batch_end = min(batch_start + batch_size, total_splits)
-                batch_data = []
-                
-                # 处理当前批次的数据
-                for index in range(batch_start, batch_end):
-                    split = splits[index]
-                    # 获取文本内容
-                    text = split if isinstance(split, str) else split.page_content
-                    vector = embedding.embed_query(text)
-                    
-                    # 生成UUID字符串作为主键
-                    uuid_str = str(uuid.uuid4())
-                    
-                    # 构建记录
-                    record = {
-                        "id": uuid_str,
-                        "vector": vector,
-                        "text": str(text),
-                        "metadata": {
-                            "document_name": collection_name,
-                            "uploader": self.uploader,
-                            "upload_date": original_upload_date or current_time,
-                            "last_update_date": current_time,
-                            "source": "local_upload",
-                            "segment_id": index
-                        }
-                    }
-                    batch_data.append(record)
-                
-                # 批量插入数据
-                client.insert(collection_name=collection_name, data=batch_data)
-                
-                # 显示进度
-                progress = (batch_end / total_splits) * 100
-                print(f"更新进度: {progress:.2f}% ({batch_end}/{total_splits})")
-            
-            # 加载集合到内存
-            client.load_collection(collection_name)
-            
-            print(f"文档: {collection_name} 更新成功！\n")
-            
+
+        # 旧版本集合的segment_id计数随其一起废弃
+        self._reset_segment_counter(collection_name)
+        try:
+            replaced = self._switch_alias(client, collection_name, version_name, old_collection)
         except Exception as e:
-            print(f"更新文档: {collection_name} 时出错: {e}！\n")
+            print(f"切换集合 {collection_name} 的别名时出错: {e}！\n")
+            # 切换失败时旧集合仍然对外提供服务，删除新版本集合
+            self._drop_version(client, version_name)
+            restore_old()
             raise
 
-    def update_document_segment(self, collection_name, embedding, id, new_content):
+        # 删除被替换的旧版本集合
+        if replaced:
+            self._drop_version(client, replaced)
+
+        self._invalidate_collection_info(collection_name)
+        print(f"文档: {collection_name} 更新成功，当前版本: {version_name}！\n")
+        return version_name
+
+    def update_document_segment(self, collection_name, embedding, id, new_content, new_metadata=None):
         """更新文档中的特定分段
 
         参数:
@@ -476,70 +842,77 @@ class MilvusDB:
         embedding: 使用的embedding模型
         id: 分段的唯一标识符
         new_content: 新的分段内容
+        new_metadata: 需要合并到原有元数据中的新元数据(可选)
+
+        返回:
+        dict: 更新后的分段信息(id、text、metadata)
         """
+        segment = {"id": id, "content": new_content}
+        if new_metadata:
+            segment["metadata"] = new_metadata
+        return self.upsert_document_segments(collection_name, embedding, [segment])[0]
+
+    def upsert_document_segments(self, collection_name, embedding, segments):
+        """批量更新文档分段
+
+        一次查询取回所有分段的原始元数据，批量生成向量后通过一次upsert写回，
+        更新过程中分段始终存在，不会出现先删除后插入的空窗期。
+
+        参数:
+        collection_name: 集合名
+        embedding: 使用的embedding模型
+        segments: 分段更新列表，每项格式为 {"id": 分段ID, "content": 新内容, "metadata": 新元数据(可选)}
+
+        返回:
+        list: 更新后的分段信息列表(id、text、metadata)
+        """
+        if not segments:
+            return []
+
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        ids = [str(segment["id"]) for segment in segments]
 
         try:
-            client = MilvusClient(uri=self.env('MILVUS_URI'))
-            
-            # 检查集合是否存在
-            if collection_name not in client.list_collections():
-                raise Exception(f"集合 {collection_name} 不存在")
-            # 检测分段是否存在
-            results = client.query(
+            # 一次查询获取所有分段的原始元数据
+            results = self.client.query(
                 collection_name=collection_name,
-                filter=f'id == "{id}"',
-                output_fields=["id"],
-                limit=1
+                filter=self._build_id_filter(ids),
+                output_fields=["id", "metadata"]
             )
-            if not results:
-                raise Exception(f"找不到ID为 {id} 的分段")
+            original_metadata = {}
+            for result in results:
+                original_metadata[result["id"]] = self._parse_metadata(result.get("metadata"))
 
-            # 加载集合
-            client.load_collection(collection_name)
-            
-            # 生成新的向量
-            new_vector = embedding.embed_query(new_content)
-            
-            # 获取原始数据
-            results = client.query(
-                collection_name=collection_name,
-                filter=f'id == "{id}"',
-                output_fields=["metadata"]
-            )
-            
-            if not results:
-                raise Exception(f"找不到ID为 {id} 的分段")
-                
-            original_metadata = results[0].get("metadata", {})
-            if isinstance(original_metadata, str):
-                original_metadata = eval(original_metadata)
-            
-            # 更新元数据，保留原有的upload_date
-            metadata = original_metadata.copy()
-            metadata["last_update_date"] = current_time
-            
-            # 删除原始数据
-            client.delete(
-                collection_name=collection_name,
-                filter=f'id == "{id}"'
-            )
-            
-            # 插入新数据
-            client.insert(
-                collection_name=collection_name,
-                data={
-                    "id": id,
-                    "vector": new_vector,
-                    "text": str(new_content),
+            missing_ids = [uid for uid in ids if uid not in original_metadata]
+            if missing_ids:
+                raise Exception(f"找不到ID为 {', '.join(missing_ids)} 的分段")
+
+            # 批量生成新的向量
+            contents = [str(segment["content"]) for segment in segments]
+            vectors = embedding.embed_documents(contents)
+
+            records = []
+            for uid, content, vector, segment in zip(ids, contents, vectors, segments):
+                # 更新元数据，保留原有的upload_date
+                metadata = original_metadata[uid].copy()
+                metadata.update(segment.get("metadata") or {})
+                metadata["last_update_date"] = current_time
+                records.append({
+                    "id": uid,
+                    "vector": vector,
+                    "text": content,
                     "metadata": metadata
-                }
-            )
-            
-            print(f"文档 {collection_name} 的分段 {id} 更新成功！\n")
-            
+                })
+
+            # 一次upsert写回所有分段
+            self.client.upsert(collection_name=collection_name, data=records)
+            self._invalidate_collection_info(collection_name)
+
+            print(f"文档 {collection_name} 的 {len(records)} 个分段更新成功！\n")
+            return [{"id": r["id"], "text": r["text"], "metadata": r["metadata"]} for r in records]
+
         except Exception as e:
-            print(f"更新文档 {collection_name} 的分段 {id} 时出错: {e}！\n")
+            print(f"更新文档 {collection_name} 的分段 {', '.join(ids)} 时出错: {e}！\n")
             raise
 
     def delete_collection(self, collection_name):
@@ -555,12 +928,19 @@ class MilvusDB:
             client = MilvusClient(uri=self.env('MILVUS_URI'))
             
             # 检查集合是否存在
-            if collection_name not in client.list_collections():
+            if not self._check_collection_exists(collection_name):
                 print(f"集合 {collection_name} 不存在")
                 return False
             
+            # 别名需要先解除，再删除其指向的物理集合
+            self._reset_segment_counter(collection_name)
+            physical_name = self._resolve_collection(collection_name)
+            if physical_name != collection_name:
+                client.drop_alias(collection_name)
+
             # 删除整个collection
-            client.drop_collection(collection_name)
+            client.drop_collection(physical_name)
+            self._invalidate_collection_info(collection_name)
             print(f"文档: {collection_name} 删除成功！")
             return True
             
@@ -575,34 +955,55 @@ class MilvusDB:
         collection_name: 文件名
         id: 分段的唯一标识符
         """
+        if self.delete_document_segments(collection_name, [id], check_exists=True) == 0:
+            raise Exception(f"找不到ID为 {id} 的分段")
+
+    def delete_document_segments(self, collection_name, ids, check_exists=False):
+        """批量删除文档中的分段，只发起一次 id in [...] 删除请求
+
+        参数:
+        collection_name: 文件名
+        ids: 分段唯一标识符列表
+        check_exists: 是否先查询实际存在的分段(需要加载集合，多一次查询)，用于返回准确的删除数量
+
+        返回:
+        int: 删除的分段数量；不检查时为Milvus返回的删除数量(按主键删除时即请求的ID数)
+        """
+        if not ids:
+            return 0
+
         try:
-            client = MilvusClient(uri=self.env('MILVUS_URI'))
-            
-            # 检查集合是否存在
-            collections = self.client.list_collections()
-            if collection_name not in collections:
-                raise Exception(f"集合 {collection_name} 不存在")
+            if check_exists:
+                # Milvus按条件删除时不检查分段是否存在，先查询出实际存在的分段
+                self.client.load_collection(collection_name)
+                results = self.client.query(
+                    collection_name=collection_name,
+                    filter=self._build_id_filter(ids),
+                    output_fields=["id"]
+                )
+                ids = [r["id"] for r in results]
+                if not ids:
+                    print(f"文档 {collection_name} 中没有要删除的分段\n")
+                    return 0
 
-            # 验证分段是否存在
-            results = client.query(
+            result = self.client.delete(
                 collection_name=collection_name,
-                filter=f'id == "{id}"',
-                output_fields=["id"],
-                limit=1
+                filter=self._build_id_filter(ids)
             )
-            if not results:
-                raise Exception(f"找不到ID为 {id} 的分段")
+            # 不同版本的pymilvus返回删除数量的字典或被删除主键的列表
+            if isinstance(result, dict):
+                delete_count = result.get("delete_count", len(ids))
+            elif isinstance(result, list):
+                delete_count = len(result)
+            else:
+                delete_count = len(ids)
+            self._invalidate_collection_info(collection_name)
+
+            print(f"文档 {collection_name} 的 {delete_count} 个分段删除成功！\n")
+            return delete_count
 
-            # 删除特定分段
-            client.delete(
-                collection_name=collection_name,
-                filter=f'id == "{id}"'
-            )
-            
-            print(f"文档 {collection_name} 的分段 {id} 删除成功！\n")
-            
         except Exception as e:
-            print(f"删除文档 {collection_name} 的分段 {id} 时出错: {e}！\n")
+            print(f"删除文档 {collection_name} 的分段时出错: {e}！\n")
             raise
     
     # 查询方法
@@ -616,35 +1017,9 @@ class MilvusDB:
         dict: 包含集合元数据的字典
         """
         try:
-            # 检查集合是否存在
-            collections = self.client.list_collections()
-            if collection_name not in collections:
-                raise Exception(f"集合 {collection_name} 不存在")
-
-            # 添加limit参数避免空表达式错误
-            collection_info = self.client.query(
-                collection_name=collection_name,
-                filter="",
-                output_fields=["metadata"],
-                limit=1
-            )
-            
-            if not collection_info:
-                return {
-                    'metadata': {},
-                    'name': collection_name
-                }
-                
-            # 确保返回数据格式一致
-            metadata = collection_info[0].get("metadata", {})
-            if isinstance(metadata, str):
-                try:
-                    metadata = eval(metadata)
-                except:
-                    metadata = {}
-            
+            info = self.get_collection_info(collection_name)
             return {
-                'metadata': metadata,
+                'metadata': info.get('metadata', {}),
                 'name': collection_name
             }
         except Exception as e:
@@ -653,7 +1028,134 @@ class MilvusDB:
                 'metadata': {},
                 'name': collection_name
             }
-            
+
+    def get_collection_info(self, collection_name, refresh=False):
+        """获取集合的缓存信息(embedding模型、向量维度、行数、索引类型及一条记录的元数据)
+
+        信息按集合名缓存在进程内，入库、更新和删除时失效；失效标记写入 MILVUS_COLLECTION_STAMP_DIR 下的文件，
+        同一台机器上的其他worker进程读取缓存时比对标记，集合被删除重建后不会继续使用旧的模型和维度。
+        缓存超过 MILVUS_METADATA_CACHE_TTL 秒(默认300)后也会重新获取，用于多台机器部署时的一致性。
+
+        参数:
+        collection_name: 集合名称
+        refresh: 是否忽略缓存强制重新获取
+
+        返回:
+        dict: 包含 embedding_model、dimension、row_count、index_type、metadata 的字典
+        """
+        ttl = self.env.int('MILVUS_METADATA_CACHE_TTL', default=300)
+        # 获取信息前读取失效标记，获取期间集合发生变化时下次读取会重新获取
+        stamp = self._read_collection_stamp(collection_name)
+        if not refresh:
+            with MilvusDB._collection_info_lock:
+                cached = MilvusDB._collection_info_cache.get(collection_name)
+            if cached and cached['stamp'] == stamp and time.monotonic() - cached['cached_at'] < ttl:
+                return cached['info']
+
+        if not self._check_collection_exists(collection_name):
+            raise Exception(f"集合 {collection_name} 不存在")
+
+        # 向量维度
+        dimension = None
+        description = self.client.describe_collection(collection_name)
+        for field in description.get('fields', []):
+            if field.get('name') == 'vector':
+                dimension = field.get('params', {}).get('dim')
+
+        # 向量索引类型
+        index_type = None
+        try:
+            index_info = self.client.describe_index(collection_name, index_name="vector")
+            index_type = index_info.get('index_type')
+        except Exception as e:
+            print(f"获取集合 {collection_name} 的索引信息失败: {str(e)}")
+
+        # 行数
+        row_count = int(self.client.get_collection_stats(collection_name).get('row_count', 0))
+
+        # 集合级的元数据(含embedding模型)记录在schema描述中，无需加载集合；
+        # 旧版本创建的集合没有记录描述，此时才加载集合查询一条记录
+        metadata = self._parse_summary(description.get('description'))
+        if not metadata:
+            self.client.load_collection(collection_name)
+            results = self.client.query(
+                collection_name=collection_name,
+                filter="",
+                output_fields=["metadata"],
+                limit=1
+            )
+            if results:
+                metadata = self._parse_metadata(results[0].get("metadata"))
+
+        info = {
+            'name': collection_name,
+            'embedding_model': metadata.get('embedding_model'),
+            'dimension': dimension,
+            'row_count': row_count,
+            'index_type': index_type,
+            'metadata': metadata
+        }
+        with MilvusDB._collection_info_lock:
+            MilvusDB._collection_info_cache[collection_name] = {
+                'info': info,
+                'stamp': stamp,
+                'cached_at': time.monotonic()
+            }
+        return info
+
+    def get_embedding_model_name(self, collection_name, default='bge-m3'):
+        """获取集合存储时使用的embedding模型名称(读取缓存的集合信息)
+
+        参数:
+        collection_name: 集合名称
+        default: 获取失败或集合未记录时使用的模型名称
+
+        返回:
+        str: embedding模型名称
+        """
+        try:
+            return self.get_collection_info(collection_name).get('embedding_model') or default
+        except Exception as e:
+            print(f"获取集合 {collection_name} 的embedding模型信息失败: {str(e)}")
+            return default
+
+    def _collection_stamp_path(self, collection_name):
+        os.makedirs(MilvusDB._collection_stamp_dir, exist_ok=True)
+        return os.path.join(MilvusDB._collection_stamp_dir, f"{collection_name}.stamp")
+
+    def _read_collection_stamp(self, collection_name):
+        """读取集合信息的失效标记，集合从未变化过时为空字符串"""
+        try:
+            with open(self._collection_stamp_path(collection_name)) as f:
+                return f.read()
+        except OSError:
+            return ''
+
+    def _invalidate_collection_info(self, collection_name):
+        """集合数据发生变化后清除其缓存信息，并改写失效标记使其他worker进程的缓存失效"""
+        with MilvusDB._collection_info_lock:
+            MilvusDB._collection_info_cache.pop(collection_name, None)
+        path = self._collection_stamp_path(collection_name)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                f.write(uuid.uuid4().hex)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"更新集合 {collection_name} 的缓存失效标记失败: {str(e)}")
+
+    def _get_collection_summary(self, physical_name, collection_name):
+        """从schema描述中读取集合级的元数据
+
+        旧版本创建的集合没有记录描述，此时使用已缓存的集合信息，缓存中也没有时返回空字典。
+        """
+        summary = self._parse_summary(self.client.describe_collection(physical_name).get('description'))
+        if summary:
+            return summary
+        with MilvusDB._collection_info_lock:
+            cached = MilvusDB._collection_info_cache.get(collection_name)
+        return cached['info'].get('metadata', {}) if cached else {}
+
     def list_collections(self):
         """获取所有集合的列表
         
@@ -664,46 +1166,28 @@ class MilvusDB:
             # 获取所有集合名称
             collection_names = self.client.list_collections()
             collections = []
+            # 影子构建的版本化集合通过别名对外提供，列表中显示别名
+            alias_mapping = self._get_alias_mapping()
             
-            # 获取每个集合的详细信息
-            for name in collection_names:
+            # 列表只读取集合描述和统计信息，不加载集合；详细信息见get_collection_info
+            for physical_name in collection_names:
+                name = alias_mapping.get(physical_name, physical_name)
                 try:
-                    collection_info = self.client.describe_collection(name)
-                    stats = self.client.get_collection_stats(name)
-                    
-                    # 查询一条记录以获取元数据信息
-                    metadata = {}
-                    results = self.client.query(
-                        collection_name=name,
-                        filter="",
-                        output_fields=["metadata"],
-                        limit=1
-                    )
-                    if results and len(results) > 0:
-                        metadata = results[0].get("metadata", {})
-                        if isinstance(metadata, str):
-                            metadata = eval(metadata)
-                    
-                    collections.append({
-                        'name': name,
-                        'row_count': stats.get('row_count', 0),
-                        'document_name': metadata.get('document_name', name),
-                        'uploader': metadata.get('uploader', 'unknown'),
-                        'upload_date': metadata.get('upload_date', ''),
-                        'last_update_date': metadata.get('last_update_date', ''),
-                        'source': metadata.get('source', '')
-                    })
+                    metadata = self._get_collection_summary(physical_name, name)
+                    row_count = int(self.client.get_collection_stats(physical_name).get('row_count', 0))
                 except Exception as e:
                     print(f"获取集合 {name} 的详细信息失败: {str(e)}")
-                    collections.append({
-                        'name': name,
-                        'row_count': 0,
-                        'document_name': name,
-                        'uploader': 'unknown',
-                        'upload_date': '',
-                        'last_update_date': '',
-                        'source': ''
-                    })
+                    metadata, row_count = {}, 0
+
+                collections.append({
+                    'name': name,
+                    'row_count': row_count,
+                    'document_name': metadata.get('document_name') or name,
+                    'uploader': metadata.get('uploader') or 'unknown',
+                    'upload_date': metadata.get('upload_date') or '',
+                    'last_update_date': metadata.get('last_update_date') or '',
+                    'source': metadata.get('source') or ''
+                })
             
             return collections
         except Exception as e:
@@ -723,8 +1207,7 @@ class MilvusDB:
             client = MilvusClient(uri=self.env('MILVUS_URI'))
             
             # 检查集合是否存在
-            collections = self.client.list_collections()
-            if collection_name not in collections:
+            if not self._check_collection_exists(collection_name):
                 raise Exception(f"集合 {collection_name} 不存在")
             
             # 加载集合
@@ -765,8 +1248,7 @@ class MilvusDB:
             client = MilvusClient(uri=self.env('MILVUS_URI'))
             
             # 检查集合是否存在
-            collections = self.client.list_collections()
-            if collection_name not in collections:
+            if not self._check_collection_exists(collection_name):
                 raise Exception(f"集合 {collection_name} 不存在")
             
             # 加载集合
@@ -822,16 +1304,8 @@ class MilvusDB:
                 document_ids = ", ".join(f"'{id}'" for id in document_ids_filter)
                 filter = f'metadata["document_id"] in ({document_ids})'
 
-            client = MilvusClient(uri=self.env('MILVUS_URI'))
-            
-            # 加载集合
-            client.load_collection(self.collection_name)
-            # 检查集合是否存在
-            collections = client.list_collections()
-            if self.collection_name not in collections:
-                raise Exception(f"集合 {self.collection_name} 不存在")
-
-            results = client.search(
+            # 集合已在上面检查并加载，直接复用当前客户端搜索
+            results = self.client.search(
                 collection_name=self.collection_name,
                 data=[query_vector],
                 anns_field="vector",
@@ -1031,14 +1505,8 @@ class MilvusDB:
                 document_ids = ", ".join(f"'{id}'" for id in document_ids_filter)
                 filter_str = f'metadata["document_id"] in ({document_ids})'
             
-            client = MilvusClient(uri=self.env('MILVUS_URI'))
-            
-            # 加载集合
-            client.load_collection(self.collection_name)
-            # 检查集合是否存在
-            collections = client.list_collections()
-            if self.collection_name not in collections:
-                raise Exception(f"集合 {self.collection_name} 不存在")
+            # 集合已在上面检查并加载，直接复用当前客户端搜索
+            client = self.client
             
             # 执行向量搜索
             vector_results = client.search(
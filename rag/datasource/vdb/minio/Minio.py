@@ -1,10 +1,29 @@
 from minio import Minio
 from minio.error import S3Error
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, Optional, Iterator, Dict, List, Tuple, BinaryIO
+import mimetypes
+import threading
+import io
+import environ
 import os
-from typing import Union, Optional
+
+# 初始化环境变量
+env = environ.Env()
+env_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))), '.env')
+environ.Env.read_env(env_file)
+
+# 按文本解码的内容类型和扩展名，其他对象(pdf、office、图片等)一律按二进制返回
+TEXT_CONTENT_TYPES = ('text/', 'application/json', 'application/xml', 'application/javascript')
+TEXT_EXTENSIONS = ('.txt', '.csv', '.json', '.md', '.markdown', '.html', '.htm', '.xml')
 
 class MinIOStorage:
-    def __init__(self, endpoint: str = None, access_key: str = None, secret_key: str = None, secure: bool = True):
+    # 本进程内已确认存在的存储桶，键为(服务地址, 桶名)，每个桶只检查一次
+    _known_buckets = set()
+    _bucket_lock = threading.Lock()
+
+    def __init__(self, endpoint: str = None, access_key: str = None, secret_key: str = None, secure: bool = True,
+                 part_size: int = None, max_workers: int = None, parallel_threshold: int = None):
         """
         初始化 MinIO 客户端
         Args:
@@ -12,7 +31,14 @@ class MinIOStorage:
             access_key: 访问密钥(可选)
             secret_key: 密钥(可选)
             secure: 是否使用HTTPS
+            part_size: 分段上传/下载时每段的字节数(默认MINIO_PART_SIZE，16MB，不小于5MB)
+            max_workers: 分段下载和批量上传的并发数(默认MINIO_DOWNLOAD_WORKERS，4)
+            parallel_threshold: 超过该字节数的对象分段并发下载(默认MINIO_PARALLEL_THRESHOLD，64MB)
         """
+        # S3分段上传要求每段(最后一段除外)不小于5MB
+        self.part_size = max(part_size or env.int('MINIO_PART_SIZE', default=16 * 1024 * 1024), 5 * 1024 * 1024)
+        self.max_workers = max_workers or env.int('MINIO_DOWNLOAD_WORKERS', default=4)
+        self.parallel_threshold = parallel_threshold or env.int('MINIO_PARALLEL_THRESHOLD', default=64 * 1024 * 1024)
         # 处理endpoint，移除协议和路径部分
         if endpoint:
             # 移除http://或https://前缀
@@ -23,6 +49,7 @@ class MinIOStorage:
             # 确保包含端口号
             if ':' not in endpoint:
                 endpoint += ':9000'  # MinIO默认端口
+        self.endpoint = endpoint
         self.client = Minio(
             endpoint=endpoint,
             access_key=access_key,
@@ -49,15 +76,15 @@ class MinIOStorage:
         """
         try:
             # 确保bucket存在
-            if not self.client.bucket_exists(bucket_name):
-                self.client.make_bucket(bucket_name)
+            self.ensure_bucket(bucket_name)
             
             # 上传文件
             self.client.fput_object(
                 bucket_name=bucket_name,
                 object_name=object_name,
                 file_path=file_path,
-                content_type=content_type
+                content_type=content_type or 'application/octet-stream',
+                part_size=self.part_size
             )
             return True
             
@@ -65,6 +92,122 @@ class MinIOStorage:
             print(f"上传文件失败: {e}")
             return False
 
+    def ensure_bucket(self, bucket_name: str) -> None:
+        """确保存储桶存在，检查结果按服务地址在进程内缓存"""
+        key = (self.endpoint, bucket_name)
+        if key in self._known_buckets:
+            return
+        with self._bucket_lock:
+            if key in self._known_buckets:
+                return
+            if not self.client.bucket_exists(bucket_name):
+                self.client.make_bucket(bucket_name)
+            self._known_buckets.add(key)
+
+    def upload_bytes(self,
+                     bucket_name: str,
+                     object_name: str,
+                     data: Union[bytes, bytearray, BinaryIO],
+                     length: Optional[int] = None,
+                     content_type: Optional[str] = None) -> bool:
+        """
+        从内存缓冲区或类文件对象上传到 MinIO，不写入本地临时文件
+        
+        Args:
+            bucket_name: 存储桶名称
+            object_name: 对象名称（在桶中的路径）
+            data: 文件内容(bytes)或可读的类文件对象
+            length: 类文件对象的数据长度，未知时按part_size分段流式上传
+            content_type: 文件的MIME类型
+            
+        Returns:
+            bool: 上传是否成功
+        """
+        try:
+            self.ensure_bucket(bucket_name)
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                length = len(data)
+                data = io.BytesIO(data)
+            self.client.put_object(
+                bucket_name=bucket_name,
+                object_name=object_name,
+                data=data,
+                length=length if length is not None else -1,
+                content_type=content_type or mimetypes.guess_type(object_name)[0] or 'application/octet-stream',
+                part_size=self.part_size
+            )
+            return True
+
+        except S3Error as e:
+            print(f"上传文件失败: {e}")
+            return False
+
+    def upload_files(self,
+                     bucket_name: str,
+                     files: List[Tuple[str, Union[str, os.PathLike, bytes, bytearray, BinaryIO]]],
+                     max_workers: Optional[int] = None) -> Dict[str, bool]:
+        """
+        批量并发上传文件到 MinIO
+        
+        Args:
+            bucket_name: 存储桶名称
+            files: (对象名称, 本地文件路径或内存内容) 列表
+            max_workers: 并发上传数(默认与max_workers一致)
+            
+        Returns:
+            Dict[str, bool]: 每个对象的上传是否成功
+        """
+        if not files:
+            return {}
+        try:
+            self.ensure_bucket(bucket_name)
+        except Exception as e:
+            print(f"检查存储桶 {bucket_name} 失败: {e}")
+            return {object_name: False for object_name, _ in files}
+
+        def upload(item):
+            object_name, source = item
+            try:
+                if isinstance(source, (str, os.PathLike)):
+                    content_type = mimetypes.guess_type(object_name)[0]
+                    return object_name, self.upload_file(bucket_name, object_name, source, content_type)
+                return object_name, self.upload_bytes(bucket_name, object_name, source)
+            except Exception as e:
+                print(f"上传文件失败: {object_name}, 错误: {e}")
+                return object_name, False
+
+        with ThreadPoolExecutor(max_workers=max_workers or self.max_workers) as executor:
+            results = dict(executor.map(upload, files))
+        failed = [name for name, ok in results.items() if not ok]
+        if failed:
+            print(f"批量上传完成，失败 {len(failed)}/{len(results)} 个: {failed}")
+        return results
+
+    def upload_directory(self,
+                         bucket_name: str,
+                         local_dir: str,
+                         prefix: str = '',
+                         max_workers: Optional[int] = None) -> Dict[str, bool]:
+        """
+        并发上传整个目录(如MinerU解析得到的md和图片)，对象名称为 prefix/相对路径
+        
+        Args:
+            bucket_name: 存储桶名称
+            local_dir: 本地目录
+            prefix: 对象名称前缀
+            max_workers: 并发上传数
+            
+        Returns:
+            Dict[str, bool]: 每个对象的上传是否成功
+        """
+        files = []
+        for root, _, names in os.walk(local_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                relative = os.path.relpath(path, local_dir).replace(os.sep, '/')
+                files.append((f"{prefix.rstrip('/')}/{relative}" if prefix else relative, path))
+        return self.upload_files(bucket_name, files, max_workers=max_workers)
+
     def download_file(self, 
                      bucket_name: str, 
                      object_name: str, 
@@ -92,6 +235,17 @@ class MinIOStorage:
             print(f"下载文件失败: {e}")
             return False
             
+    @staticmethod
+    def is_text_object(object_name: str, content_type: Optional[str] = None) -> bool:
+        """根据内容类型(优先)或扩展名判断对象是否为文本"""
+        if content_type and not content_type.startswith('application/octet-stream'):
+            return content_type.startswith(TEXT_CONTENT_TYPES)
+        extension = os.path.splitext(object_name)[1].lower()
+        if extension in TEXT_EXTENSIONS:
+            return True
+        guessed, _ = mimetypes.guess_type(object_name)
+        return bool(guessed) and guessed.startswith(TEXT_CONTENT_TYPES)
+
     def get_file_content(self,
                        bucket_name: str,
                        object_name: str) -> Optional[Union[bytes, str]]:
@@ -103,23 +257,189 @@ class MinIOStorage:
             object_name: 对象名称（在桶中的路径）
             
         Returns:
-            Union[bytes, str]: 文件内容(自动解码为字符串)，如果出错则返回None
+            Union[bytes, str]: 文本文件解码为字符串，二进制文件(pdf、图片等)直接返回字节，如果出错则返回None
         """
         try:
-            response = self.client.get_object(
-                bucket_name=bucket_name,
-                object_name=object_name
-            )
-            data = response.data
-            try:
-                return data.decode('utf-8')
-            except UnicodeDecodeError:
-                return data
-            
+            stat = self.client.stat_object(bucket_name, object_name)
         except S3Error as e:
             print(f"获取文件失败: {e}")
             return None
+        data = self.get_file_bytes(bucket_name, object_name, size=stat.size)
+        if data is None or not self.is_text_object(object_name, stat.content_type):
+            return data
+        try:
+            return data.decode('utf-8')
+        except UnicodeDecodeError:
+            return data
+
+    def get_file_bytes(self,
+                       bucket_name: str,
+                       object_name: str,
+                       size: Optional[int] = None) -> Optional[Union[bytes, bytearray]]:
+        """
+        获取MinIO上文件的原始字节内容(不尝试解码)
+
+        超过parallel_threshold的大文件按part_size分段并发下载，直接写入预先分配的缓冲区，
+        避免整体读取时的多次内存拷贝。
+        
+        Args:
+            bucket_name: 存储桶名称
+            object_name: 对象名称（在桶中的路径）
+            size: 对象大小(已知时可省略一次stat请求)
+            
+        Returns:
+            Union[bytes, bytearray]: 文件内容，如果出错则返回None
+        """
+        try:
+            if size is None:
+                size = self.client.stat_object(bucket_name, object_name).size
+            if size > self.parallel_threshold:
+                return self._download_parallel(bucket_name, object_name, size)
+            return self.get_file_range(bucket_name, object_name)
+        except Exception as e:
+            # 除S3Error外，分段下载不完整、连接中断(urllib3)等错误同样返回None
+            print(f"获取文件失败: {object_name}, 错误: {e}")
+            return None
+
+    def get_file_range(self,
+                       bucket_name: str,
+                       object_name: str,
+                       offset: int = 0,
+                       length: int = 0) -> bytes:
+        """
+        按范围读取文件内容(HTTP Range请求)
+        
+        Args:
+            bucket_name: 存储桶名称
+            object_name: 对象名称（在桶中的路径）
+            offset: 起始字节位置
+            length: 读取的字节数，0表示读取到文件末尾
+            
+        Returns:
+            bytes: 范围内的文件内容
+        """
+        response = self.client.get_object(bucket_name, object_name, offset=offset, length=length)
+        try:
+            return response.read()
         finally:
-            if 'response' in locals():
+            response.close()
+            response.release_conn()
+
+    def iter_file_chunks(self,
+                         bucket_name: str,
+                         object_name: str,
+                         chunk_size: int = 1024 * 1024,
+                         offset: int = 0,
+                         length: int = 0) -> Iterator[bytes]:
+        """
+        流式分块读取文件内容，内存中只保留当前块
+        
+        Args:
+            bucket_name: 存储桶名称
+            object_name: 对象名称（在桶中的路径）
+            chunk_size: 每块字节数
+            offset: 起始字节位置
+            length: 读取的字节数，0表示读取到文件末尾
+            
+        Returns:
+            Iterator[bytes]: 文件内容块
+        """
+        response = self.client.get_object(bucket_name, object_name, offset=offset, length=length)
+        try:
+            for chunk in response.stream(chunk_size):
+                yield chunk
+        finally:
+            response.close()
+            response.release_conn()
+
+    def open_stream(self,
+                    bucket_name: str,
+                    object_name: str,
+                    offset: int = 0,
+                    length: int = 0):
+        """
+        以类文件对象打开文件(支持read(n))，使用完毕后需调用close()和release_conn()
+        
+        Args:
+            bucket_name: 存储桶名称
+            object_name: 对象名称（在桶中的路径）
+            offset: 起始字节位置
+            length: 读取的字节数，0表示读取到文件末尾
+        """
+        return self.client.get_object(bucket_name, object_name, offset=offset, length=length)
+
+    def _download_parallel(self, bucket_name: str, object_name: str, size: int) -> bytearray:
+        """按part_size分段并发下载对象，各段直接写入预分配缓冲区的对应位置"""
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+
+        def download_part(offset):
+            length = min(self.part_size, size - offset)
+            response = self.client.get_object(bucket_name, object_name, offset=offset, length=length)
+            try:
+                position = offset
+                for chunk in response.stream(1024 * 1024):
+                    view[position:position + len(chunk)] = chunk
+                    position += len(chunk)
+                if position != offset + length:
+                    raise Exception(f"分段下载不完整: {object_name} [{offset}, {offset + length})")
+            finally:
                 response.close()
-                response.release_conn()
\ No newline at end of file
+                response.release_conn()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # list() 触发各分段中的异常
+            list(executor.map(download_part, range(0, size, self.part_size)))
+        view.release()
+        print(f"分段并发下载完成: {object_name}, 大小: {size}字节")
+        return buffer
+
+    def download_file_parallel(self,
+                               bucket_name: str,
+                               object_name: str,
+                               file_path: str) -> bool:
+        """
+        分段并发下载大文件到本地，各段直接写入文件对应位置，不在内存中保存整个文件
+        
+        Args:
+            bucket_name: 存储桶名称
+            object_name: 对象名称（在桶中的路径）
+            file_path: 下载到本地的文件路径
+            
+        Returns:
+            bool: 下载是否成功
+        """
+        created = False
+        try:
+            size = self.client.stat_object(bucket_name, object_name).size
+            if size <= self.parallel_threshold:
+                return self.download_file(bucket_name, object_name, file_path)
+            os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+            with open(file_path, 'wb') as f:
+                created = True
+                f.truncate(size)
+
+            def download_part(offset):
+                length = min(self.part_size, size - offset)
+                written = 0
+                with open(file_path, 'r+b') as f:
+                    f.seek(offset)
+                    for chunk in self.iter_file_chunks(bucket_name, object_name, offset=offset, length=length):
+                        f.write(chunk)
+                        written += len(chunk)
+                if written != length:
+                    raise Exception(f"分段下载不完整: {object_name} [{offset}, {offset + length})")
+
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(download_part, range(0, size, self.part_size)))
+            return True
+
+        except Exception as e:
+            print(f"下载文件失败: {object_name}, 错误: {e}")
+            # 删除下载不完整的文件，避免被当作完整文件使用
+            if created:
+                try:
+                    os.remove(file_path)
+                except OSError:
+                    pass
+            return False
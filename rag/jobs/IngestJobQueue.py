@@ -0,0 +1,312 @@
+import os
+import json
+import uuid
+import socket
+import sqlite3
+import traceback
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _process_token(pid):
+    """进程的启动标识: 本次开机的boot_id + 进程启动时间，用于区分主机或容器重启后复用的进程号
+
+    无法读取/proc(非Linux系统)时返回None
+    """
+    try:
+        with open("/proc/sys/kernel/random/boot_id") as f:
+            boot_id = f.read().strip()
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+        # 进程名中可能包含空格，从最后一个")"之后解析，进程启动时间为第22个字段
+        start_time = stat[stat.rindex(")") + 2:].split()[19]
+        return f"{boot_id}-{start_time}"
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class IngestJobStore:
+    """基于SQLite的入库任务存储，任务状态持久化到本地文件，服务重启后仍可查询和恢复"""
+
+    def __init__(self, db_path):
+        """
+        初始化任务存储
+
+        参数:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingest_jobs (
+                    id TEXT PRIMARY KEY,
+                    job_type TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    progress REAL NOT NULL DEFAULT 0,
+                    params TEXT NOT NULL,
+                    result TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+                """
+            )
+
+    def _connect(self):
+        # 每次操作使用独立连接，允许多个线程/进程并发访问
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _now(self):
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def _row_to_job(self, row):
+        if row is None:
+            return None
+        keys = ["id", "job_type", "status", "stage", "progress", "params", "result",
+                "error", "attempts", "worker", "created_at", "updated_at"]
+        job = dict(zip(keys, row))
+        job["params"] = json.loads(job["params"]) if job["params"] else {}
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def create(self, job_type, params, job_id=None):
+        """新建任务，返回任务ID(未指定job_id时自动生成)"""
+        job_id = job_id or str(uuid.uuid4())
+        now = self._now()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO ingest_jobs (id, job_type, status, stage, progress, params, created_at, updated_at) "
+                "VALUES (?, ?, 'pending', NULL, 0, ?, ?, ?)",
+                (job_id, job_type, json.dumps(params, ensure_ascii=False), now, now)
+            )
+        return job_id
+
+    def get(self, job_id):
+        """获取任务详情，不存在时返回None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, job_type, status, stage, progress, params, result, error, attempts, worker, "
+                "created_at, updated_at FROM ingest_jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        return self._row_to_job(row)
+
+    def list(self, status=None, limit=20, offset=0):
+        """按创建时间倒序列出任务"""
+        sql = ("SELECT id, job_type, status, stage, progress, params, result, error, attempts, worker, "
+               "created_at, updated_at FROM ingest_jobs")
+        args = []
+        if status:
+            sql += " WHERE status = ?"
+            args.append(status)
+        sql += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        args.extend([limit, offset])
+        with self._connect() as conn:
+            rows = conn.execute(sql, args).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def count(self, status=None):
+        """统计任务数量"""
+        sql = "SELECT COUNT(*) FROM ingest_jobs"
+        args = []
+        if status:
+            sql += " WHERE status = ?"
+            args.append(status)
+        with self._connect() as conn:
+            return conn.execute(sql, args).fetchone()[0]
+
+    def claim(self, job_id, worker):
+        """原子地把pending任务标记为running，返回是否抢占成功(多进程部署时只有一个进程会执行)"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE ingest_jobs SET status = 'running', worker = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ? AND status = 'pending'",
+                (worker, self._now(), job_id)
+            )
+            return cursor.rowcount == 1
+
+    def update_progress(self, job_id, stage, progress, result=None):
+        """更新任务当前阶段和阶段进度(0~1)
+
+        参数:
+            result: 执行过程中需要持久化的中间结果(如本次任务创建的集合)，为空时不修改，任务中断后重试时可读取
+        """
+        with self._connect() as conn:
+            if result is None:
+                conn.execute(
+                    "UPDATE ingest_jobs SET stage = ?, progress = ?, updated_at = ? WHERE id = ?",
+                    (stage, round(float(progress), 4), self._now(), job_id)
+                )
+            else:
+                conn.execute(
+                    "UPDATE ingest_jobs SET stage = ?, progress = ?, result = ?, updated_at = ? WHERE id = ?",
+                    (stage, round(float(progress), 4), json.dumps(result, ensure_ascii=False), self._now(), job_id)
+                )
+
+    def finish(self, job_id, result):
+        """标记任务成功"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ingest_jobs SET status = 'succeeded', progress = 1, result = ?, error = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (json.dumps(result, ensure_ascii=False), self._now(), job_id)
+            )
+
+    def fail(self, job_id, error):
+        """标记任务失败"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE ingest_jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?",
+                (error, self._now(), job_id)
+            )
+
+    def requeue_interrupted(self, is_worker_alive):
+        """把执行进程已退出的running任务重置为pending，返回重置的任务ID列表
+
+        参数:
+            is_worker_alive: 判断worker标识对应进程是否存活的函数
+        """
+        requeued = []
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, worker FROM ingest_jobs WHERE status = 'running'"
+            ).fetchall()
+            for job_id, worker in rows:
+                if worker and is_worker_alive(worker):
+                    continue
+                cursor = conn.execute(
+                    "UPDATE ingest_jobs SET status = 'pending', updated_at = ? "
+                    "WHERE id = ? AND status = 'running' AND worker IS ?",
+                    (self._now(), job_id, worker)
+                )
+                if cursor.rowcount == 1:
+                    requeued.append(job_id)
+        return requeued
+
+    def pending_ids(self):
+        """获取所有pending任务ID(按创建时间排序)"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM ingest_jobs WHERE status = 'pending' ORDER BY created_at"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+
+class IngestJobQueue:
+    """后台入库任务队列
+
+    提交任务后立即返回任务ID，由线程池按 load → split → embed → insert 阶段执行，
+    执行过程中的阶段和进度写入 IngestJobStore，可通过任务ID查询。
+    """
+
+    # 任务处理阶段
+    STAGES = ("load", "split", "embed", "insert")
+
+    def __init__(self, store, handler, max_workers=2):
+        """
+        初始化任务队列
+
+        参数:
+            store: IngestJobStore实例
+            handler: 任务处理函数 handler(job, report)，返回结果字典；
+                     report(stage, progress, result=None) 用于上报阶段和阶段进度(0~1)，
+                     result为需要持久化的中间结果，重试时可从job["result"]读取
+            max_workers: 并发执行的任务数
+        """
+        self.store = store
+        self.handler = handler
+        self.max_workers = max_workers
+        # worker标识: 主机名:进程号:进程启动标识，重启后进程号相同也不会被误认为仍在执行
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{_process_token(os.getpid()) or uuid.uuid4().hex}"
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest-job")
+
+    def submit(self, job_type, params, job_id=None):
+        """提交任务并立即返回任务ID
+
+        参数:
+            job_type: 任务类型(create、update)
+            params: 任务参数(需可JSON序列化)
+            job_id: 预先生成的任务ID(如任务输入文件已按任务ID保存)，为空时自动生成
+        """
+        job_id = self.store.create(job_type, params, job_id=job_id)
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def get(self, job_id):
+        """查询任务状态"""
+        return self.store.get(job_id)
+
+    def recover(self):
+        """恢复服务重启前未完成的任务
+
+        执行进程已退出的running任务会被重置为pending，随后与其他pending任务一起重新提交；
+        多进程部署时由 claim 保证同一任务只被一个进程执行。
+
+        返回:
+            int: 重新提交的任务数量
+        """
+        requeued = self.store.requeue_interrupted(self._is_worker_alive)
+        if requeued:
+            print(f"检测到 {len(requeued)} 个中断的入库任务，重新排队执行")
+        pending = self.store.pending_ids()
+        for job_id in pending:
+            self._executor.submit(self._run, job_id)
+        return len(pending)
+
+    def shutdown(self, wait=True):
+        """停止接收新任务，wait为True时等待正在执行的任务完成"""
+        self._executor.shutdown(wait=wait)
+
+    def _is_worker_alive(self, worker):
+        """判断worker标识(主机名:进程号:进程启动标识)对应的进程是否存活，其他主机的任务视为存活
+
+        进程号存在但启动标识不同时，说明是重启后复用了该进程号的其他进程，原进程已退出
+        """
+        host, _, rest = worker.partition(":")
+        pid, _, token = rest.partition(":")
+        if host != socket.gethostname():
+            return True
+        try:
+            pid = int(pid)
+        except ValueError:
+            return False
+        if pid == os.getpid():
+            return worker == self.worker_id
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        if not token:
+            # 旧版本记录的worker标识没有启动标识，只能按进程号判断
+            return True
+        current = _process_token(pid)
+        # 无法读取其他进程的启动标识时按存活处理
+        return current is None or current == token
+
+    def _run(self, job_id):
+        """执行单个任务"""
+        if not self.store.claim(job_id, self.worker_id):
+            # 已被其他进程抢占或已结束
+            return
+        job = self.store.get(job_id)
+
+        def report(stage, progress, result=None):
+            self.store.update_progress(job_id, stage, progress, result=result)
+            print(f"入库任务 {job_id} [{stage}] 进度: {progress * 100:.2f}%")
+
+        try:
+            result = self.handler(job, report)
+            self.store.finish(job_id, result or {})
+            print(f"入库任务 {job_id} 执行完成")
+        except Exception as e:
+            print(f"入库任务 {job_id} 执行失败: {e}")
+            traceback.print_exc()
+            self.store.fail(job_id, str(e))
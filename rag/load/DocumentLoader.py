@@ -1,18 +1,19 @@
 import os
 import sys
+import importlib
+import threading
 from pathlib import Path
-from langchain_community.document_loaders import TextLoader, JSONLoader, UnstructuredHTMLLoader, UnstructuredMarkdownLoader
-from langchain_unstructured import UnstructuredLoader
 import mimetypes
 import requests
 import chardet
 from urllib.parse import urlparse, unquote
-import nltk
 import ssl
 from dotenv import load_dotenv
 import environ
-from web_api.app import file_parse, UploadFile
+import json
 from io import BytesIO
+from langchain_core.documents import Document
+from rag.load.ParseCache import ParseCache
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(ROOT_DIR))
@@ -23,19 +24,113 @@ env = environ.Env()
 
 class DocumentLoader:
     # 支持文件类型：txt、json、md、html、[".pdf", ".ppt", ".pptx", ".doc", ".docx", ".png", ".jpg", ".jpeg"]
+    # 进程内共享同一个实例，NLTK资源检查和MIME类型注册只执行一次
+    _instance = None
+    _lock = threading.RLock()
+
+    # 各文件类型对应的加载器(模块, 类名)，首次遇到该类型的文件时才导入
+    _loader_specs = {
+        "text/plain": ("langchain_community.document_loaders", "TextLoader"),                        # txt
+        "application/json": ("langchain_community.document_loaders", "JSONLoader"),                  # json
+        "text/markdown": ("langchain_community.document_loaders", "UnstructuredMarkdownLoader"),     # md
+        "text/html": ("langchain_community.document_loaders", "UnstructuredHTMLLoader"),             # html
+    }
+    # 依赖NLTK资源的文件类型(unstructured解析)
+    _nltk_types = {"text/markdown", "text/html"}
+    # 内存内容加载时md/html直接交给unstructured的分区函数(与对应加载器的single模式结果一致)
+    _partition_specs = {
+        "text/markdown": ("unstructured.partition.md", "partition_md"),
+        "text/html": ("unstructured.partition.html", "partition_html"),
+    }
+    # 由MinerU解析为markdown的文件扩展名
+    _parse_extensions = [".pdf", ".ppt", ".pptx", ".doc", ".docx", ".png", ".jpg", ".jpeg"]
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(DocumentLoader, cls).__new__(cls)
+                    instance._initialized = False
+                    cls._instance = instance
+        return cls._instance
+
     def __init__(self):
-        # 初始化时下载必要的NLTK资源
-        self._download_nltk_resources()
-        
-        # 初始化MIME类型数据库
-        self._init_mimetypes()
-        
-        self.supported_types = {
-            "text/plain": TextLoader,                        # txt
-            "application/json": JSONLoader,                  # json
-            "text/markdown": UnstructuredMarkdownLoader,     # md
-            "text/html": UnstructuredHTMLLoader,             # html
-        }
+        # 单例只在首次创建时初始化，之后的DocumentLoader()直接返回已初始化的实例
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            # 初始化MIME类型数据库
+            self._init_mimetypes()
+
+            self.supported_types = self._loader_specs
+            self._loader_classes = {}
+            self._nltk_ready = False
+            self._parse_module = None
+            # 解析结果缓存(PARSE_CACHE_ENABLED=false时关闭)
+            self._parse_cache = None
+            if env.bool('PARSE_CACHE_ENABLED', default=True):
+                self._parse_cache = ParseCache(
+                    cache_dir=env.str('PARSE_CACHE_DIR', default=os.path.join(ROOT_DIR.parent, 'uploads', 'parse_cache')),
+                    max_bytes=env.int('PARSE_CACHE_MAX_BYTES', default=1024 * 1024 * 1024)
+                )
+            # 常驻解析进程数(PARSE_WORKERS>0时在独立进程中解析，模型预加载并常驻)
+            self.parse_workers = env.int('PARSE_WORKERS', default=0)
+            # 是否允许在本进程解析文档(gunicorn按PARSE_WORKERS_TOTAL分配解析进程后，未分配到的worker为false)
+            self.parse_enabled = env.bool('PARSE_ENABLED', default=True)
+            self._initialized = True
+
+    def _ensure_nltk(self, file_type):
+        """unstructured解析需要NLTK资源，首次用到时检查并下载"""
+        if file_type in self._nltk_types and not self._nltk_ready:
+            with self._lock:
+                if not self._nltk_ready:
+                    self._download_nltk_resources()
+                    self._nltk_ready = True
+
+    def _get_loader_class(self, file_type):
+        """获取文件类型对应的加载器类，首次使用时导入"""
+        loader_class = self._loader_classes.get(file_type)
+        if loader_class is not None:
+            return loader_class
+        with self._lock:
+            if file_type not in self._loader_classes:
+                self._ensure_nltk(file_type)
+                module_name, class_name = self.supported_types[file_type]
+                self._loader_classes[file_type] = getattr(importlib.import_module(module_name), class_name)
+            return self._loader_classes[file_type]
+
+    def _get_parse_module(self):
+        """获取MinerU解析模块，首次解析pdf/office/图片文件时才导入magic_pdf"""
+        if not self.parse_enabled:
+            raise Exception("当前worker未分配MinerU解析进程(受PARSE_WORKERS_TOTAL限制)，无法解析pdf/office/图片文件，请重试")
+        if self._parse_module is None:
+            with self._lock:
+                if self._parse_module is None:
+                    print("首次解析pdf/office/图片文件，正在加载MinerU解析模块...")
+                    try:
+                        import web_api.app as parse_module
+                    except ImportError:
+                        import rag.load.web_api.app as parse_module
+                    self._parse_module = parse_module
+        return self._parse_module
+
+    def get_parse_pool(self):
+        """获取常驻解析进程池，未启用(PARSE_WORKERS=0)时返回None"""
+        if self.parse_workers <= 0:
+            return None
+        from rag.load.ParseWorkerPool import ParseWorkerPool
+        return ParseWorkerPool(
+            max_workers=self.parse_workers,
+            max_pending=env.int('PARSE_MAX_PENDING', default=0) or None,
+            timeout=env.float('PARSE_QUEUE_TIMEOUT', default=0) or None,
+            preload_modes=env.list('PARSE_PRELOAD_MODES', default=['txt', 'ocr'])
+        )
+
+    def _get_file_parse(self):
+        """获取MinerU文档解析函数(按文件路径解析)"""
+        return self._get_parse_module().file_parse
         
     def _init_mimetypes(self):
         """初始化MIME类型数据库并添加常见文件类型的映射"""
@@ -70,6 +165,7 @@ class DocumentLoader:
                 ssl._create_default_https_context = _create_unverified_https_context
             
             # 检查并下载必要的NLTK资源
+            import nltk
             from nltk.data import find
             resource_paths = {
                 'punkt': 'tokenizers/punkt',
@@ -145,7 +241,7 @@ class DocumentLoader:
                 return []
             
             file_type = self.get_file_type(file_path)
-            supported_extensions = [".pdf", ".ppt", ".pptx", ".doc", ".docx", ".png", ".jpg", ".jpeg"]
+            supported_extensions = self._parse_extensions
             file_extension = os.path.splitext(file_path)[1].lower()
             
             print(f"---正在加载文件: {file_path}, 文件类型: {file_type}, 扩展名: {file_extension}---")
@@ -154,7 +250,32 @@ class DocumentLoader:
                 # with open(file_path, "rb") as f:
                 #     file_content = f.read()
                 # file = UploadFile(filename=os.path.basename(file_path), file=BytesIO(file_content))
+                # 内容相同的文件直接复用缓存的解析结果
+                cache_key = None
+                file_bytes = None
+                if self._parse_cache is not None or self.parse_workers > 0:
+                    with open(file_path, "rb") as f:
+                        file_bytes = f.read()
+                if self._parse_cache is not None:
+                    cache_key = ParseCache.make_key(file_bytes, "auto")
+                    cached = self._parse_cache.get(cache_key)
+                    if cached is not None:
+                        name = os.path.basename(file_path).split(".")[0]
+                        print(f"---命中解析缓存: {file_path}---")
+                        return self._load_parsed(cached, f"uploads/{name}/{name}.md")
+                if self.parse_workers > 0:
+                    # 交给常驻解析进程解析，缓存键已计算并查询过，不再重复
+                    name = os.path.basename(file_path).split(".")[0]
+                    text = self._parse_bytes(file_bytes, os.path.basename(file_path), parse_method="auto",
+                                             cache_key=cache_key)
+                    return self._load_parsed(text, f"uploads/{name}/{name}.md")
+                # 在请求线程中解析时MinerU自行读取文件，释放已读入的内容
+                file_bytes = None
+                file_parse = self._get_file_parse()
                 file_path = file_parse(file_path=file_path, parse_method="auto", is_json_md_dump=True)
+                if cache_key and isinstance(file_path, str) and os.path.exists(file_path):
+                    with open(file_path, encoding="utf-8") as f:
+                        self._parse_cache.put(cache_key, f.read())
                 # if isinstance(result, str):
                 #     if os.path.exists(result):
                 #         with open(result, "r", encoding="utf-8") as f:
@@ -175,7 +296,7 @@ class DocumentLoader:
                 print(f"不支持的文件类型,跳过文件: {file_path}")
                 return []
 
-            loader_class = self.supported_types[file_type]
+            loader_class = self._get_loader_class(file_type)
             if file_type == "text/plain":
                 loader = loader_class(file_path, encoding="utf-8")
             elif file_type == "application/json":
@@ -205,6 +326,101 @@ class DocumentLoader:
             print(f"加载文档时出错: {str(e)}")
             return []
 
+    def load_documents_from_bytes(self, file_bytes, file_name, source=None):
+        """从内存中的文件内容加载文档，不写入临时文件
+        参数:
+        file_bytes: 文件的二进制内容
+        file_name: 文件名(用于判断文件类型)
+        source: 写入文档metadata的source(默认为file_name)
+
+        返回：
+        loaded_docs: 加载后的文档列表
+        """
+        try:
+            source = source or file_name
+            file_extension = os.path.splitext(file_name)[1].lower()
+
+            if file_extension in self._parse_extensions:
+                # pdf/office/图片由MinerU直接解析内存中的内容
+                text = self._parse_bytes(file_bytes, file_name, parse_method="auto")
+                # source与按路径解析时生成的md文件路径一致，集合名称保持不变
+                name = os.path.basename(file_name).split(".")[0]
+                source = f"uploads/{name}/{name}.md"
+                file_type = "text/markdown"
+            else:
+                file_type = self.get_file_type(file_name)
+                if file_type not in self.supported_types:
+                    print(f"不支持的文件类型,跳过文件: {file_name}")
+                    return []
+                text = self._decode_bytes(file_bytes)
+
+            print(f"---正在加载文件: {source}, 文件类型: {file_type}---")
+            loaded_docs = self._load_text(text, file_type, source)
+            for doc in loaded_docs:
+                doc.page_content = doc.page_content.replace('\x00', '')  # 移除空字符
+            return loaded_docs
+        except Exception as e:
+            print(f"加载文档时出错: {str(e)}")
+            return []
+
+    def _parse_bytes(self, file_bytes, file_name, parse_method="auto", cache_key=None):
+        """使用MinerU将文件内容解析为markdown，优先复用解析缓存
+
+        cache_key为调用方已计算并查询过(未命中)的缓存键，传入时不再重复计算哈希和查询缓存
+        """
+        if cache_key is None and self._parse_cache is not None:
+            cache_key = ParseCache.make_key(file_bytes, parse_method)
+            cached = self._parse_cache.get(cache_key)
+            if cached is not None:
+                print(f"---命中解析缓存: {file_name}---")
+                return cached
+        print(f"---正在解析文件: {file_name}---")
+        parse_pool = self.get_parse_pool()
+        if parse_pool is not None:
+            text = parse_pool.parse(file_bytes, file_name, parse_method=parse_method)
+        else:
+            text = self._get_parse_module().parse_bytes(file_bytes, file_name, parse_method=parse_method)
+        if cache_key:
+            self._parse_cache.put(cache_key, text)
+        return text
+
+    def _load_parsed(self, text, source):
+        """加载缓存的解析结果"""
+        loaded_docs = self._load_text(text, "text/markdown", source)
+        for doc in loaded_docs:
+            doc.page_content = doc.page_content.replace('\x00', '')  # 移除空字符
+        return loaded_docs
+
+    def _decode_bytes(self, file_bytes):
+        """将文本文件内容解码为字符串，非UTF-8编码时自动检测编码"""
+        try:
+            return file_bytes.decode('utf-8')
+        except UnicodeDecodeError:
+            detected = chardet.detect(file_bytes)
+            return file_bytes.decode(detected['encoding'] or 'utf-8', errors='replace')
+
+    def _load_text(self, text, file_type, source):
+        """按文件类型将文本内容转换为文档，结果与对应加载器读取文件时一致"""
+        if file_type == "text/plain":
+            return [Document(page_content=text, metadata={'source': source})]
+        if file_type == "application/json":
+            # 等同于 JSONLoader(jq_schema=".", text_content=False)
+            content = json.loads(text)
+            if isinstance(content, str):
+                page_content = content
+            elif isinstance(content, (dict, list)):
+                page_content = json.dumps(content) if content else ""
+            else:
+                page_content = str(content) if content is not None else ""
+            return [Document(page_content=page_content, metadata={'source': source, 'seq_num': 1})]
+
+        # md/html: 等同于Unstructured加载器的single模式
+        self._ensure_nltk(file_type)
+        module_name, function_name = self._partition_specs[file_type]
+        partition = getattr(importlib.import_module(module_name), function_name)
+        elements = partition(text=text)
+        return [Document(page_content="\n\n".join(str(el) for el in elements), metadata={'source': source})]
+
     def load_documents_from_url(self, url):
         """从URL加载文档"""
         try:
@@ -277,39 +493,23 @@ class DocumentLoader:
                 secure = env.bool('MINIO_SECURE')
             )
 
-            # 获取文件内容
-            content = minio.get_file_content(
+            # 获取文件内容(原始字节，直接在内存中加载)
+            content = minio.get_file_bytes(
                 bucket_name = bucket_name,
                 object_name = object_name
             )
                 
-            # 解析文件名获取文件类型
-            _, ext = os.path.splitext(object_name)
-            is_text_file = ext.lower() in ['.txt', '.csv', '.json', '.md', '.html']
-            
-            # 构建临时文件路径
-            save_path = os.path.join(f'/uploads/{object_name}')
-            os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            
             # 检查内容有效性
             if content is None:
                 print(f"从MinIO获取的文件内容为空: {object_name}")
                 return []
-                
-            if is_text_file and isinstance(content, str):
-                with open(save_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-            else:
-                with open(save_path, 'wb') as f:
-                    if isinstance(content, str):
-                        f.write(content.encode('utf-8'))
-                    else:
-                        f.write(content)
-            
-            # 加载文档
-            loaded_docs = self.load_documents(save_path)
-                
-            return loaded_docs
+
+            # 加载文档，source与原先保存的临时文件路径一致
+            return self.load_documents_from_bytes(
+                content,
+                object_name,
+                source = os.path.join('/uploads', object_name)
+            )
         except Exception as e:
             print(f"从MinIO加载文档失败: {object_name}, 错误: {e}")
             return []
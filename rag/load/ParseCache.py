@@ -0,0 +1,120 @@
+import os
+import hashlib
+import threading
+from typing import Optional
+
+
+class ParseCache:
+    """
+    文档解析结果缓存
+
+    以 文件内容的SHA-256 + 解析方法 为键，将MinerU解析得到的markdown保存在本地磁盘，
+    内容相同的文件再次上传或更新时直接复用解析结果。缓存总大小超过上限时按最近访问时间淘汰。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024):
+        """
+        初始化解析缓存
+
+        参数:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限(字节)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 当前缓存总大小，首次写入时扫描目录得到
+        self._total_bytes = None
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(file_bytes, parse_method: str = "auto") -> str:
+        """根据文件内容和解析方法生成缓存键"""
+        return f"{hashlib.sha256(file_bytes).hexdigest()}_{parse_method}"
+
+    def _path(self, key: str) -> str:
+        # 按键的前两位分目录，避免单个目录下文件过多
+        return os.path.join(self.cache_dir, key[:2], f"{key}.md")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存的markdown内容
+
+        参数:
+            key: 缓存键
+
+        返回:
+            markdown内容，未命中时返回None
+        """
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        # 更新访问时间，淘汰时保留最近使用的条目
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return content
+
+    def put(self, key: str, content: str) -> None:
+        """
+        写入解析结果，超过大小上限时淘汰最久未使用的条目
+
+        参数:
+            key: 缓存键
+            content: markdown内容
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，多个进程同时写入同一条目时不会读到不完整的内容
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+        with self._lock:
+            # 覆盖已有条目时先减去旧条目的大小
+            try:
+                old_size = os.path.getsize(path)
+            except OSError:
+                old_size = 0
+            os.replace(temp_path, path)
+            if self._total_bytes is None:
+                self._total_bytes = self._scan()[1]
+            else:
+                self._total_bytes += os.path.getsize(path) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        """扫描缓存目录，返回 ([(访问时间, 大小, 路径)], 总大小)"""
+        entries = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if not name.endswith(".md"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries, sum(size for _, size, _ in entries)
+
+    def _evict(self):
+        """按最近访问时间从旧到新删除条目，直到总大小降到上限的90%以下"""
+        # 其他进程也可能写入同一目录，淘汰前重新统计
+        entries, total = self._scan()
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+        print(f"解析缓存淘汰完成，当前大小: {total}字节")
@@ -0,0 +1,198 @@
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def _get_parse_module():
+    """在解析进程中导入MinerU解析模块"""
+    try:
+        import web_api.app as parse_module
+    except ImportError:
+        import rag.load.web_api.app as parse_module
+    return parse_module
+
+
+def _init_worker(preload_modes=("txt", "ocr")):
+    """解析进程启动时导入magic_pdf并预加载layout/OCR/公式识别模型，之后的解析任务直接复用
+
+    参数:
+        preload_modes: 预加载的解析模式(txt、ocr)，每种模式各占一份模型内存，未预加载的模式在首次使用时加载
+    """
+    _get_parse_module()
+    try:
+        from magic_pdf.model.doc_analyze_by_custom_model import ModelSingleton
+        model_manager = ModelSingleton()
+        # 与doc_analyze使用的默认参数一致
+        for mode in preload_modes:
+            model_manager.get_model(mode == "ocr", False)
+        print(f"解析进程 {os.getpid()} 模型预加载完成")
+    except Exception as e:
+        # 不同版本的magic_pdf接口不同，预加载失败时在首次解析时加载
+        print(f"解析进程 {os.getpid()} 模型预加载失败，将在首次解析时加载: {e}")
+
+
+def _ping():
+    return os.getpid()
+
+
+def _parse_in_worker(file_bytes, file_name, parse_method):
+    return _get_parse_module().parse_bytes(file_bytes, file_name, parse_method=parse_method)
+
+
+class ParseWorkerPool:
+    """
+    常驻的MinerU解析进程池
+
+    解析进程启动时预加载模型并常驻，解析任务通过进程池的本地队列分发，
+    同时执行和排队的任务总数受max_pending限制，并记录任务统计供健康检查使用。
+
+    进程池属于所在的服务进程: gunicorn的每个worker各自持有一个进程池，
+    整机的模型副本数为 worker数 × max_workers × 预加载模式数(见gunicorn.conf.py中的PARSE_WORKERS_TOTAL)。
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(ParseWorkerPool, cls).__new__(cls)
+                    instance._initialized = False
+                    cls._instance = instance
+        return cls._instance
+
+    def __init__(self, max_workers: int = 1, max_pending: int = None, timeout: float = None,
+                 preload_modes=("txt", "ocr")):
+        """
+        初始化解析进程池(进程内只初始化一次)
+
+        参数:
+            max_workers: 解析进程数，每个进程各自加载一份模型
+            max_pending: 同时执行和排队的任务数上限(默认为进程数的2倍)
+            timeout: 等待队列空位的最长时间/秒，为空时一直等待
+            preload_modes: 解析进程启动时预加载的解析模式(txt、ocr)
+        """
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            self.max_workers = max(1, max_workers)
+            self.max_pending = max_pending or self.max_workers * 2
+            self.timeout = timeout
+            self.preload_modes = tuple(preload_modes)
+            self._slots = threading.BoundedSemaphore(self.max_pending)
+            self._executor = None
+            self._executor_lock = threading.Lock()
+            self._stats_lock = threading.Lock()
+            self._stats = {'running': 0, 'completed': 0, 'failed': 0, 'restarts': 0}
+            self._warm = False
+            self._started_at = None
+            self._initialized = True
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.preload_modes,)
+                )
+                self._started_at = time.time()
+            return self._executor
+
+    def _reset_executor(self, broken_executor):
+        """解析进程异常退出(如内存不足被杀)后丢弃进程池，下次提交时重建
+
+        只在当前进程池仍是出错的那个时才丢弃，并发任务同时失败时只重建一次，也不会关闭已重建的进程池
+        """
+        with self._executor_lock:
+            if self._executor is not broken_executor:
+                return
+            self._executor = None
+            self._warm = False
+        broken_executor.shutdown(wait=False, cancel_futures=True)
+        with self._stats_lock:
+            self._stats['restarts'] += 1
+
+    def warm_up(self):
+        """启动全部解析进程并等待模型预加载完成"""
+        executor = self._get_executor()
+        # 同时提交与进程数相同的任务，使进程池启动全部进程(每个进程执行一次预加载)
+        try:
+            for future in [executor.submit(_ping) for _ in range(self.max_workers)]:
+                future.result()
+        except BrokenProcessPool:
+            self._reset_executor(executor)
+            raise
+        self._warm = True
+        print(f"解析进程池预热完成: {self.max_workers}个进程")
+
+    def parse(self, file_bytes, file_name, parse_method="auto"):
+        """
+        在解析进程中将文件内容解析为markdown
+
+        参数:
+            file_bytes: 文件的二进制内容
+            file_name: 文件名
+            parse_method: 解析方法('ocr', 'txt', 'auto')
+
+        返回:
+            str: markdown内容
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            raise Exception(f"解析队列已满(上限{self.max_pending}个任务)，请稍后重试")
+        with self._stats_lock:
+            self._stats['running'] += 1
+        executor = None
+        try:
+            executor = self._get_executor()
+            future = executor.submit(_parse_in_worker, file_bytes, file_name, parse_method)
+            result = future.result()
+            with self._stats_lock:
+                self._stats['completed'] += 1
+            return result
+        except BrokenProcessPool as e:
+            self._reset_executor(executor)
+            with self._stats_lock:
+                self._stats['failed'] += 1
+            raise Exception(f"解析进程异常退出: {file_name}, {str(e)}")
+        except Exception:
+            with self._stats_lock:
+                self._stats['failed'] += 1
+            raise
+        finally:
+            with self._stats_lock:
+                self._stats['running'] -= 1
+            self._slots.release()
+
+    def health(self):
+        """解析进程池的健康状态和任务统计"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        return {
+            'started': self._executor is not None,
+            'warm': self._warm,
+            'workers': self.max_workers,
+            'preload_modes': list(self.preload_modes),
+            'max_pending': self.max_pending,
+            # running包含在进程中执行和在队列中等待的任务
+            'running': stats['running'],
+            'completed': stats['completed'],
+            'failed': stats['failed'],
+            'restarts': stats['restarts'],
+            'uptime': round(time.time() - self._started_at, 1) if self._started_at else 0,
+        }
+
+    def shutdown(self):
+        """停止解析进程池"""
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+                self._warm = False
@@ -0,0 +1,246 @@
+import atexit
+import hashlib
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from loguru import logger
+
+
+class OfficeConverter:
+    """
+    Office文件转PDF
+
+    - 转换结果按文件内容的SHA-256缓存在本地磁盘，同一文件再次上传时不再转换，缓存总大小超过上限时按最近访问时间淘汰
+    - 安装了unoserver时启动一个常驻的LibreOffice服务，通过unoconvert转换；否则每次调用soffice，
+      但复用同一个LibreOffice用户配置目录，省去每次初始化配置的开销
+    - 转换使用的临时目录位于统一的工作目录下，转换结束后立即删除，启动时清理异常退出遗留的临时目录和已退出进程的配置目录
+    """
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls):
+        if cls._instance is None:
+            with cls._lock:
+                if cls._instance is None:
+                    instance = super(OfficeConverter, cls).__new__(cls)
+                    instance._initialized = False
+                    cls._instance = instance
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        with self._lock:
+            if self._initialized:
+                return
+            self.cache_dir = os.environ.get("OFFICE_PDF_CACHE_DIR", os.path.join("uploads", "office_pdf_cache"))
+            self.max_cache_bytes = int(os.environ.get("OFFICE_PDF_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+            self.work_dir = os.environ.get("OFFICE_WORK_DIR", os.path.join(tempfile.gettempdir(), "office_convert"))
+            self.timeout = int(os.environ.get("OFFICE_CONVERT_TIMEOUT", 300))
+            self.unoserver_port = int(os.environ.get("OFFICE_UNOSERVER_PORT", 2003))
+            # 工作目录中转换临时文件的磁盘配额(LibreOffice配置目录不计入)
+            self.work_dir_quota = int(os.environ.get("OFFICE_WORK_DIR_QUOTA", 5 * 1024 * 1024 * 1024))
+            os.makedirs(self.cache_dir, exist_ok=True)
+            os.makedirs(self.work_dir, exist_ok=True)
+            # 每个进程使用独立的LibreOffice配置目录，同一配置目录同时只能被一个soffice进程使用
+            self.profile_dir = os.path.join(self.work_dir, f"profile_{os.getpid()}")
+            self._convert_lock = threading.Lock()
+            self._cache_lock = threading.Lock()
+            self._unoserver = None
+            self._cleanup_stale_dirs()
+            self._initialized = True
+
+    @staticmethod
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            # 进程存在但属于其他用户
+            return True
+        return True
+
+    def _cleanup_stale_dirs(self, max_age: int = 3600):
+        """清理工作目录下进程异常退出时遗留的目录: 超过max_age秒未修改的临时目录，以及所属进程已退出的LibreOffice配置目录"""
+        now = time.time()
+        for name in os.listdir(self.work_dir):
+            path = os.path.join(self.work_dir, name)
+            try:
+                if name.startswith("job_") and now - os.path.getmtime(path) > max_age:
+                    shutil.rmtree(path, ignore_errors=True)
+                elif name.startswith("profile_"):
+                    pid = name[len("profile_"):]
+                    if pid.isdigit() and int(pid) != os.getpid() and not self._pid_alive(int(pid)):
+                        shutil.rmtree(path, ignore_errors=True)
+            except OSError:
+                pass
+
+    def _check_quota(self, incoming: int):
+        """转换临时文件占用加上本次写入超过配额时，先清理遗留目录，仍超出则拒绝转换(LibreOffice配置目录不计入配额)"""
+        used = self._dir_size(self.work_dir)
+        if used + incoming <= self.work_dir_quota:
+            return
+        self._cleanup_stale_dirs(max_age=600)
+        used = self._dir_size(self.work_dir)
+        if used + incoming > self.work_dir_quota:
+            raise Exception(f"Office转换临时目录空间不足: 已使用{used}字节，配额{self.work_dir_quota}字节")
+
+    @staticmethod
+    def _dir_size(path: str) -> int:
+        """统计工作目录下转换临时文件的总大小，跳过各进程的LibreOffice配置目录"""
+        total = 0
+        for root, dirs, names in os.walk(path):
+            if root == path:
+                dirs[:] = [name for name in dirs if not name.startswith("profile_")]
+            for name in names:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.pdf")
+
+    def _get_cached(self, key: str) -> Optional[bytes]:
+        path = self._cache_path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        # 更新访问时间，淘汰时保留最近使用的条目
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _put_cached(self, key: str, data: bytes):
+        path = self._cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self._cache_lock:
+            self._evict()
+
+    def _evict(self):
+        """缓存总大小超过上限时，按最近访问时间删除到上限的90%以下"""
+        entries = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith(".pdf"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_cache_bytes:
+            return
+        target = self.max_cache_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        logger.info(f"Office转换缓存淘汰完成，当前大小: {total}字节")
+
+    def _unoserver_ready(self) -> bool:
+        try:
+            with socket.create_connection(("127.0.0.1", self.unoserver_port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def _ensure_unoserver(self) -> bool:
+        """安装了unoserver时启动(或复用已在运行的)常驻LibreOffice服务"""
+        if not (shutil.which("unoserver") and shutil.which("unoconvert")):
+            return False
+        if self._unoserver_ready():
+            return True
+        if self._unoserver is None or self._unoserver.poll() is not None:
+            logger.info(f"启动常驻LibreOffice服务(unoserver)，端口: {self.unoserver_port}")
+            self._unoserver = subprocess.Popen(
+                ["unoserver", "--interface", "127.0.0.1", "--port", str(self.unoserver_port)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            atexit.register(self.shutdown)
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            if self._unoserver_ready():
+                return True
+            time.sleep(0.5)
+        logger.warning("unoserver启动超时，改用soffice转换")
+        return False
+
+    def _run_conversion(self, input_path: str, output_dir: str) -> str:
+        """执行转换，返回生成的PDF路径"""
+        output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0] + ".pdf")
+        if self._ensure_unoserver():
+            command = ["unoconvert", "--host", "127.0.0.1", "--port", str(self.unoserver_port),
+                       "--convert-to", "pdf", input_path, output_path]
+        else:
+            command = ["soffice", f"-env:UserInstallation=file://{os.path.abspath(self.profile_dir)}",
+                       "--headless", "--norestore", "--convert-to", "pdf", "--outdir", output_dir, input_path]
+        result = subprocess.run(command, capture_output=True, timeout=self.timeout)
+        if result.returncode != 0 or not os.path.exists(output_path):
+            raise Exception(f"Office文件转换PDF失败: {result.stderr.decode(errors='ignore')[-500:]}")
+        return output_path
+
+    def convert(self, file_bytes: bytes, file_extension: str) -> bytes:
+        """
+        将Office文件转换为PDF
+
+        Args:
+            file_bytes: Office文件的二进制内容
+            file_extension: 文件扩展名(如.docx)
+
+        Returns:
+            bytes: PDF文件内容
+        """
+        key = f"{hashlib.sha256(file_bytes).hexdigest()}{file_extension.lower()}"
+        cached = self._get_cached(key)
+        if cached is not None:
+            logger.info(f"命中Office转换缓存: {key}")
+            return cached
+
+        # 同一配置目录同时只能运行一个soffice，进程内串行转换
+        with self._convert_lock:
+            cached = self._get_cached(key)
+            if cached is not None:
+                return cached
+            # 转换结果(PDF)通常与原文件大小相近，按两倍预留空间
+            self._check_quota(len(file_bytes) * 2)
+            with tempfile.TemporaryDirectory(prefix="job_", dir=self.work_dir) as temp_dir:
+                input_path = os.path.join(temp_dir, f"input{file_extension.lower()}")
+                with open(input_path, "wb") as f:
+                    f.write(file_bytes)
+                start = time.time()
+                output_path = self._run_conversion(input_path, temp_dir)
+                with open(output_path, "rb") as f:
+                    pdf_bytes = f.read()
+                logger.info(f"Office文件转换PDF完成，耗时{time.time() - start:.1f}秒")
+        self._put_cached(key, pdf_bytes)
+        return pdf_bytes
+
+    def shutdown(self):
+        """停止由本进程启动的unoserver"""
+        if self._unoserver is not None and self._unoserver.poll() is None:
+            self._unoserver.terminate()
+        self._unoserver = None
@@ -1,17 +1,22 @@
 import json
 import os
+import multiprocessing
+import threading
 from base64 import b64encode
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
 from glob import glob
 from io import StringIO
 import tempfile
-from typing import Tuple, Union
+from typing import List, Tuple, Union
 
 import uvicorn
 from fastapi import FastAPI, HTTPException, UploadFile
 from fastapi.responses import JSONResponse
 from loguru import logger
 
-from magic_pdf.data.read_api import read_local_images, read_local_office
+from magic_pdf.data.read_api import read_local_images
 import magic_pdf.model as model_config
 from magic_pdf.config.enums import SupportedPdfParseMethod
 from magic_pdf.data.data_reader_writer import DataWriter, FileBasedDataWriter
@@ -23,6 +28,12 @@ from magic_pdf.operators.models import InferenceResult
 from magic_pdf.operators.pipes import PipeResult
 from fastapi import Form
 
+try:
+    from .OfficeConverter import OfficeConverter
+except ImportError:
+    # 作为独立服务运行(uvicorn app:app)时不在包内
+    from OfficeConverter import OfficeConverter
+
 # 设置使用内部模型
 model_config.__use_inside_model__ = True
 
@@ -34,6 +45,79 @@ pdf_extensions = [".pdf"]
 office_extensions = [".ppt", ".pptx", ".doc", ".docx"]
 image_extensions = [".png", ".jpg", ".jpeg"]
 
+# 大型PDF按页分片并行解析: MINERU_PAGE_WORKERS > 1 且页数超过 MINERU_PAGE_BATCH_SIZE 时启用
+# 每个子进程各自加载一份模型，默认关闭，按内存情况设置进程数
+PAGE_BATCH_SIZE = int(os.environ.get("MINERU_PAGE_BATCH_SIZE", 20))
+PAGE_WORKERS = int(os.environ.get("MINERU_PAGE_WORKERS", 0))
+
+_page_pool = None
+_page_pool_lock = threading.Lock()
+
+# parse_method为auto时逐页判断: 文本页走txt模式，扫描页走ocr模式，最后按页序合并结果
+# MINERU_PAGE_CLASSIFY=false时恢复为整份文档统一判断
+PAGE_CLASSIFY = os.environ.get("MINERU_PAGE_CLASSIFY", "true").lower() in ("true", "1")
+# 文本字符数少于OCR_MIN_CHARS且图片覆盖率不低于OCR_IMAGE_COVERAGE的页面视为扫描页
+OCR_MIN_CHARS = int(os.environ.get("MINERU_OCR_MIN_CHARS", 50))
+OCR_IMAGE_COVERAGE = float(os.environ.get("MINERU_OCR_IMAGE_COVERAGE", 0.5))
+
+class MergedResult:
+    """
+    按页分段解析结果的合并视图
+
+    提供与InferenceResult/PipeResult相同的导出接口，各段结果按页序拼接，页码换算为整份文档中的页码。
+    """
+    def __init__(self, parts):
+        # [(起始页码, 推理结果, 管道处理结果)]
+        self.parts = parts
+
+    def get_infer_res(self):
+        model_list = []
+        for start, infer_result, _ in self.parts:
+            for page in infer_result.get_infer_res():
+                page = dict(page)
+                if isinstance(page.get("page_info"), dict):
+                    page["page_info"] = dict(page["page_info"], page_no=page["page_info"].get("page_no", 0) + start)
+                model_list.append(page)
+        return model_list
+
+    def _dump_parts(self, dump):
+        values = []
+        for start, _, pipe_result in self.parts:
+            writer = MemoryDataWriter()
+            try:
+                dump(pipe_result, writer)
+                values.append((start, writer.get_value()))
+            finally:
+                writer.close()
+        return values
+
+    def dump_md(self, writer: DataWriter, file_path: str, image_dir: str) -> None:
+        values = self._dump_parts(lambda pipe_result, w: pipe_result.dump_md(w, "", image_dir))
+        writer.write_string(file_path, "\n\n".join(md.strip("\n") for _, md in values if md.strip()))
+
+    def dump_content_list(self, writer: DataWriter, file_path: str, image_dir: str) -> None:
+        content_list = []
+        for start, value in self._dump_parts(lambda pipe_result, w: pipe_result.dump_content_list(w, "", image_dir)):
+            for item in json.loads(value):
+                if "page_idx" in item:
+                    item["page_idx"] += start
+                content_list.append(item)
+        writer.write_string(file_path, json.dumps(content_list, ensure_ascii=False, indent=4))
+
+    def dump_middle_json(self, writer: DataWriter, file_path: str) -> None:
+        middle_json = None
+        for start, value in self._dump_parts(lambda pipe_result, w: pipe_result.dump_middle_json(w, "")):
+            part = json.loads(value)
+            for page in part.get("pdf_info", []):
+                if "page_idx" in page:
+                    page["page_idx"] += start
+            if middle_json is None:
+                middle_json = part
+            else:
+                middle_json["pdf_info"].extend(part.get("pdf_info", []))
+        writer.write_string(file_path, json.dumps(middle_json or {}, ensure_ascii=False, indent=4))
+
+
 class MemoryDataWriter(DataWriter):
     """内存数据写入器，用于在内存中存储处理结果而不写入文件"""
     def __init__(self):
@@ -122,10 +206,12 @@ def process_file(
     file_extension: str,
     parse_method: str,
     image_writer: Union[S3DataWriter, FileBasedDataWriter],
-) -> Tuple[InferenceResult, PipeResult]:
+) -> Tuple[Union[InferenceResult, MergedResult], Union[PipeResult, MergedResult]]:
     """
     处理文件内容
 
+    parse_method为auto且PDF中文本页与扫描页混合时，分段解析并返回合并结果(MergedResult)
+
     Args:
         file_bytes: 文件的二进制内容
         file_extension: 文件扩展名
@@ -141,17 +227,14 @@ def process_file(
         # 处理PDF文件
         ds = PymuDocDataset(file_bytes)
     elif file_extension in office_extensions:
-        # 处理Office文件
-        temp_dir = tempfile.mkdtemp()
-        with open(os.path.join(temp_dir, f"temp_file.{file_extension}"), "wb") as f:
-            f.write(file_bytes)
-        ds = read_local_office(temp_dir)[0]
+        # 处理Office文件: 转换为PDF(按内容缓存转换结果)
+        ds = PymuDocDataset(OfficeConverter().convert(file_bytes, file_extension))
     elif file_extension in image_extensions:
-        # 处理图像文件
-        temp_dir = tempfile.mkdtemp()
-        with open(os.path.join(temp_dir, f"temp_file.{file_extension}"), "wb") as f:
-            f.write(file_bytes)
-        ds = read_local_images(temp_dir)[0]
+        # 处理图像文件(读取后即删除临时目录)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with open(os.path.join(temp_dir, f"temp_file{file_extension}"), "wb") as f:
+                f.write(file_bytes)
+            ds = read_local_images(temp_dir)[0]
     infer_result: InferenceResult = None
     pipe_result: PipeResult = None
 
@@ -163,6 +246,13 @@ def process_file(
         infer_result = ds.apply(doc_analyze, ocr=False)
         pipe_result = infer_result.pipe_txt_mode(image_writer)
     else:  # auto
+        # 逐页判断，文本页与扫描页混合时分段解析
+        if PAGE_CLASSIFY and isinstance(ds, PymuDocDataset):
+            pdf_bytes = ds.data_bits()
+            page_modes = classify_pdf_pages(pdf_bytes)
+            if len(set(page_modes)) > 1:
+                merged = process_mixed_pdf(pdf_bytes, page_modes, image_writer)
+                return merged, merged
         # 自动选择解析方法
         if ds.classify() == SupportedPdfParseMethod.OCR:
             infer_result = ds.apply(doc_analyze, ocr=True)
@@ -174,6 +264,230 @@ def process_file(
     return infer_result, pipe_result
 
 
+def classify_pdf_pages(pdf_bytes: bytes) -> List[bool]:
+    """
+    逐页判断是否需要OCR
+
+    页面文本层的字符数少于OCR_MIN_CHARS，且图片覆盖页面面积的比例不低于OCR_IMAGE_COVERAGE时视为扫描页。
+
+    Args:
+        pdf_bytes: PDF文件的二进制内容
+
+    Returns:
+        List[bool]: 每页是否需要OCR
+    """
+    import pymupdf
+
+    page_modes = []
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for page in doc:
+            text_chars = len("".join(page.get_text("text").split()))
+            page_area = abs(page.rect) or 1
+            image_area = 0
+            for info in page.get_image_info():
+                image_area += abs(pymupdf.Rect(info["bbox"]) & page.rect)
+            page_modes.append(text_chars < OCR_MIN_CHARS and image_area / page_area >= OCR_IMAGE_COVERAGE)
+    return page_modes
+
+
+def extract_pdf_pages(pdf_bytes: bytes, ranges: List[Tuple[int, int]]) -> List[bytes]:
+    """
+    按页码范围从PDF中提取子PDF
+
+    Args:
+        pdf_bytes: PDF文件的二进制内容
+        ranges: [(起始页码, 结束页码(不含))] 列表
+
+    Returns:
+        List[bytes]: 每个范围对应的子PDF内容
+    """
+    import pymupdf
+
+    shards = []
+    with pymupdf.open(stream=pdf_bytes, filetype="pdf") as doc:
+        for start, end in ranges:
+            with pymupdf.open() as shard:
+                shard.insert_pdf(doc, from_page=start, to_page=end - 1)
+                shards.append(shard.tobytes())
+    return shards
+
+
+def process_mixed_pdf(
+    pdf_bytes: bytes,
+    page_modes: List[bool],
+    image_writer: Union[S3DataWriter, FileBasedDataWriter],
+) -> MergedResult:
+    """
+    将连续的文本页和扫描页分段，文本段走txt模式(ds.classify()判断文本层不可用时走ocr模式)，
+    扫描段走ocr模式，按页序合并结果
+
+    Args:
+        pdf_bytes: PDF文件的二进制内容
+        page_modes: 每页是否需要OCR(见classify_pdf_pages)
+        image_writer: 图像写入器
+
+    Returns:
+        MergedResult: 合并后的解析结果
+    """
+    ranges = []
+    start = 0
+    for index in range(1, len(page_modes) + 1):
+        if index == len(page_modes) or page_modes[index] != page_modes[start]:
+            ranges.append((start, index))
+            start = index
+    ocr_pages = sum(page_modes)
+    logger.info(f"文本页与扫描页混合: 共{len(page_modes)}页, 其中{ocr_pages}页OCR, 分{len(ranges)}段解析")
+
+    parts = []
+    for (start, end), shard_bytes in zip(ranges, extract_pdf_pages(pdf_bytes, ranges)):
+        ds = PymuDocDataset(shard_bytes)
+        # 文本段也按MinerU的整体判断复核(如文本层乱码、字体无法解码)，需要时改走ocr模式
+        ocr = page_modes[start] or ds.classify() == SupportedPdfParseMethod.OCR
+        if ocr and not page_modes[start]:
+            logger.info(f"第{start + 1}~{end}页文本层不可用，改用OCR解析")
+        if ocr:
+            infer_result = ds.apply(doc_analyze, ocr=True)
+            pipe_result = infer_result.pipe_ocr_mode(image_writer)
+        else:
+            infer_result = ds.apply(doc_analyze, ocr=False)
+            pipe_result = infer_result.pipe_txt_mode(image_writer)
+        parts.append((start, infer_result, pipe_result))
+    return MergedResult(parts)
+
+
+def dump_markdown(pipe_result: Union[PipeResult, MergedResult]) -> str:
+    """将管道处理结果导出为markdown文本(不写入文件)"""
+    md_content_writer = MemoryDataWriter()
+    try:
+        pipe_result.dump_md(md_content_writer, "", "images")
+        return md_content_writer.get_value()
+    finally:
+        md_content_writer.close()
+
+
+def _get_page_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    获取按页解析的进程池
+
+    子进程常驻，模型在每个子进程首次解析时加载一次，之后的分片直接复用；
+    使用spawn方式启动，避免在多线程的服务进程中fork。
+    """
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _page_pool
+
+
+def _reset_page_pool(broken_pool: ProcessPoolExecutor) -> None:
+    """
+    分片解析进程异常退出(如内存不足被杀)后丢弃进程池，下次解析时重建
+
+    只在当前进程池仍是出错的那个时才丢弃，避免并发请求重复重建或关闭已重建的进程池
+    """
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is not broken_pool:
+            return
+        _page_pool = None
+    broken_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def split_pdf_pages(file_bytes: bytes, batch_size: int) -> List[bytes]:
+    """
+    按页数将PDF拆分为多个子PDF
+
+    Args:
+        file_bytes: PDF文件的二进制内容
+        batch_size: 每个子PDF的页数
+
+    Returns:
+        List[bytes]: 按页序排列的子PDF内容，页数不超过batch_size时返回原文件
+    """
+    import pymupdf
+
+    with pymupdf.open(stream=file_bytes, filetype="pdf") as doc:
+        page_count = doc.page_count
+    if page_count <= batch_size:
+        return [file_bytes]
+    ranges = [(start, min(start + batch_size, page_count)) for start in range(0, page_count, batch_size)]
+    return extract_pdf_pages(file_bytes, ranges)
+
+
+def _parse_pdf_shard(shard_bytes: bytes, parse_method: str, output_image_path: str) -> str:
+    """在子进程中解析一个PDF分片，返回markdown"""
+    image_writer = FileBasedDataWriter(output_image_path)
+    _, pipe_result = process_file(shard_bytes, ".pdf", parse_method, image_writer)
+    return dump_markdown(pipe_result)
+
+
+def parse_pdf_by_pages(
+    file_bytes: bytes,
+    parse_method: str,
+    output_image_path: str,
+    batch_size: int = PAGE_BATCH_SIZE,
+    max_workers: int = PAGE_WORKERS,
+) -> str:
+    """
+    将PDF按页分片，在进程池中并行解析后按页序拼接markdown
+
+    Args:
+        file_bytes: PDF文件的二进制内容
+        parse_method: 解析方法('ocr', 'txt', 'auto')，auto时每个分片单独判断
+        output_image_path: 图像输出目录(各分片共用)
+        batch_size: 每个分片的页数
+        max_workers: 并行解析的进程数
+
+    Returns:
+        str: 拼接后的markdown内容
+    """
+    shards = split_pdf_pages(file_bytes, batch_size)
+    if len(shards) == 1 or max_workers <= 1:
+        return _parse_pdf_shard(file_bytes, parse_method, output_image_path)
+
+    logger.info(f"PDF按页分片解析: {len(shards)}个分片, 每片{batch_size}页, {max_workers}个进程")
+    pool = _get_page_pool(max_workers)
+    try:
+        # map按提交顺序返回结果，拼接后与整体解析的页序一致
+        results = list(pool.map(
+            partial(_parse_pdf_shard, parse_method=parse_method, output_image_path=output_image_path),
+            shards,
+        ))
+    except BrokenProcessPool as e:
+        _reset_page_pool(pool)
+        raise Exception(f"PDF分片解析进程异常退出: {str(e)}")
+    return "\n\n".join(md.strip("\n") for md in results if md.strip())
+
+
+def parse_bytes(file_bytes: bytes, file_name: str, parse_method: str = "auto") -> str:
+    """
+    在内存中解析文件内容并返回markdown文本，不在磁盘上保存输入文件和md文件
+
+    Args:
+        file_bytes: 文件的二进制内容
+        file_name: 文件名(用于判断文件类型和确定图片输出目录)
+        parse_method: 解析方法('ocr', 'txt', 'auto')
+
+    Returns:
+        str: 解析得到的markdown内容
+    """
+    name = os.path.basename(file_name).split(".")[0]
+    # md中引用的图片仍输出到与file_parse相同的目录
+    output_image_path = f"uploads/{name}/images"
+    os.makedirs(output_image_path, exist_ok=True)
+    file_extension = os.path.splitext(file_name)[1].lower()
+
+    if file_extension in pdf_extensions and PAGE_WORKERS > 1:
+        return parse_pdf_by_pages(file_bytes, parse_method, output_image_path)
+
+    image_writer = FileBasedDataWriter(output_image_path)
+    _, pipe_result = process_file(file_bytes, file_extension, parse_method, image_writer)
+    return dump_markdown(pipe_result)
+
+
 def encode_image(image_path: str) -> str:
     """使用base64编码图像"""
     with open(image_path, "rb") as f:
@@ -236,6 +550,19 @@ def file_parse(
             output_image_path=output_image_path,
         )
 
+        # 大型PDF与parse_bytes一样按页分片并行解析；分片只产出markdown，
+        # 需要返回布局、中间结果或内容列表，或文件位于S3时整体解析
+        if (
+            file_extension.lower() in pdf_extensions
+            and PAGE_WORKERS > 1
+            and not (file_path and file_path.startswith("s3://"))
+            and not (return_layout or return_info or return_content_list)
+        ):
+            md_content = parse_pdf_by_pages(file_bytes, parse_method, output_image_path)
+            if is_json_md_dump:
+                writer.write_string(f"{file_name}.md", md_content)
+            return f"{output_path}/{file_name}.md"
+
         # 处理文件
         infer_result, pipe_result = process_file(file_bytes, file_extension, parse_method, image_writer)
 
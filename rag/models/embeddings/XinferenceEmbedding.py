@@ -21,6 +21,10 @@ class XinferenceEmbedding(EmbeddingBase):
         super().__init__()
         self.base_url = base_url
         self.model = model
+        # 缓存向量维度
+        self._embedding_dimension = None
+        # embed_documents每次请求的文本数量
+        self.batch_size = int(os.getenv('XINFERENCE_EMBEDDING_BATCH_SIZE', 32))
         # 创建客户端
         self.client = Client(self.base_url)
         # 检查模型是否已加载
@@ -93,9 +97,13 @@ class XinferenceEmbedding(EmbeddingBase):
             文档文本的向量表示列表
         """
         embeddings = []
-        for text in texts:
-            embedding = self.embed_query(text)
-            embeddings.append(embedding)
+        # 按批调用create_embedding，每批一次请求
+        for start in range(0, len(texts), self.batch_size):
+            batch = list(texts[start:start + self.batch_size])
+            response = self.model_instance.create_embedding(batch)
+            # 按index还原输入顺序
+            data = sorted(response['data'], key=lambda item: item.get('index', 0))
+            embeddings.extend(item['embedding'] for item in data)
         return embeddings
     
     def get_embedding_dimension(self) -> int:
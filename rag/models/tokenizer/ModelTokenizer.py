@@ -0,0 +1,200 @@
+from typing import List, Dict, Optional, Tuple
+import os, json, re, threading
+import environ
+
+# 初始化环境变量
+env = environ.Env()
+env_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), '.env')
+environ.Env.read_env(env_file)
+
+# 项目根目录下的模型配置文件(可包含多个连续的JSON对象)
+MODEL_SPEC_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), 'model.json')
+
+# 未在model.json中登记的常用embedding模型
+BUILTIN_MODEL_SPECS = {
+    'bge-m3': {'hf_repo': 'BAAI/bge-m3', 'max_tokens': 8192},
+    'Qwen3-Embedding-0.6B': {'hf_repo': 'Qwen/Qwen3-Embedding-0.6B', 'max_tokens': 32000},
+}
+
+# 句子级切分位置(保留分隔符在前一句末尾)
+SENTENCE_PATTERN = re.compile(r'(?<=[\n。！？；!?;])|(?<=\.)(?=\s)')
+
+
+class ModelTokenizer:
+    """
+    embedding模型自身的分词器
+
+    在本地加载模型的fast tokenizer(tokenizer.json)并按进程缓存，
+    以模型token数度量文本长度，用于按模型max_tokens切分文本块。
+    """
+
+    _tokenizers = {}
+    _model_specs = None
+    _lock = threading.Lock()
+
+    def __init__(self, model: str):
+        """
+        初始化模型分词器
+
+        参数:
+            model: embedding模型名称(与Xinference中的模型名一致)
+        """
+        self.model = model
+        self.spec = self.get_model_spec(model)
+        self.max_tokens = self.spec.get('max_tokens') or 512
+        self.tokenizer = self._get_tokenizer(model, self.spec)
+
+    @classmethod
+    def get_model_spec(cls, model: str) -> Dict:
+        """读取model.json中的模型配置，未登记时使用内置配置"""
+        with cls._lock:
+            if cls._model_specs is None:
+                cls._model_specs = cls._load_model_specs(MODEL_SPEC_FILE)
+        spec = dict(BUILTIN_MODEL_SPECS.get(model, {}))
+        spec.update(cls._model_specs.get(model, {}))
+        return spec
+
+    @staticmethod
+    def _load_model_specs(path: str) -> Dict[str, Dict]:
+        """解析model.json，文件中可能是多个连续的JSON对象"""
+        specs = {}
+        if not os.path.exists(path):
+            return specs
+        with open(path, encoding='utf-8') as fd:
+            content = fd.read()
+        decoder = json.JSONDecoder()
+        index = 0
+        while index < len(content):
+            # 跳过对象之间的空白
+            while index < len(content) and content[index].isspace():
+                index += 1
+            if index >= len(content):
+                break
+            obj, index = decoder.raw_decode(content, index)
+            if isinstance(obj, dict) and obj.get('model_name'):
+                specs[obj['model_name']] = obj
+        return specs
+
+    @classmethod
+    def _get_tokenizer(cls, model: str, spec: Dict):
+        """获取(或加载并缓存)模型分词器
+
+        查找顺序:
+        1. TOKENIZER_DIR/<模型名>/tokenizer.json
+        2. model.json中的 model_uri/model_id/tokenizer.json
+        3. 从HuggingFace Hub下载(hf_repo，未配置时使用model_id)
+        """
+        with cls._lock:
+            if model in cls._tokenizers:
+                return cls._tokenizers[model]
+            try:
+                from tokenizers import Tokenizer
+            except ImportError:
+                raise Exception("按模型token切分需要安装tokenizers: pip install tokenizers")
+
+            candidates = []
+            tokenizer_dir = env.str('TOKENIZER_DIR', default='')
+            if tokenizer_dir:
+                candidates.append(os.path.join(tokenizer_dir, model, 'tokenizer.json'))
+            if spec.get('model_uri') and spec.get('model_id'):
+                candidates.append(os.path.join(spec['model_uri'], spec['model_id'], 'tokenizer.json'))
+
+            tokenizer = None
+            for path in candidates:
+                if os.path.exists(path):
+                    tokenizer = Tokenizer.from_file(path)
+                    break
+            if tokenizer is None:
+                repo = spec.get('hf_repo') or spec.get('model_id') or model
+                try:
+                    tokenizer = Tokenizer.from_pretrained(repo)
+                except Exception as e:
+                    raise Exception(f"无法加载模型 {model} 的分词器: {str(e)}")
+            # 只统计长度，不截断、不补齐
+            tokenizer.no_truncation()
+            tokenizer.no_padding()
+            print(f"模型 {model} 的分词器加载成功")
+            cls._tokenizers[model] = tokenizer
+            return tokenizer
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        批量计算文本的模型token数
+
+        参数:
+            texts: 文本列表
+
+        返回:
+            每个文本的token数(不含特殊token)
+        """
+        if not texts:
+            return []
+        encodings = self.tokenizer.encode_batch(list(texts), add_special_tokens=False)
+        return [len(encoding.ids) for encoding in encodings]
+
+    def _split_long_text(self, text: str, chunk_size: int) -> List[str]:
+        """按token偏移切分超过chunk_size的单句文本"""
+        encoding = self.tokenizer.encode(text, add_special_tokens=False)
+        offsets = encoding.offsets
+        pieces = []
+        begin = 0
+        for start in range(0, len(offsets), chunk_size):
+            # 每段从上一段结束处开始，最后一段延伸到文本末尾，不丢失token之间的空白等字符
+            end = offsets[start + chunk_size - 1][1] if start + chunk_size < len(offsets) else len(text)
+            pieces.append(text[begin:end])
+            begin = end
+        return [piece for piece in pieces if piece]
+
+    def split_text(self, text: str, chunk_size: Optional[int] = None, chunk_overlap: int = 0) -> List[str]:
+        """
+        按模型token数切分文本
+
+        先按句子切分并一次性批量计算每句的token数，再将相邻句子打包为不超过chunk_size个token的文本块，
+        单句超长时按token偏移截断。
+
+        参数:
+            text: 待切分文本
+            chunk_size: 每块最大token数，为空或超过模型max_tokens时使用max_tokens(预留特殊token)
+            chunk_overlap: 相邻文本块重叠的token数(以整句为单位)
+
+        返回:
+            文本块列表
+        """
+        # 预留[CLS]/[SEP]等特殊token的位置
+        limit = max(1, self.max_tokens - 2)
+        chunk_size = min(chunk_size, limit) if chunk_size else limit
+        chunk_overlap = max(0, min(chunk_overlap, chunk_size // 2))
+
+        sentences = [s for s in SENTENCE_PATTERN.split(text) if s]
+        if not sentences:
+            return []
+        lengths = self.count_tokens(sentences)
+
+        # 超长句子先按token切开
+        units: List[Tuple[str, int]] = []
+        for sentence, length in zip(sentences, lengths):
+            if length > chunk_size:
+                parts = self._split_long_text(sentence, chunk_size)
+                units.extend(zip(parts, self.count_tokens(parts)))
+            else:
+                units.append((sentence, length))
+
+        chunks = []
+        current: List[Tuple[str, int]] = []
+        current_tokens = 0
+        for unit in units:
+            if current and current_tokens + unit[1] > chunk_size:
+                chunks.append("".join(part for part, _ in current))
+                # 保留末尾若干句作为重叠部分
+                overlap, overlap_tokens = [], 0
+                for part in reversed(current):
+                    if overlap_tokens + part[1] > chunk_overlap or overlap_tokens + part[1] + unit[1] > chunk_size:
+                        break
+                    overlap.insert(0, part)
+                    overlap_tokens += part[1]
+                current, current_tokens = overlap, overlap_tokens
+            current.append(unit)
+            current_tokens += unit[1]
+        if current:
+            chunks.append("".join(part for part, _ in current))
+        return [chunk for chunk in chunks if chunk.strip()]
@@ -1,106 +1,429 @@
 from langchain_text_splitters import RecursiveCharacterTextSplitter, TokenTextSplitter
 from langchain_core.documents import Document
-from rag.models.embeddings.OllamaEmbedding import OllamaEmbedding
-from sklearn.metrics.pairwise import cosine_similarity
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from rag.models.tokenizer.ModelTokenizer import ModelTokenizer
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from itertools import islice
+import multiprocessing
+import threading
 import numpy as np
 import environ
 import os
 
+# 初始化环境变量(进程内只读取一次.env)
+env = environ.Env()
+env_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env')
+environ.Env.read_env(env_file)
+
+# 进程内的分割器注册表，键为分割配置(方法, 分块大小, 重叠大小, 分隔符, 是否记录位置)
+# 分割器在创建时会编译分隔符正则、加载tiktoken编码，缓存后后续请求和进程池worker直接复用
+_SPLITTER_REGISTRY_SIZE = 64
+_splitter_registry = OrderedDict()
+_splitter_registry_lock = threading.Lock()
+
+def get_text_splitter(method, chunk_size, chunk_overlap, separators=None, add_start_index=False):
+    """获取(或创建并缓存)当前进程内指定配置的分割器实例
+
+    参数:
+        method: 分割方法(token、recursion)
+        chunk_size: 分块大小
+        chunk_overlap: 分块重叠大小
+        separators: 分隔符列表(仅用于recursion)
+        add_start_index: 是否在metadata中记录分块在源文档中的start_index
+    返回:
+        TokenTextSplitter或RecursiveCharacterTextSplitter实例(无状态，可在多线程间共享)
+    """
+    key = (method, chunk_size, chunk_overlap, tuple(separators) if separators else None, add_start_index)
+    with _splitter_registry_lock:
+        text_splitter = _splitter_registry.get(key)
+        if text_splitter is not None:
+            _splitter_registry.move_to_end(key)
+            return text_splitter
+    if method == 'token':
+        text_splitter = TokenTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            add_start_index=add_start_index
+        )
+    else:
+        text_splitter = RecursiveCharacterTextSplitter(
+            separators=list(key[3]) if key[3] else None,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            add_start_index=add_start_index
+        )
+    with _splitter_registry_lock:
+        _splitter_registry[key] = text_splitter
+        # 只保留最近使用的配置，避免任意请求参数导致缓存无限增长
+        while len(_splitter_registry) > _SPLITTER_REGISTRY_SIZE:
+            _splitter_registry.popitem(last=False)
+    return text_splitter
+
+def _split_text(config, text):
+    """进程池worker: 分割单个文档(页)的文本
+
+    只传递纯文本并返回(文本块, start_index)列表，metadata留在主进程中组装，减少进程间序列化开销
+    """
+    text_splitter = get_text_splitter(*config)
+    return [(doc.page_content, doc.metadata.get('start_index'))
+            for doc in text_splitter.create_documents([text])]
+
+# 进程内共享的分割进程池，首次使用时创建
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+def _get_process_pool(max_workers=None):
+    """获取分割进程池，进程数默认等于CPU核数(gunicorn下由gunicorn.conf.py按worker数设置SPLIT_PROCESS_WORKERS)
+
+    使用spawn方式启动子进程，避免在多线程的服务进程中fork带来的锁状态问题
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max_workers or os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _process_pool
+
+def _reset_process_pool(broken_pool):
+    """分割进程异常退出(如内存不足被杀)后丢弃进程池，下次分割时重建
+
+    只在当前进程池仍是出错的那个时才丢弃，避免并发请求重复重建或关闭已重建的进程池
+    """
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not broken_pool:
+            return
+        _process_pool = None
+    broken_pool.shutdown(wait=False, cancel_futures=True)
+
 
 class DocumentSplitter:
     def __init__(self):
-        self.env = environ.Env()
-        env_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env')
-        environ.Env.read_env(env_file)
+        self.env = env
+        # 是否默认使用进程池分割(token/recursion为纯CPU计算，线程池受GIL限制只能用满一个核)
+        self.use_processes = self.env.bool('SPLIT_USE_PROCESSES', default=False)
+        self.process_workers = self.env.int('SPLIT_PROCESS_WORKERS', default=0) or None
+        # 语义分割是否跨文档合并embedding请求(大量小文件时减少请求次数，提升embedding服务利用率)
+        self.cross_document_batch = self.env.bool('SEMANTIC_CROSS_DOCUMENT_BATCH', default=False)
+        self.embedding_batch_size = self.env.int('SEMANTIC_EMBEDDING_BATCH_SIZE', default=256)
+        self.semantic_batch_documents = self.env.int('SEMANTIC_BATCH_DOCUMENTS', default=64)
+
+    @staticmethod
+    def _iter_positions(text, chunks):
+        """依次返回每个(文本块, start_index)在源文档中的起始位置
+
+        TokenTextSplitter对中文等文本按token解码后的分块可能与原文不完全一致，此时start_index为-1，
+        改为从上一个分块之后查找，仍找不到时使用上一个分块的结束位置(近似值)
+        """
+        search_from, previous_end = 0, 0
+        for content, start_index in chunks:
+            if start_index is None or start_index < 0:
+                start_index = text.find(content, search_from)
+                if start_index < 0:
+                    start_index = min(previous_end, len(text))
+            search_from = start_index + 1
+            previous_end = start_index + len(content)
+            yield start_index
+
+    def _to_documents(self, doc, chunks, preserve_order):
+        """将进程池返回的(文本块, start_index)组装为Document"""
+        splits = []
+        positions = self._iter_positions(doc.page_content, chunks) if preserve_order else None
+        for content, _ in chunks:
+            metadata = dict(doc.metadata)
+            if positions is not None:
+                start_index = next(positions)
+                metadata['start_index'] = start_index
+                metadata['end_index'] = start_index + len(content)
+            splits.append(Document(page_content=content, metadata=metadata))
+        return splits
+
+    def _split_in_processes(self, method, documents, chunk_size, chunk_overlap, separators, preserve_order):
+        """使用进程池按文档(页)分割，结果按输入顺序返回"""
+        documents = list(documents)
+        if not documents:
+            return []
+        config = (method, chunk_size, chunk_overlap, tuple(separators) if separators else None, preserve_order)
+        pool = _get_process_pool(self.process_workers)
+        # 小文档较多时按批发送，减少进程间通信次数
+        chunksize = max(1, len(documents) // ((self.process_workers or os.cpu_count() or 1) * 4))
+        try:
+            results = list(pool.map(partial(_split_text, config), [doc.page_content for doc in documents],
+                                    chunksize=chunksize))
+        except BrokenProcessPool as e:
+            _reset_process_pool(pool)
+            raise Exception(f"分割进程异常退出: {str(e)}")
+        splits = []
+        for doc, chunks in zip(documents, results):
+            splits.extend(self._to_documents(doc, chunks, preserve_order))
+        return splits
+
+    def _iter_split_in_processes(self, method, documents, chunk_size, chunk_overlap, separators, preserve_order):
+        """使用进程池按文档(页)分割，以生成器方式按输入顺序返回
+
+        同时在处理中的文档不超过进程数的两倍，调用方提前停止迭代时取消尚未开始的任务。
+        """
+        config = (method, chunk_size, chunk_overlap, tuple(separators) if separators else None, preserve_order)
+        pool = _get_process_pool(self.process_workers)
+        max_pending = (self.process_workers or os.cpu_count() or 1) * 2
+        pending = deque()
+        try:
+            for doc in documents:
+                pending.append((doc, pool.submit(_split_text, config, doc.page_content)))
+                if len(pending) >= max_pending:
+                    doc, future = pending.popleft()
+                    yield from self._to_documents(doc, future.result(), preserve_order)
+            while pending:
+                doc, future = pending.popleft()
+                yield from self._to_documents(doc, future.result(), preserve_order)
+        except BrokenProcessPool as e:
+            _reset_process_pool(pool)
+            raise Exception(f"分割进程异常退出: {str(e)}")
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+    def _with_end_index(self, doc, splits):
+        """校正start_index(见_iter_positions)并补充分块在源文档中的结束位置end_index"""
+        chunks = [(split.page_content, split.metadata.get('start_index')) for split in splits]
+        for split, start in zip(splits, self._iter_positions(doc.page_content, chunks)):
+            split.metadata['start_index'] = start
+            split.metadata['end_index'] = start + len(split.page_content)
+        return splits
+
+    def _collect(self, executor, process_document, documents):
+        """按输入文档顺序汇总并行分割结果，相同输入的分块顺序(及segment_id)保持稳定"""
+        splits = []
+        for result in executor.map(process_document, documents):
+            splits.extend(result)
+        return splits
+
+    def split_by_token(self, documents, chunk_size=400, chunk_overlap=20, max_workers=4, preserve_order=True,
+                       use_processes=None):
+        """使用TokenTextSplitter(文本块)并行分割文档
+
+        分块始终按输入顺序返回；preserve_order为True时在metadata中记录分块在源文档中的
+        start_index/end_index(字符位置)；use_processes为True时使用进程池分割(默认读取SPLIT_USE_PROCESSES)
+        """
+        if self.use_processes if use_processes is None else use_processes:
+            return self._split_in_processes('token', documents, chunk_size, chunk_overlap, None, preserve_order)
+
+        text_splitter = get_text_splitter('token', chunk_size, chunk_overlap, add_start_index=preserve_order)
 
-    def split_by_token(self, documents, chunk_size=400, chunk_overlap=20, max_workers=4):
-        """使用TokenTextSplitter(文本块)并行分割文档"""
         def process_document(doc):
-            text_splitter = TokenTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
-                length_function=len
-            )
-            return text_splitter.split_documents([doc])
+            splits = text_splitter.split_documents([doc])
+            return self._with_end_index(doc, splits) if preserve_order else splits
         
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(process_document, doc) for doc in documents]
-            splits = []
-            for future in as_completed(futures):
-                splits.extend(future.result())
-        return splits
+            return self._collect(executor, process_document, documents)
 
     def split_by_recursion(self, documents, separators=["\n\n", "\n", " "], 
-                          chunk_size=400, chunk_overlap=20, max_workers=4):
-        """使用RecursiveCharacterTextSplitter(分隔符)并行递归分割文档"""
+                          chunk_size=400, chunk_overlap=20, max_workers=4, preserve_order=True,
+                          use_processes=None):
+        """使用RecursiveCharacterTextSplitter(分隔符)并行递归分割文档
+
+        分块始终按输入顺序返回；preserve_order为True时在metadata中记录分块在源文档中的
+        start_index/end_index(字符位置)；use_processes为True时使用进程池分割(默认读取SPLIT_USE_PROCESSES)
+        """
+        if self.use_processes if use_processes is None else use_processes:
+            return self._split_in_processes('recursion', documents, chunk_size, chunk_overlap, separators,
+                                            preserve_order)
+
+        text_splitter = get_text_splitter('recursion', chunk_size, chunk_overlap, separators,
+                                          add_start_index=preserve_order)
+
         def process_document(doc):
-            text_splitter = RecursiveCharacterTextSplitter(
-                separators=separators,
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
-                length_function=len
-            )
-            return text_splitter.split_documents([doc])
+            splits = text_splitter.split_documents([doc])
+            return self._with_end_index(doc, splits) if preserve_order else splits
         
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(process_document, doc) for doc in documents]
-            splits = []
-            for future in as_completed(futures):
-                splits.extend(future.result())
-        return splits
+            return self._collect(executor, process_document, documents)
+
+    def split_by_model_token(self, documents, model, chunk_size=None, chunk_overlap=0, max_workers=4):
+        """使用embedding模型自身的分词器按token数分割文档
+
+        文本长度以模型token计算(批量编码)，分块不超过chunk_size个token，
+        chunk_size为空时使用model.json中该模型的max_tokens，避免embedding时被截断或浪费上下文。
+        """
+        tokenizer = ModelTokenizer(model)
 
-    def split_by_semantic(self, documents, embedding, chunk_size=100, chunk_overlap=10, 
-                         similarity_threshold=0.7, max_workers=4):
-        """使用语义相似度进行文本分块"""
         def process_document(doc):
-            if not doc.page_content.strip():  # 检查空文档
-                return []
-                
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=chunk_size,
-                chunk_overlap=chunk_overlap,
-                separators=["\n\n", "\n", "。", "！", "？", "；", "：", "，", " "]
-            )
-            initial_chunks = text_splitter.split_text(doc.page_content)
-            
-            if len(initial_chunks) <= 2:
+            return [Document(page_content=chunk, metadata=dict(doc.metadata))
+                    for chunk in tokenizer.split_text(doc.page_content, chunk_size, chunk_overlap)]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return self._collect(executor, process_document, documents)
+
+    def iter_split_by_model_token(self, documents, model, chunk_size=None, chunk_overlap=0, max_workers=4,
+                                  preserve_order=True):
+        """使用embedding模型自身的分词器按token数分割文档，以生成器方式在每个源文档完成后返回其分块"""
+        tokenizer = ModelTokenizer(model)
+
+        def process_document(doc):
+            return [Document(page_content=chunk, metadata=dict(doc.metadata))
+                    for chunk in tokenizer.split_text(doc.page_content, chunk_size, chunk_overlap)]
+
+        return self._iter_parallel(documents, process_document, max_workers, preserve_order)
+
+    def _semantic_breakpoint_scores(self, vectors, window_size=1):
+        """一次性计算每个文本块与其前window_size个文本块(均值方向)的余弦相似度
+
+        参数:
+            vectors: 已归一化的float32矩阵(n, d)
+            window_size: 滑动窗口大小，为1时即相邻文本块的相似度
+        返回:
+            长度为n-1的数组，第i项为第i+1个文本块与前面窗口的相似度
+        """
+        window_size = max(1, int(window_size))
+        cumsum = np.cumsum(vectors, axis=0, dtype=np.float32)
+        ends = np.arange(vectors.shape[0] - 1)
+        starts = ends - window_size
+        window_sums = cumsum[ends] - np.where(starts[:, None] >= 0, cumsum[np.maximum(starts, 0)], 0)
+        norms = np.linalg.norm(window_sums, axis=1)
+        norms[norms == 0] = 1.0
+        return np.einsum('ij,ij->i', window_sums, vectors[1:]) / norms
+
+    def _semantic_initial_chunks(self, doc, chunk_size, chunk_overlap):
+        """按分隔符切出语义分块前的初始文本块"""
+        if not doc.page_content.strip():  # 检查空文档
+            return []
+        text_splitter = get_text_splitter('recursion', chunk_size, chunk_overlap,
+                                          ["\n\n", "\n", "。", "！", "？", "；", "：", "，", " "])
+        return text_splitter.split_text(doc.page_content)
+
+    def _semantic_group(self, initial_chunks, embeddings, chunk_size, similarity_threshold,
+                        breakpoint_percentile=None, window_size=1):
+        """根据初始文本块的embeddings检测断点并合并，返回最终文本块列表
+
+        embeddings归一化为一个float32矩阵后，用一次矩阵运算得到每个文本块与前面窗口的相似度；
+        breakpoint_percentile不为空时以这些相似度的该百分位作为断点阈值，否则使用similarity_threshold，
+        相似度低于阈值的位置即为断点。断点之间的语义段内只按chunk_size拆分。
+        """
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors /= norms
+
+        # 断点阈值与断点判断使用同一组相似度，breakpoint_percentile即为断点的比例
+        scores = self._semantic_breakpoint_scores(vectors, window_size)
+        threshold = similarity_threshold
+        if breakpoint_percentile is not None:
+            threshold = float(np.percentile(scores, breakpoint_percentile))
+        bounds = [0, *(np.flatnonzero(scores < threshold) + 1).tolist(), len(initial_chunks)]
+
+        # 合并[i, j)的长度为 offsets[j] - offsets[i] - 1(文本块之间以空格连接)
+        offsets = np.concatenate(([0], np.cumsum([len(chunk) + 1 for chunk in initial_chunks])))
+        final_chunks = []
+        for start, end in zip(bounds, bounds[1:]):
+            i = start
+            while i < end:
+                # 段内从i开始尽量多地合并不超过chunk_size的文本块(至少一个)
+                j = int(np.searchsorted(offsets, offsets[i] + chunk_size + 1, side='right')) - 1
+                j = min(max(j, i + 1), end)
+                final_chunks.append(" ".join(initial_chunks[i:j]))
+                i = j
+        return final_chunks
+
+    def _semantic_chunks(self, doc, embedding, chunk_size, chunk_overlap, similarity_threshold,
+                         breakpoint_percentile=None, window_size=1):
+        """对单个文档进行语义分块，返回文本块列表
+
+        先按分隔符切出初始文本块并批量计算embedding，再检测断点合并(见_semantic_group)。
+        """
+        initial_chunks = self._semantic_initial_chunks(doc, chunk_size, chunk_overlap)
+        if len(initial_chunks) <= 2:
+            return initial_chunks
+        
+        # 批量计算所有文本块的embeddings
+        try:
+            embeddings = embedding.embed_documents(initial_chunks)
+            if not embeddings:  # 如果没有成功生成embeddings
                 return initial_chunks
-            
-            # 直接计算所有文本块的embeddings
+            return self._semantic_group(initial_chunks, embeddings, chunk_size, similarity_threshold,
+                                        breakpoint_percentile, window_size)
+        except Exception as e:
+            print(f"处理文档时出错: {str(e)}")
+            return initial_chunks  # 发生错误时返回原始分块
+
+    def _semantic_batch(self, documents, embedding, chunk_size, chunk_overlap, similarity_threshold,
+                        breakpoint_percentile=None, window_size=1, max_workers=4, embedding_batch_size=256):
+        """跨文档批量计算embedding的语义分块
+
+        先切出所有文档的初始文本块，合并成大批次并发调用embedding服务，
+        再按文档还原各自的向量分别检测断点。适合大量小文件，避免每个文档各自发起小批量请求。
+
+        返回:
+            按输入顺序排列的Document列表
+        """
+        documents = [doc for doc in documents if doc]  # 跳过空文档
+        doc_chunks = [self._semantic_initial_chunks(doc, chunk_size, chunk_overlap) for doc in documents]
+
+        # 只有超过2个初始文本块的文档需要计算embedding
+        texts = []
+        ranges = []
+        for chunks in doc_chunks:
+            if len(chunks) > 2:
+                ranges.append((len(texts), len(texts) + len(chunks)))
+                texts.extend(chunks)
+            else:
+                ranges.append(None)
+
+        vectors = [None] * len(texts)
+
+        def embed_batch(start):
+            batch = texts[start:start + embedding_batch_size]
             try:
-                embeddings = embedding.embed_documents(initial_chunks)
-                if not embeddings:  # 如果没有成功生成embeddings
-                    return initial_chunks
-                    
-                final_chunks = [initial_chunks[0]]
-                current_chunk = initial_chunks[0]
-                current_embedding = embeddings[0]
-                
-                for i in range(1, len(initial_chunks)):
+                batch_vectors = embedding.embed_documents(batch)
+                # 返回数量不一致时切片赋值会改变列表长度，使后续文档的向量错位
+                if len(batch_vectors) != len(batch):
+                    raise Exception(f"embedding返回{len(batch_vectors)}个向量，预期{len(batch)}个")
+                vectors[start:start + len(batch)] = batch_vectors
+            except Exception as e:
+                # 该批次涉及的文档回退为初始文本块
+                print(f"批量计算embedding时出错: {str(e)}")
+
+        if texts:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(embed_batch, range(0, len(texts), embedding_batch_size)))
+
+        all_splits = []
+        for doc, chunks, span in zip(documents, doc_chunks, ranges):
+            final_chunks = chunks
+            if span is not None:
+                doc_vectors = vectors[span[0]:span[1]]
+                if all(vector is not None for vector in doc_vectors):
                     try:
-                        similarity = cosine_similarity(
-                            [current_embedding],
-                            [embeddings[i]]
-                        )[0][0]
-                        
-                        if similarity > similarity_threshold and \
-                           len(current_chunk) + len(initial_chunks[i]) <= chunk_size:
-                            current_chunk += " " + initial_chunks[i]
-                            current_embedding = np.mean([current_embedding, embeddings[i]], axis=0)
-                        else:
-                            final_chunks.append(initial_chunks[i])
-                            current_chunk = initial_chunks[i]
-                            current_embedding = embeddings[i]
+                        final_chunks = self._semantic_group(chunks, doc_vectors, chunk_size, similarity_threshold,
+                                                            breakpoint_percentile, window_size)
                     except Exception as e:
-                        print(f"计算相似度时出错: {str(e)}")
-                        final_chunks.append(initial_chunks[i])
-                
-                return final_chunks
-                
-            except Exception as e:
-                print(f"处理文档时出错: {str(e)}")
-                return initial_chunks  # 发生错误时返回原始分块
+                        print(f"处理文档时出错: {str(e)}")
+            all_splits.extend(Document(page_content=chunk, metadata=doc.metadata)
+                              for chunk in final_chunks if chunk.strip())  # 过滤空白块
+        return all_splits
+
+    def split_by_semantic(self, documents, embedding, chunk_size=100, chunk_overlap=10, 
+                         similarity_threshold=0.7, max_workers=4, breakpoint_percentile=None, window_size=1,
+                         cross_document_batch=None):
+        """使用语义相似度进行文本分块
+
+        breakpoint_percentile: 以相似度分布的百分位作为断点阈值(如10表示最不相似的10%处断开)，为空时使用similarity_threshold
+        window_size: 计算百分位阈值时与前几个文本块比较
+        cross_document_batch: 是否跨文档合并embedding请求(默认读取SEMANTIC_CROSS_DOCUMENT_BATCH)
+        """
+        if self.cross_document_batch if cross_document_batch is None else cross_document_batch:
+            return self._semantic_batch(documents, embedding, chunk_size, chunk_overlap, similarity_threshold,
+                                        breakpoint_percentile, window_size, max_workers,
+                                        self.embedding_batch_size)
+
+        def process_document(doc):
+            return self._semantic_chunks(doc, embedding, chunk_size, chunk_overlap, similarity_threshold,
+                                         breakpoint_percentile, window_size)
         
         # 并行处理文档
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
@@ -120,4 +443,102 @@ class DocumentSplitter:
                     # 发生错误时，使用原始文档作为一个块
                     all_splits.append(doc)
         
-        return all_splits
\ No newline at end of file
+        return all_splits
+
+    def _iter_parallel(self, documents, process_document, max_workers=4, preserve_order=False):
+        """并行处理文档，按输入文档顺序返回每个源文档的分割结果(生成器)
+
+        同时在处理中的文档不超过max_workers的两倍，documents也可以是生成器，不会被一次性读入；
+        无论preserve_order取值都按输入顺序返回，相同输入重复入库时分块顺序(及segment_id)保持稳定；
+        调用方提前停止迭代时取消尚未开始的任务。
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = deque()
+            try:
+                for doc in documents:
+                    pending.append(executor.submit(process_document, doc))
+                    if len(pending) >= max_workers * 2:
+                        yield from pending.popleft().result()
+                while pending:
+                    yield from pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def iter_split_by_token(self, documents, chunk_size=400, chunk_overlap=20, max_workers=4, preserve_order=True,
+                            use_processes=None):
+        """使用TokenTextSplitter并行分割文档，以生成器方式在每个源文档完成后返回其分块
+
+        不保存全部分割结果，调用方提前停止迭代时剩余文档不会被分割。
+        分块始终按输入顺序返回，preserve_order为True时记录start_index/end_index；
+        use_processes为True时使用进程池分割(按输入顺序返回)。
+        """
+        if self.use_processes if use_processes is None else use_processes:
+            return self._iter_split_in_processes('token', documents, chunk_size, chunk_overlap, None, preserve_order)
+
+        text_splitter = get_text_splitter('token', chunk_size, chunk_overlap, add_start_index=preserve_order)
+
+        def process_document(doc):
+            splits = text_splitter.split_documents([doc])
+            return self._with_end_index(doc, splits) if preserve_order else splits
+
+        return self._iter_parallel(documents, process_document, max_workers, preserve_order)
+
+    def iter_split_by_recursion(self, documents, separators=["\n\n", "\n", " "],
+                                chunk_size=400, chunk_overlap=20, max_workers=4, preserve_order=True,
+                                use_processes=None):
+        """使用RecursiveCharacterTextSplitter并行分割文档，以生成器方式在每个源文档完成后返回其分块
+
+        分块始终按输入顺序返回，preserve_order为True时记录start_index/end_index；
+        use_processes为True时使用进程池分割(按输入顺序返回)。
+        """
+        if self.use_processes if use_processes is None else use_processes:
+            return self._iter_split_in_processes('recursion', documents, chunk_size, chunk_overlap, separators,
+                                                 preserve_order)
+
+        text_splitter = get_text_splitter('recursion', chunk_size, chunk_overlap, separators,
+                                          add_start_index=preserve_order)
+
+        def process_document(doc):
+            splits = text_splitter.split_documents([doc])
+            return self._with_end_index(doc, splits) if preserve_order else splits
+
+        return self._iter_parallel(documents, process_document, max_workers, preserve_order)
+
+    def iter_split_by_semantic(self, documents, embedding, chunk_size=100, chunk_overlap=10,
+                               similarity_threshold=0.7, max_workers=4, preserve_order=True,
+                               breakpoint_percentile=None, window_size=1, cross_document_batch=None):
+        """使用语义相似度并行分块，以生成器方式在每个源文档完成后返回其分块
+
+        分块始终按输入顺序返回(语义合并后的分块不对应连续原文，preserve_order不记录字符位置)；
+        cross_document_batch为True时每次取一组文档跨文档批量计算embedding，按组返回(按输入顺序)。
+        """
+        if self.cross_document_batch if cross_document_batch is None else cross_document_batch:
+            return self._iter_semantic_batch(documents, embedding, chunk_size, chunk_overlap, similarity_threshold,
+                                             breakpoint_percentile, window_size, max_workers)
+
+        def process_document(doc):
+            try:
+                chunks = self._semantic_chunks(doc, embedding, chunk_size, chunk_overlap, similarity_threshold,
+                                               breakpoint_percentile, window_size)
+            except Exception as e:
+                print(f"处理文档结果时出错: {str(e)}")
+                # 发生错误时，使用原始文档作为一个块
+                return [doc]
+            return [Document(page_content=chunk, metadata=doc.metadata)
+                    for chunk in chunks if chunk.strip()]  # 过滤空白块
+
+        # 跳过空文档
+        return self._iter_parallel((doc for doc in documents if doc), process_document, max_workers, preserve_order)
+
+    def _iter_semantic_batch(self, documents, embedding, chunk_size, chunk_overlap, similarity_threshold,
+                             breakpoint_percentile, window_size, max_workers):
+        """按组(SEMANTIC_BATCH_DOCUMENTS个文档)跨文档批量语义分块，以生成器方式返回"""
+        iterator = iter(documents)
+        while True:
+            group = list(islice(iterator, self.semantic_batch_documents))
+            if not group:
+                break
+            yield from self._semantic_batch(group, embedding, chunk_size, chunk_overlap, similarity_threshold,
+                                            breakpoint_percentile, window_size, max_workers,
+                                            self.embedding_batch_size)
@@ -0,0 +1,169 @@
+import os
+import socket
+
+import pytest
+
+from rag.jobs.IngestJobQueue import IngestJobStore, IngestJobQueue
+
+
+@pytest.fixture
+def store(tmp_path):
+    return IngestJobStore(str(tmp_path / "jobs.db"))
+
+
+def test_create_uses_given_job_id(store):
+    job_id = store.create("create", {"file_path": "a.txt"}, job_id="job-1")
+
+    assert job_id == "job-1"
+    job = store.get("job-1")
+    assert job["status"] == "pending"
+    assert job["params"] == {"file_path": "a.txt"}
+    assert job["attempts"] == 0
+
+
+def test_claim_only_once(store):
+    job_id = store.create("create", {})
+
+    assert store.claim(job_id, "host:1") is True
+    # 已被抢占的任务不能再次抢占
+    assert store.claim(job_id, "host:2") is False
+    job = store.get(job_id)
+    assert job["status"] == "running"
+    assert job["worker"] == "host:1"
+    assert job["attempts"] == 1
+
+
+def test_claim_finished_job(store):
+    job_id = store.create("create", {})
+    store.claim(job_id, "host:1")
+    store.finish(job_id, {"total_splits": 3})
+
+    assert store.claim(job_id, "host:2") is False
+    job = store.get(job_id)
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"total_splits": 3}
+
+
+def test_requeue_interrupted_only_dead_workers(store):
+    alive_job = store.create("create", {})
+    dead_job = store.create("update", {})
+    store.claim(alive_job, "host:1")
+    store.claim(dead_job, "host:2")
+
+    requeued = store.requeue_interrupted(lambda worker: worker == "host:1")
+
+    assert requeued == [dead_job]
+    assert store.get(alive_job)["status"] == "running"
+    assert store.get(dead_job)["status"] == "pending"
+    assert store.pending_ids() == [dead_job]
+    # 重新排队的任务可以再次抢占，执行次数累加
+    assert store.claim(dead_job, "host:3") is True
+    assert store.get(dead_job)["attempts"] == 2
+
+
+def test_requeue_ignores_finished_jobs(store):
+    job_id = store.create("create", {})
+    store.claim(job_id, "host:1")
+    store.fail(job_id, "error")
+
+    assert store.requeue_interrupted(lambda worker: False) == []
+    assert store.get(job_id)["status"] == "failed"
+
+
+def test_recover_runs_interrupted_jobs(store):
+    job_id = store.create("create", {"file_path": "a.txt"})
+    # 上次执行该任务的进程已退出
+    store.claim(job_id, f"{socket.gethostname()}:999999999:token")
+    calls = []
+
+    def handler(job, report):
+        calls.append((job["id"], job["attempts"]))
+        report("load", 1.0)
+        return {"ok": True}
+
+    queue = IngestJobQueue(store, handler, max_workers=1)
+    try:
+        assert queue.recover() == 1
+    finally:
+        queue.shutdown(wait=True)
+
+    assert calls == [(job_id, 2)]
+    job = store.get(job_id)
+    assert job["status"] == "succeeded"
+    assert job["worker"] == queue.worker_id
+
+
+def test_recover_keeps_jobs_of_live_workers(store):
+    job_id = store.create("create", {})
+    calls = []
+
+    queue = IngestJobQueue(store, lambda job, report: calls.append(job["id"]), max_workers=1)
+    try:
+        # 其他线程正在执行的任务
+        store.claim(job_id, queue.worker_id)
+        assert queue.recover() == 0
+    finally:
+        queue.shutdown(wait=True)
+
+    assert calls == []
+    assert store.get(job_id)["status"] == "running"
+
+
+def test_recover_runs_jobs_of_reused_pid(store):
+    job_id = store.create("create", {})
+    # 重启前的进程与当前进程的进程号相同，但启动标识不同
+    store.claim(job_id, f"{socket.gethostname()}:{os.getpid()}:before-restart")
+    calls = []
+
+    queue = IngestJobQueue(store, lambda job, report: calls.append(job["id"]), max_workers=1)
+    try:
+        assert queue.recover() == 1
+    finally:
+        queue.shutdown(wait=True)
+
+    assert calls == [job_id]
+    assert store.get(job_id)["status"] == "succeeded"
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="需要读取/proc获取进程启动标识")
+def test_recover_runs_jobs_of_other_process_with_stale_token(store):
+    job_id = store.create("create", {})
+    # 进程号被另一个存活的进程(如pytest的父进程)复用
+    store.claim(job_id, f"{socket.gethostname()}:{os.getppid()}:before-restart")
+    queue = IngestJobQueue(store, lambda job, report: None, max_workers=1)
+    try:
+        assert queue.recover() == 1
+    finally:
+        queue.shutdown(wait=True)
+
+    assert store.get(job_id)["status"] == "succeeded"
+
+
+def test_failed_job_records_error(store):
+    def handler(job, report):
+        raise Exception("解析失败")
+
+    queue = IngestJobQueue(store, handler, max_workers=1)
+    try:
+        job_id = queue.submit("create", {}, job_id="job-2")
+    finally:
+        queue.shutdown(wait=True)
+
+    assert job_id == "job-2"
+    job = store.get(job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "解析失败"
+
+
+def test_progress_result_kept_for_retry(store):
+    job_id = store.create("create", {})
+    store.claim(job_id, "host:1")
+    store.update_progress(job_id, "load", 0.0, result={"version_name": "doc_v1"})
+    # 只更新进度时保留已记录的中间结果
+    store.update_progress(job_id, "split", 0.5)
+
+    store.requeue_interrupted(lambda worker: False)
+    job = store.get(job_id)
+    assert job["status"] == "pending"
+    assert job["stage"] == "split"
+    assert job["result"] == {"version_name": "doc_v1"}